@@ -2,7 +2,9 @@
 Should take in a sam file from a aligner like bwa aln or bwa mem and convert it into a
 """
 from copy import copy
+import hashlib
 import itertools
+import json
 import os
 import re
 import subprocess
@@ -38,6 +40,10 @@ SUPPORTED_ALIGNER = MavisNamespace(
 """
 
 
+GFCLIENT_OPTIONS = {'-t', '-q', '-prot', '-dots', '-minScore', '-minIdentity', '-maxIntron'}
+"""set: options of the gfClient (used with an :term:`aligner_server`) which can be given in the align options"""
+
+
 class SplitAlignment(BreakpointPair):
     def __init__(self, *pos, **kwargs):
         self.read1 = kwargs.pop('read1')
@@ -390,6 +396,272 @@ def call_paired_read_event(read1, read2, is_stranded=False):
     return SplitAlignment(break1, break2, untemplated_seq=untemplated_seq, read1=read1, read2=read2)
 
 
+def parse_aligner_server(aligner_server):
+    """
+    Args:
+        aligner_server (str): address of the aligner server given as host:port (or just the port for localhost)
+
+    Returns:
+        Tuple[str,int]: the host and port of the server
+
+    Raises:
+        ValueError: if the port is not an integer
+    """
+    host, sep, port = str(aligner_server).rpartition(':')
+    return (host if sep and host else 'localhost', int(port))
+
+
+def _call_blat_server(
+    aligner_server,
+    aligner_reference,
+    aligner_fa_input_file,
+    aligner_output_file,
+    blat_min_identity,
+    log_fh,
+    align_options=None,
+    log=DEVNULL,
+):
+    """
+    aligns the input sequences with gfClient against a gfServer which already has the aligner reference
+    loaded into memory. The server options (ex. -stepSize) are set when the server is started, so only
+    the align options which gfClient accepts are passed on and a warning is given for the others
+
+    Returns:
+        bool: False if the server could not be used and the standalone aligner should be called instead
+    """
+    try:
+        host, port = parse_aligner_server(aligner_server)
+    except ValueError:
+        log('ignoring invalid aligner server address:', aligner_server, time_stamp=False)
+        return False
+    client_options = ['-minScore=0', '-minIdentity={0}'.format(blat_min_identity)]
+    ignored_options = []
+    for option in (align_options or '').split():
+        name = option.split('=', 1)[0]
+        if name in GFCLIENT_OPTIONS:
+            client_options = [o for o in client_options if o.split('=', 1)[0] != name]
+            client_options.append(option)
+        else:
+            ignored_options.append(option)
+    if ignored_options:
+        warnings.warn(
+            'align options are not supported by the aligner server and will be ignored: {}'.format(
+                ' '.join(ignored_options)
+            )
+        )
+    command = ' '.join(
+        [
+            'gfClient',
+            host,
+            str(port),
+            os.path.dirname(os.path.abspath(aligner_reference)),
+            aligner_fa_input_file,
+            aligner_output_file,
+            '-out=pslx',
+            '-nohead',
+        ]
+        + client_options
+    )
+    log_fh.write('>>> {}\n'.format(command))
+    log_fh.flush()
+    try:
+        subprocess.check_call(command, shell=True, stdout=log_fh, stderr=log_fh)
+    except subprocess.CalledProcessError as err:
+        log(
+            'aligner server at {}:{} is unavailable ({}), falling back to {}'.format(
+                host, port, err.returncode, SUPPORTED_ALIGNER.BLAT
+            ),
+            time_stamp=False,
+        )
+        return False
+    return True
+
+
+def aligner_thread_count(aligner_threads=1):
+    """
+    Args:
+        aligner_threads (int): the number of threads requested for the aligner
+
+    Returns:
+        int: the number of threads to run the aligner with. If no number was requested this is the number of
+        CPUs available to the current job
+    """
+    if aligner_threads:
+        return int(aligner_threads)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on all platforms
+        return os.cpu_count() or 1
+
+
+def _add_bwa_alignment(
+    reads_by_query, read, sequences, input_bam_cache, reference_genome, log=DEVNULL
+):
+    """
+    converts an alignment from the bwa output and adds it to the alignments for its query sequence
+    """
+    read = _read.SamRead.copy(read)
+    try:
+        read.reference_id = input_bam_cache.reference_id(read.reference_name)
+    except KeyError:
+        log('dropping alignment (unknown reference)', read.reference_name, time_stamp=False)
+    else:
+        if read.is_paired:
+            read.next_reference_id = input_bam_cache.reference_id(read.next_reference_name)
+        read.cigar = _cigar.recompute_cigar_mismatch(read, reference_genome[read.reference_name])
+        query_seq = sequences[read.query_name]
+        reads_by_query.setdefault(query_seq, []).append(read)
+
+
+class AlignmentCache:
+    """
+    on-disk cache of the alignments of sequences. Alignments are stored by a hash of the sequence, the aligner (and its
+    version), the aligner reference file and the alignment options so that identical sequences (ex. from re-runs or
+    resubmitted jobs) do not need to be realigned. Once the cache is larger than the maximum size, the least recently
+    used entries are removed
+
+    Note:
+        the cache directory is only scanned when the size of the cache, as of the last scan plus the entries added since
+        by this instance, exceeds the maximum size. Entries added by other jobs sharing the cache directory are not seen
+        until then, so the cache may grow past the maximum size by the entries other jobs have added in the meantime
+    """
+
+    def __init__(self, cache_dir, aligner, aligner_reference, aligner_version=None, max_size=None):
+        """
+        Args:
+            cache_dir (str): path to the directory to store the cached alignments in
+            aligner (SUPPORTED_ALIGNER): the aligner used
+            aligner_reference (str): path to the aligner reference file
+            aligner_version (str): the aligner version. Found with :func:`get_aligner_version` if not given
+            max_size (int): the maximum size (in bytes) of the cache. Not limited if None
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if aligner_version is None:
+            aligner_version = get_aligner_version(aligner)
+        reference_stat = os.stat(aligner_reference)
+        self._key_prefix = json.dumps(
+            [
+                aligner,
+                aligner_version,
+                os.path.abspath(aligner_reference),
+                reference_stat.st_size,
+                int(reference_stat.st_mtime),
+            ]
+        )
+        self.hits = 0
+        self.misses = 0
+        # size (in bytes) of the cache as of the last scan plus the entries added since
+        self.size = None
+
+    def _path(self, seq, options):
+        key = hashlib.md5(
+            '\n'.join([self._key_prefix, json.dumps(options, sort_keys=True), seq]).encode('utf-8')
+        ).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def get(self, seq, options, query_name, input_bam_cache):
+        """
+        Args:
+            seq (str): the aligned sequence
+            options (dict): the alignment options
+            query_name (str): the name to give the cached alignments
+            input_bam_cache (BamCache): bam cache to be used as a template for the reference ids
+
+        Returns:
+            :class:`list` of :class:`~mavis.bam.read.SamRead`: the cached alignments or None if the sequence has not been cached
+        """
+        path = self._path(seq, options)
+        try:
+            with open(path, 'r') as fh:
+                rows = json.load(fh)
+            os.utime(path)
+        except (OSError, ValueError):  # not cached (or removed by another job)
+            self.misses += 1
+            return None
+        self.hits += 1
+        reads = []
+        for row in rows:
+            read = _read.SamRead(
+                reference_name=row['reference_name'], alignment_score=row['alignment_score']
+            )
+            read.query_sequence = row['query_sequence']
+            read.flag = row['flag']
+            read.reference_start = row['reference_start']
+            read.reference_id = input_bam_cache.reference_id(row['reference_name'])
+            read.cigar = [tuple(c) for c in row['cigar']]
+            read.query_name = query_name
+            read.mapping_quality = row['mapping_quality']
+            read.set_tags([tuple(t) for t in row['tags']])
+            read.alignment_rank = row['alignment_rank']
+            if row['key'] is not None:
+                read._key = tuple([query_name] + row['key'][1:])
+            reads.append(read)
+        return reads
+
+    def put(self, seq, options, reads):
+        """
+        Args:
+            seq (str): the aligned sequence
+            options (dict): the alignment options
+            reads (:class:`list` of :class:`~mavis.bam.read.SamRead`): the alignments of the sequence
+        """
+        rows = []
+        for read in reads:
+            rows.append(
+                {
+                    'reference_name': read.reference_name,
+                    'reference_start': read.reference_start,
+                    'query_sequence': read.query_sequence,
+                    'flag': read.flag,
+                    'cigar': read.cigar,
+                    'mapping_quality': read.mapping_quality,
+                    'tags': read.get_tags(with_value_type=True),
+                    'alignment_rank': read.alignment_rank,
+                    'alignment_score': read.alignment_score,
+                    'key': None if read._key is None else list(read._key),
+                }
+            )
+        path = self._path(seq, options)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        content = json.dumps(rows)
+        with open(temp_path, 'w') as fh:
+            fh.write(content)
+        os.replace(temp_path, path)  # other jobs never read a partially written entry
+        if self.size is not None:
+            self.size += len(content)
+
+    def evict(self):
+        """
+        removes the least recently used entries until the cache is no larger than the maximum size. The cache
+        directory is only scanned if the running size of the cache is unknown or larger than the maximum size
+        """
+        if self.max_size is None or (self.size is not None and self.size <= self.max_size):
+            return
+        entries = []
+        total = 0
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, path, stat.st_size))
+                total += stat.st_size
+        entries.sort()
+        for mtime, path, size in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self.size = total
+
+
 def align_sequences(
     sequences,
     input_bam_cache,
@@ -402,6 +674,9 @@ def align_sequences(
     blat_limit_top_aln=25,
     blat_min_identity=0.7,
     clean_files=True,
+    aligner_server=None,
+    aligner_threads=1,
+    aligner_cache=None,
     log=DEVNULL,
     **kwargs
 ):
@@ -414,7 +689,58 @@ def align_sequences(
         reference_genome: the reference genome
         aligner (SUPPORTED_ALIGNER): the name of the aligner to be used
         aligner_reference (str): path to the aligner reference file
+        aligner_server (str): see :term:`aligner_server`
+        aligner_threads (int): see :term:`aligner_threads`
+        aligner_cache (AlignmentCache): cache of previous alignments. Only the sequences not found in the cache are aligned
     """
+    if aligner_cache is not None and sequences:
+        options = {'align_options': kwargs.get('align_options')}
+        if aligner == SUPPORTED_ALIGNER.BLAT:
+            options.update(
+                {'blat_limit_top_aln': blat_limit_top_aln, 'blat_min_identity': blat_min_identity}
+            )
+        reads_by_query = {}
+        uncached_sequences = {}
+        for name, seq in sequences.items():
+            reads = aligner_cache.get(seq, options, name, input_bam_cache)
+            if reads is None:
+                uncached_sequences[name] = seq
+            else:
+                reads_by_query[seq] = reads
+        log(
+            'using cached alignments for {} of {} sequences'.format(
+                len(reads_by_query), len(sequences)
+            ),
+            time_stamp=False,
+        )
+        if uncached_sequences:
+            aligned = align_sequences(
+                uncached_sequences,
+                input_bam_cache,
+                reference_genome,
+                aligner,
+                aligner_reference,
+                aligner_output_file=aligner_output_file,
+                aligner_fa_input_file=aligner_fa_input_file,
+                aligner_output_log=aligner_output_log,
+                blat_limit_top_aln=blat_limit_top_aln,
+                blat_min_identity=blat_min_identity,
+                clean_files=clean_files,
+                aligner_server=aligner_server,
+                aligner_threads=aligner_threads,
+                log=log,
+                **kwargs
+            )
+            for seq in uncached_sequences.values():
+                reads = aligned.get(seq, [])
+                aligner_cache.put(seq, options, reads)
+                reads_by_query[seq] = reads
+            aligner_cache.evict()
+        if not clean_files:  # the input file should still list all the sequences
+            with open(aligner_fa_input_file, 'w') as fh:
+                for name, seq in sorted(sequences.items()):
+                    fh.write('>' + name + '\n' + seq + '\n')
+        return reads_by_query
     try:
         # write the input sequences to a fasta file
         count = 1
@@ -433,6 +759,7 @@ def align_sequences(
 
             # call the aligner using subprocess
             blat_min_identity *= 100
+            align_options = kwargs.get('align_options')
             blat_options = kwargs.pop(
                 'align_options',
                 '-stepSize=5 -repMatch=2253 -minScore=0 -minIdentity={0}'.format(blat_min_identity),
@@ -453,8 +780,18 @@ def align_sequences(
             )
             log('writing aligner logging to:', aligner_output_log, time_stamp=False)
             with open(aligner_output_log, 'w') as log_fh:
-                log_fh.write('>>> {}\n'.format(command))
-                subprocess.check_call(command, shell=True, stdout=log_fh, stderr=log_fh)
+                if not aligner_server or not _call_blat_server(
+                    aligner_server,
+                    aligner_reference,
+                    aligner_fa_input_file,
+                    aligner_output_file,
+                    blat_min_identity,
+                    log_fh,
+                    align_options=align_options,
+                    log=log,
+                ):
+                    log_fh.write('>>> {}\n'.format(command))
+                    subprocess.check_call(command, shell=True, stdout=log_fh, stderr=log_fh)
             return process_blat_output(
                 input_bam_cache=input_bam_cache,
                 query_id_mapping=sequences,
@@ -465,42 +802,55 @@ def align_sequences(
 
         elif aligner == SUPPORTED_ALIGNER.BWA_MEM:
             align_options = kwargs.get('align_options', '')
+            threads = aligner_thread_count(aligner_threads)
+            if threads > 1:
+                align_options = '-t {} {}'.format(threads, align_options)
             command = '{} -Y {} {} {}'.format(
                 aligner, align_options, aligner_reference, aligner_fa_input_file
             )
             log('writing aligner logging to:', aligner_output_log, time_stamp=False)
-            with open(aligner_output_log, 'w') as log_fh, open(
-                aligner_output_file, 'w'
-            ) as aligner_output_fh:
+            reads_by_query = {}
+            with open(aligner_output_log, 'w') as log_fh:
                 log_fh.write('>>> {}\n'.format(command))
-                subprocess.check_call(command, stdout=aligner_output_fh, shell=True, stderr=log_fh)
-
-            with pysam.AlignmentFile(
-                aligner_output_file, 'r', check_sq=bool(len(sequences))
-            ) as samfile:
-                reads_by_query = {}
-                for read in samfile.fetch():
-                    if read.is_unmapped:
-                        continue
-                    read = _read.SamRead.copy(read)
-                    try:
-                        read.reference_id = input_bam_cache.reference_id(read.reference_name)
-                    except KeyError:
-                        log(
-                            'dropping alignment (unknown reference)',
-                            read.reference_name,
-                            time_stamp=False,
-                        )
-                    else:
-                        if read.is_paired:
-                            read.next_reference_id = input_bam_cache.reference_id(
-                                read.next_reference_name
+                log_fh.flush()
+                # parse the alignments from stdout as they are output, the sam file is only written
+                # when the aligner files are being kept
+                proc = subprocess.Popen(command, stdout=subprocess.PIPE, shell=True, stderr=log_fh)
+                try:
+                    with pysam.AlignmentFile(
+                        proc.stdout, 'r', check_sq=bool(len(sequences))
+                    ) as samfile:
+                        output_fh = None
+                        if not clean_files:
+                            output_fh = pysam.AlignmentFile(
+                                aligner_output_file, 'w', template=samfile
                             )
-                        read.cigar = _cigar.recompute_cigar_mismatch(
-                            read, reference_genome[read.reference_name]
-                        )
-                        query_seq = sequences[read.query_name]
-                        reads_by_query.setdefault(query_seq, []).append(read)
+                        try:
+                            for read in samfile:
+                                if output_fh is not None:
+                                    output_fh.write(read)
+                                if read.is_unmapped:
+                                    continue
+                                _add_bwa_alignment(
+                                    reads_by_query,
+                                    read,
+                                    sequences,
+                                    input_bam_cache,
+                                    reference_genome,
+                                    log=log,
+                                )
+                        finally:
+                            if output_fh is not None:
+                                output_fh.close()
+                except (ValueError, OSError):
+                    # the sam output is incomplete if the aligner failed
+                    if proc.wait():
+                        raise subprocess.CalledProcessError(proc.returncode, command)
+                    raise
+                finally:
+                    proc.stdout.close()
+                if proc.wait():
+                    raise subprocess.CalledProcessError(proc.returncode, command)
             for reads in reads_by_query.values():
                 for i, read in enumerate(
                     sorted(
@@ -1,19 +1,25 @@
 """
 module which holds all functions relating to loading reference files
 """
+from collections.abc import Mapping
 import json
+import mmap
+import pickle
 import re
+import struct
 import warnings
 import os
 
 from Bio import SeqIO
+import pysam
 import tab
 
 from .base import BioInterval, ReferenceName
 from .genomic import Exon, Gene, Template, Transcript, PreTranscript
 from .protein import Domain, Translation
+from .. import __version__
 from ..constants import CODON_SIZE, GIEMSA_STAIN, START_AA, STOP_AA, STRAND, translate
-from ..interval import Interval
+from ..interval import Interval, IntervalIndex
 from ..util import DEVNULL, LOG, filepath, WeakMavisNamespace
 
 
@@ -112,9 +118,55 @@ def load_reference_genes(*pos, **kwargs):
     return load_annotations(*pos, **kwargs)
 
 
+class AnnotationIndexMixin:
+    """
+    adds per-chromosome interval indices over the genes and pre-transcripts to a mapping of genes by
+    chromosome. Each index is built when its chromosome is first queried and re-built if the number
+    of genes on the chromosome changes
+    """
+
+    def _chromosome_index(self, chrom):
+        indices = self.__dict__.setdefault('_indices', {})
+        genes = self.get(chrom, [])
+        if chrom not in indices or indices[chrom][0] != len(genes):
+            transcripts = [transcript for gene in genes for transcript in gene.transcripts]
+            indices[chrom] = (len(genes), IntervalIndex(genes), IntervalIndex(transcripts))
+        return indices[chrom]
+
+    def gene_index(self, chrom):
+        """
+        Returns:
+            IntervalIndex: index of the genes on the given chromosome
+        """
+        return self._chromosome_index(chrom)[1]
+
+    def transcript_index(self, chrom):
+        """
+        Returns:
+            IntervalIndex: index of the pre-transcripts of all genes on the given chromosome
+        """
+        return self._chromosome_index(chrom)[2]
+
+
+class ReferenceAnnotations(AnnotationIndexMixin, dict):
+    """
+    :class:`dict` of :class:`list` of :class:`~mavis.annotate.genomic.Gene` by :class:`str` (chromosome) with
+    interval indices used for overlap queries
+    """
+
+
+COMPILED_ANNOTATIONS_MAGIC = b'MAVISANN'
+"""bytes: signature at the start of compiled annotations files"""
+
+COMPILED_ANNOTATIONS_VERSION = 1
+"""int: version of the compiled annotations file format. Files written with a different version must be re-compiled"""
+
+
 def load_annotations(*filepaths, warn=DEVNULL, reference_genome=None, best_transcripts_only=False):
     """
-    loads gene models from an input file. Expects a tabbed or json file.
+    loads gene models from an input file. Expects a tabbed, json, or compiled (see :func:`write_compiled_annotations`) file.
+    A single compiled file is loaded lazily. Compiled files have already been parsed so the parsing options are not
+    applied to them
 
     Args:
         filepath (str): path to the input file
@@ -124,25 +176,30 @@ def load_annotations(*filepaths, warn=DEVNULL, reference_genome=None, best_trans
         filetype (str): json or tab/tsv. only required if the file type can't be interpolated from the path extension
 
     Returns:
-        :class:`dict` of :class:`list` of :class:`~mavis.annotate.genomic.Gene` by :class:`str`: lists of genes keyed by chromosome name
+        ReferenceAnnotations: lists of genes keyed by chromosome name
     """
-    total_annotations = {}
+    total_annotations = ReferenceAnnotations()
 
     for filename in filepaths:
         data = None
 
-        if filename.endswith('.tab') or filename.endswith('.tsv'):
-            data = convert_tab_to_json(filename, warn)
+        if is_compiled_annotations(filename):
+            current_annotations = load_compiled_annotations(filename)
+            if len(filepaths) == 1:
+                return current_annotations
         else:
-            with open(filename) as fh:
-                data = json.load(fh)
-
-        current_annotations = parse_annotations_json(
-            data,
-            reference_genome=reference_genome,
-            best_transcripts_only=best_transcripts_only,
-            warn=warn,
-        )
+            if filename.endswith('.tab') or filename.endswith('.tsv'):
+                data = convert_tab_to_json(filename, warn)
+            else:
+                with open(filename) as fh:
+                    data = json.load(fh)
+
+            current_annotations = parse_annotations_json(
+                data,
+                reference_genome=reference_genome,
+                best_transcripts_only=best_transcripts_only,
+                warn=warn,
+            )
 
         for chrom in current_annotations:
             for gene in current_annotations[chrom]:
@@ -380,14 +437,407 @@ def convert_tab_to_json(filepath, warn=DEVNULL):
     return {'genes': genes.values()}
 
 
-def load_reference_genome(*filepaths):
+class IndexedSequence:
+    """
+    read-only view of a single sequence which is held outside of python objects (an indexed fasta
+    file or a shared memory buffer). Slices are fetched on demand and returned as upper-case strings
+    so that the view can stand in for the upper-cased :class:`Bio.Seq.Seq` objects produced by the
+    in-memory loader
+    """
+
+    BLOCK_SIZE = 4096
+    """int: number of bases read at once when single positions are requested"""
+
+    def __init__(self, reference, name, length):
+        """
+        Args:
+            reference (IndexedReferenceGenome or SharedReferenceGenome): the reference genome the sequence belongs to
+            name (str): the name of the sequence in the reference
+            length (int): the length of the sequence
+        """
+        self.reference = reference
+        self.name = name
+        self.length = length
+        self._block = (-1, '')
+
+    def fetch(self, start, end):
+        """
+        Args:
+            start (int): 0-based start position
+            end (int): end position (exclusive)
+
+        Returns:
+            str: the upper-case sequence in the range [start, end)
+        """
+        if start >= end:
+            return ''
+        return self.reference.fetch_sequence(self.name, start, end)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = range(*index.indices(self.length))
+            if not positions:
+                return ''
+            if positions.step == 1:
+                return self.fetch(positions.start, positions.stop)
+            first = min(positions[0], positions[-1])
+            seq = self.fetch(first, max(positions[0], positions[-1]) + 1)
+            return ''.join([seq[i - first] for i in positions])
+        if index < 0:
+            index += self.length
+        if index < 0 or index >= self.length:
+            raise IndexError('sequence index out of range', self.name, index)
+        block_start, block = self._block
+        if not block_start <= index < block_start + len(block):
+            block_start = index - index % self.BLOCK_SIZE
+            block = self.fetch(block_start, min(block_start + self.BLOCK_SIZE, self.length))
+            self._block = (block_start, block)
+        return block[index - block_start]
+
+    def __iter__(self):
+        for start in range(0, self.length, self.BLOCK_SIZE):
+            yield from self.fetch(start, min(start + self.BLOCK_SIZE, self.length))
+
+    def __str__(self):
+        return self.fetch(0, self.length)
+
+    def upper(self):
+        return self
+
+    def __repr__(self):
+        return '{}(name={}, length={})'.format(self.__class__.__name__, self.name, self.length)
+
+
+class IndexedSequenceRecord:
+    """
+    minimal stand-in for :class:`Bio.SeqRecord.SeqRecord` which wraps an :class:`IndexedSequence`
+    """
+
+    def __init__(self, name, seq):
+        self.id = name
+        self.name = name
+        self.seq = seq
+
+    def __len__(self):
+        return len(self.seq)
+
+    def __getitem__(self, index):
+        return self.seq[index]
+
+    def upper(self):
+        return self
+
+    def __repr__(self):
+        return '{}(id={}, seq={!r})'.format(self.__class__.__name__, self.id, self.seq)
+
+
+class IndexedReferenceGenome(Mapping):
+    """
+    lazy reference genome backed by one or more faidx-indexed fasta files. Only the index is read on
+    load, sequences are read from disk as they are requested. Supports the same chr-prefix aliasing
+    as :func:`load_reference_genome`
+    """
+
+    def __init__(self, *filepaths):
+        """
+        Args:
+            filepaths (list of str): the paths to the indexed fasta files
+
+        Raises:
+            KeyError: if a sequence name is defined more than once
+        """
+        self.filepaths = filepaths
+        self._files = {}
+        self._pid = None
+        self._records = {}
+        self._source = {}  # file index by sequence name
+
+        for file_index, filename in enumerate(filepaths):
+            with pysam.FastaFile(filename) as fasta:
+                for chrom, length in zip(fasta.references, fasta.lengths):
+                    if chrom in self._records:
+                        raise KeyError('Duplicate chromosome name', chrom, filename)
+                    self._source[chrom] = file_index
+                    self._records[chrom] = IndexedSequenceRecord(
+                        chrom, IndexedSequence(self, chrom, length)
+                    )
+
+        # to fix hg38 issues
+        for template_name in list(self._records.keys()):
+            if template_name.startswith('chr'):
+                alias = re.sub('^chr', '', template_name)
+            else:
+                alias = 'chr' + template_name
+            if alias in self._source:
+                raise KeyError(
+                    'template names {} and {} are considered equal but both have been defined in the reference'
+                    'loaded'.format(template_name, alias)
+                )
+            self._records.setdefault(alias, self._records[template_name])
+
+    def fasta_file(self, chrom):
+        """
+        Returns:
+            pysam.FastaFile: the open file handle holding the sequence (re-opened after a fork)
+        """
+        if self._pid != os.getpid():
+            self._files = {}
+            self._pid = os.getpid()
+        file_index = self._source[chrom]
+        if file_index not in self._files:
+            self._files[file_index] = pysam.FastaFile(self.filepaths[file_index])
+        return self._files[file_index]
+
+    def fetch_sequence(self, chrom, start, end):
+        """
+        Returns:
+            str: the upper-case sequence of the range [start, end) on the given sequence
+        """
+        return self.fasta_file(chrom).fetch(chrom, start, end).upper()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_files'] = {}
+        state['_pid'] = None
+        return state
+
+    def __getitem__(self, chrom):
+        return self._records[chrom]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SharedReferenceGenome(Mapping):
+    """
+    reference genome packed into a single anonymous shared memory map. Processes forked after it has
+    been built read the same physical pages rather than each holding a copy-on-write duplicate of
+    the sequence objects
+    """
+
+    def __init__(self, reference_genome):
+        """
+        Args:
+            reference_genome (:class:`dict` of :class:`Bio.SeqRecord` by :class:`str`): the loaded reference genome
+        """
+        offsets = {}  # start position and length in the buffer by sequence name
+        packed = []
+        total = 0
+        for chrom, record in reference_genome.items():
+            # aliased names (chr prefix) which refer to the same record are stored once
+            for alias in [re.sub('^chr', '', chrom), 'chr' + chrom]:
+                if alias in offsets and reference_genome[alias] is record:
+                    offsets[chrom] = offsets[alias]
+                    break
+            else:
+                offsets[chrom] = (total, len(record.seq))
+                packed.append(chrom)
+                total += len(record.seq)
+        self._buffer = mmap.mmap(-1, max(total, 1))
+        for chrom in packed:
+            self._buffer.write(str(reference_genome[chrom].seq).upper().encode('latin-1'))
+        self._offsets = {}
+        self._records = {}
+        for chrom, (start, length) in offsets.items():
+            self._offsets[chrom] = start
+            self._records[chrom] = IndexedSequenceRecord(
+                chrom, IndexedSequence(self, chrom, length)
+            )
+
+    def fetch_sequence(self, chrom, start, end):
+        """
+        Returns:
+            str: the upper-case sequence of the range [start, end) on the given sequence
+        """
+        offset = self._offsets[chrom]
+        end = min(end, len(self._records[chrom]))
+        return self._buffer[offset + start : offset + end].decode('latin-1')
+
+    def __getitem__(self, chrom):
+        return self._records[chrom]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+class SharedAnnotations(AnnotationIndexMixin, Mapping):
+    """
+    reference annotations serialized per chromosome into a single memory map (anonymous shared
+    memory or a compiled annotations file). Genes are only unpickled (and then cached) when a
+    chromosome is first requested so that forked processes attach to the compact serialized form
+    instead of the full object graph
+    """
+
+    def __init__(self, buffer, offsets):
+        """
+        Args:
+            buffer (mmap.mmap): the memory map holding the pickled genes
+            offsets (:class:`dict` of :class:`tuple` of :class:`int` by :class:`str`): start and end of the pickled genes in the buffer by chromosome
+        """
+        self._buffer = buffer
+        self._offsets = offsets
+        self._genes = {}
+
+    @classmethod
+    def from_annotations(cls, annotations):
+        """
+        Args:
+            annotations (:class:`dict` of :class:`list` of :class:`Gene` by :class:`str`): the loaded reference annotations
+        """
+        blobs, offsets = _pickle_annotations(annotations)
+        buffer = mmap.mmap(-1, max(sum([len(b) for b in blobs]), 1))
+        for blob in blobs:
+            buffer.write(blob)
+        return cls(buffer, offsets)
+
+    def __getitem__(self, chrom):
+        if chrom not in self._genes:
+            start, end = self._offsets[chrom]
+            self._genes[chrom] = pickle.loads(self._buffer[start:end])
+        return self._genes[chrom]
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+
+def _pickle_annotations(annotations):
+    """
+    Returns:
+        tuple: the pickled genes for each chromosome and the (start, end) offsets of each chromosome when concatenated
+    """
+    blobs = []
+    offsets = {}
+    total = 0
+    for chrom, genes in annotations.items():
+        blob = pickle.dumps(genes, protocol=pickle.HIGHEST_PROTOCOL)
+        offsets[chrom] = (total, total + len(blob))
+        blobs.append(blob)
+        total += len(blob)
+    return blobs, offsets
+
+
+def is_compiled_annotations(filename):
+    """
+    Returns:
+        bool: True if the file starts with the compiled annotations file signature
+    """
+    with open(filename, 'rb') as fh:
+        return fh.read(len(COMPILED_ANNOTATIONS_MAGIC)) == COMPILED_ANNOTATIONS_MAGIC
+
+
+def write_compiled_annotations(annotations, filename):
+    """
+    writes the annotations as a compiled (binary) annotations file. The file starts with a signature,
+    the format version, and a json index of the chromosome offsets. This is followed by the genes for
+    each chromosome as a separate pickle
+
+    Args:
+        annotations (:class:`dict` of :class:`list` of :class:`Gene` by :class:`str`): the loaded reference annotations
+        filename (str): path to the output file
+    """
+    blobs, offsets = _pickle_annotations(annotations)
+    index = json.dumps(
+        {'mavis_version': __version__, 'chromosomes': {c: list(o) for c, o in offsets.items()}}
+    ).encode('utf8')
+    with open(filename, 'wb') as fh:
+        fh.write(COMPILED_ANNOTATIONS_MAGIC)
+        fh.write(struct.pack('<IQ', COMPILED_ANNOTATIONS_VERSION, len(index)))
+        fh.write(index)
+        for blob in blobs:
+            fh.write(blob)
+
+
+def load_compiled_annotations(filename):
+    """
+    memory maps a file written by :func:`write_compiled_annotations`. Genes are unpickled by chromosome as they are
+    requested
+
+    Args:
+        filename (str): path to the compiled annotations file
+
+    Returns:
+        SharedAnnotations: lists of genes keyed by chromosome name
+
+    Raises:
+        ValueError: if the file is not a compiled annotations file or was compiled by a different version of MAVIS
+    """
+    header_size = len(COMPILED_ANNOTATIONS_MAGIC) + struct.calcsize('<IQ')
+    with open(filename, 'rb') as fh:
+        header = fh.read(header_size)
+        if len(header) < header_size or not header.startswith(COMPILED_ANNOTATIONS_MAGIC):
+            raise ValueError('not a compiled annotations file', filename)
+        version, index_size = struct.unpack('<IQ', header[len(COMPILED_ANNOTATIONS_MAGIC) :])
+        if version != COMPILED_ANNOTATIONS_VERSION:
+            raise ValueError(
+                'unsupported compiled annotations format version ({}). Expected version {}'.format(
+                    version, COMPILED_ANNOTATIONS_VERSION
+                ),
+                filename,
+            )
+        index = json.loads(fh.read(index_size).decode('utf8'))
+        if index['mavis_version'] != __version__:
+            raise ValueError(
+                'annotations were compiled by MAVIS {} and must be re-compiled for MAVIS {}'.format(
+                    index['mavis_version'], __version__
+                ),
+                filename,
+            )
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    data_start = header_size + index_size
+    offsets = {
+        chrom: (start + data_start, end + data_start)
+        for chrom, (start, end) in index['chromosomes'].items()
+    }
+    return SharedAnnotations(buffer, offsets)
+
+
+def share_reference_genome(reference_genome):
+    """
+    Returns:
+        SharedReferenceGenome: the reference genome in shared memory. Lazily indexed references are returned as is
+    """
+    if isinstance(reference_genome, (IndexedReferenceGenome, SharedReferenceGenome)):
+        return reference_genome
+    return SharedReferenceGenome(reference_genome)
+
+
+def share_annotations(annotations):
+    """
+    Returns:
+        SharedAnnotations: the reference annotations serialized into shared memory
+    """
+    if isinstance(annotations, SharedAnnotations):
+        return annotations
+    return SharedAnnotations.from_annotations(annotations)
+
+
+def load_reference_genome(*filepaths, indexed=None):
     """
     Args:
         filepaths (list of str): the paths to the files containing the input fasta genomes
+        indexed (bool): read the sequences lazily from faidx-indexed fasta files. By default this
+            is used whenever every input file has a .fai index
 
     Returns:
         :class:`dict` of :class:`Bio.SeqRecord` by :class:`str`: a dictionary representing the sequences in the fasta file
     """
+    if indexed is None:
+        indexed = bool(filepaths) and all(os.path.exists(f + '.fai') for f in filepaths)
+    if indexed:
+        return IndexedReferenceGenome(*filepaths)
+
     reference_genome = {}
     for filename in filepaths:
         with open(filename, 'rU') as fh:
@@ -398,8 +848,10 @@ def load_reference_genome(*filepaths):
 
     names = list(reference_genome.keys())
 
-    # to fix hg38 issues
+    # to fix hg38 issues. The aliased name refers to the same record
     for template_name in names:
+        record = reference_genome[template_name].upper()
+        reference_genome[template_name] = record
         if template_name.startswith('chr'):
             truncated = re.sub('^chr', '', template_name)
             if truncated in reference_genome:
@@ -407,7 +859,7 @@ def load_reference_genome(*filepaths):
                     'template names {} and {} are considered equal but both have been defined in the reference'
                     'loaded'.format(template_name, truncated)
                 )
-            reference_genome.setdefault(truncated, reference_genome[template_name].upper())
+            reference_genome.setdefault(truncated, record)
         else:
             prefixed = 'chr' + template_name
             if prefixed in reference_genome:
@@ -415,8 +867,7 @@ def load_reference_genome(*filepaths):
                     'template names {} and {} are considered equal but both have been defined in the reference'
                     'loaded'.format(template_name, prefixed)
                 )
-            reference_genome.setdefault(prefixed, reference_genome[template_name].upper())
-        reference_genome[template_name] = reference_genome[template_name].upper()
+            reference_genome.setdefault(prefixed, record)
 
     return reference_genome
 
@@ -485,6 +936,12 @@ class ReferenceFile:
     }
     """:class:`dict`: Mapping of file types (based on ENV name) to load functions"""
 
+    SHARE_FUNCTIONS = {
+        'annotations': share_annotations,
+        'reference_genome': share_reference_genome,
+    }
+    """:class:`dict`: Mapping of file types to functions which move loaded content into shared memory"""
+
     def __init__(self, file_type, *filepaths, eager_load=False, assert_exists=False, **opt):
         """
         Args:
@@ -552,3 +1009,13 @@ class ReferenceFile:
             message = 'Error in loading files: {}. {}'.format(', '.join(self.name), err)
             raise err.__class__(message)
         return self
+
+    def share(self):
+        """
+        replace the loaded content (and its cache entry) with a read-only shared memory representation
+        which processes forked afterwards attach to without copying
+        """
+        share_function = self.SHARE_FUNCTIONS.get(self.file_type)
+        if self.content is not None and share_function is not None:
+            self.content = share_function(self.content)
+        return self
@@ -8,7 +8,7 @@ from ..breakpoint import Breakpoint, BreakpointPair
 from ..constants import COLUMNS, GENE_PRODUCT_TYPE, PROTOCOL, STOP_AA, STRAND, SVTYPE
 from ..error import NotSpecifiedError
 from ..interval import Interval
-from ..util import DEVNULL
+from ..util import DEVNULL, overlapping_pre_transcripts
 
 
 class Annotation(BreakpointPair):
@@ -515,16 +515,14 @@ def overlapping_transcripts(ref_ann, breakpoint):
         :class:`list` of :any:`PreTranscript`: a list of possible transcripts
     """
     putative_annotations = set()
-    for gene in ref_ann.get(breakpoint.chr, []):
-        for transcript in gene.transcripts:
-            if (
-                breakpoint.strand != STRAND.NS
-                and transcript.get_strand() != STRAND.NS
-                and transcript.get_strand() != breakpoint.strand
-            ):
-                continue
-            if Interval.overlaps(breakpoint, transcript):
-                putative_annotations.add(transcript)
+    for transcript in overlapping_pre_transcripts(ref_ann, breakpoint.chr, breakpoint):
+        if (
+            breakpoint.strand != STRAND.NS
+            and transcript.get_strand() != STRAND.NS
+            and transcript.get_strand() != breakpoint.strand
+        ):
+            continue
+        putative_annotations.add(transcript)
     return putative_annotations
 
 
@@ -551,13 +549,11 @@ def _gather_breakpoint_annotations(ref_ann, breakpoint):
 
     pos_overlapping_transcripts = []
     neg_overlapping_transcripts = []
-    for gene in ref_ann.get(breakpoint.chr, []):
-        for t in gene.transcripts:
-            if Interval.overlaps(t, breakpoint):
-                if STRAND.compare(t.get_strand(), STRAND.POS):
-                    pos_overlapping_transcripts.append(t)
-                if STRAND.compare(t.get_strand(), STRAND.NEG):
-                    neg_overlapping_transcripts.append(t)
+    for t in overlapping_pre_transcripts(ref_ann, breakpoint.chr, breakpoint):
+        if STRAND.compare(t.get_strand(), STRAND.POS):
+            pos_overlapping_transcripts.append(t)
+        if STRAND.compare(t.get_strand(), STRAND.NEG):
+            neg_overlapping_transcripts.append(t)
 
     pos_intervals = Interval.min_nonoverlapping(*pos_overlapping_transcripts)
     neg_intervals = Interval.min_nonoverlapping(*neg_overlapping_transcripts)
@@ -1,16 +1,27 @@
 import itertools
+import operator
 import warnings
 
 import distance
 import networkx as nx
 
 from .bam import cigar as _cigar
-from .bam.read import calculate_alignment_score, nsb_align, sequence_complexity
-from .constants import reverse_complement
+from .bam.read import NsbReference, calculate_alignment_score, nsb_align, sequence_complexity
+from .constants import MavisNamespace, reverse_complement
 from .interval import Interval
 from .util import DEVNULL
 
 
+ASSEMBLY_ENGINE = MavisNamespace(
+    NETWORKX='networkx', KMER='kmer', __name__='~mavis.assemble.ASSEMBLY_ENGINE'
+)
+""":class:`~mavis.constants.MavisNamespace`: supported assembly engines
+
+- ``networkx``: string k-mers in a :class:`DeBruijnGraph`
+- ``kmer``: integer encoded k-mers in a :class:`KmerGraph`
+"""
+
+
 class Contig:
     """
     """
@@ -150,23 +161,23 @@ class DeBruijnGraph(nx.DiGraph):
         current_edges = list(self.all_edges(data=True))
         for src, tgt, data in sorted(current_edges, key=lambda x: (x[2]['freq'], x[0], x[1])):
             # come up with the path by extending this edge either direction until the degree > 2
-            if not self.has_node(src) or not self.has_node(tgt) or not self.has_edge(src, tgt):
+            if src not in self.succ or tgt not in self.succ[src]:
                 continue
 
             if src == tgt and data['freq'] < min_weight:
                 self.remove_edge(src, tgt)
             else:
                 path = []
-                while self.in_degree(src) == 1 and self.out_degree(src) == 1:
-                    s, t, data = self.in_edges(src, data=True)[0]
+                while len(self.pred[src]) == 1 and len(self.succ[src]) == 1:
+                    s, data = next(iter(self.pred[src].items()))
                     if data['freq'] >= min_weight or s in path:
                         break
                     path.insert(0, src)
                     src = s
                 path.insert(0, src)
 
-                while self.in_degree(tgt) == 1 and self.out_degree(tgt) == 1:
-                    s, t, data = self.out_edges(tgt, data=True)[0]
+                while len(self.pred[tgt]) == 1 and len(self.succ[tgt]) == 1:
+                    t, data = next(iter(self.succ[tgt].items()))
                     if data['freq'] >= min_weight or t in path:
                         break
                     path.append(tgt)
@@ -188,6 +199,43 @@ class DeBruijnGraph(nx.DiGraph):
                     for node in path[1:-1]:
                         self.remove_node(node)
 
+    def edge_freqs(self, nodes):
+        """
+        returns the freq of all incoming and outgoing edges of the given nodes
+        """
+        return [data['freq'] for src, tgt, data in self.all_edges(nodes, data=True)]
+
+    def out_edge_freqs(self, node):
+        """
+        returns the outgoing edges of a node as (tgt, freq) tuples
+        """
+        return [(tgt, data['freq']) for tgt, data in self.succ[node].items()]
+
+    def connected_components(self, subgraph=None):
+        """
+        see :func:`digraph_connected_components`
+        """
+        return list(digraph_connected_components(self, subgraph))
+
+    def unitig(self, start):
+        """
+        follow the non-branching path starting from a given node
+
+        Returns:
+            Tuple[:class:`list`, int]: the nodes along the path and the sum of the freq of the edges between them
+        """
+        nodes = [start]
+        score = 0
+        curr = start
+        while self.out_degree(curr) == 1:
+            tgt, data = next(iter(self.succ[curr].items()))
+            if self.in_degree(tgt) != 1 or tgt == start:
+                break
+            nodes.append(tgt)
+            score += data['freq']
+            curr = tgt
+        return nodes, score
+
     def get_sinks(self, subgraph=None):
         """
         returns all nodes with an outgoing degree of zero
@@ -240,41 +288,40 @@ def digraph_connected_components(graph, subgraph=None):
 
 
 def pull_contigs_from_component(
-    assembly, component, min_edge_trim_weight, assembly_max_paths, log=DEVNULL
+    assembly, component, min_edge_trim_weight, assembly_max_paths, log=DEVNULL, encoding=None
 ):
     """
     builds contigs from the a connected component of the assembly DeBruijn graph
 
+    Non-branching paths are compacted into unitigs before the paths are enumerated. Components with
+    too many paths are simplified by trimming a copy of that component only so that the remaining
+    components are unaffected
+
     Args:
-        assembly (DeBruijnGraph): the assembly graph
+        assembly (DeBruijnGraph): the assembly graph (or :class:`KmerGraph`)
         component (list):  list of nodes which make up the connected component
         min_edge_trim_weight (int): the minimum weight to not remove a non cutting edge/path
         assembly_max_paths (int): the maximum number of paths allowed before the graph is further simplified
         log (function): the log function
+        encoding (IntegerKmerEncoding): the encoding of the nodes if they are not sequences
 
     Returns:
         :class:`Dict` of :class:`int` by :class:`str`: the paths/contigs and their scores
     """
     path_scores = {}  # path_str => score_int
-    w = min_edge_trim_weight
 
-    unresolved_components = [component]
+    unresolved_components = [(assembly, component, min_edge_trim_weight)]
 
     while unresolved_components:
         # since now we know it's a tree, the assemblies will all be ltd to
         # simple paths
-        component = unresolved_components.pop(0)
-        paths_est = len(assembly.get_sinks(component)) * len(assembly.get_sources(component))
+        graph, component, w = unresolved_components.pop(0)
+        sources = graph.get_sources(component)
+        sinks = graph.get_sinks(component)
+        paths_est = len(sinks) * len(sources)
 
         if paths_est > assembly_max_paths:
-            edge_weights = sorted(
-                [
-                    e[2]['freq']
-                    for e in assembly.all_edges(
-                        assembly.get_sources(component) | assembly.get_sinks(component), data=True
-                    )
-                ]
-            )
+            edge_weights = sorted(graph.edge_freqs(sources | sinks))
             w = max([w + 1, edge_weights[0]])
 
             if w > edge_weights[-1]:
@@ -286,54 +333,524 @@ def pull_contigs_from_component(
                 'filter increase',
                 w,
             )
-            assembly.trim_forks_by_freq(w)
-            assembly.trim_noncutting_paths_by_freq(w)
-            assembly.trim_tails_by_freq(w)
+            if len(component) < len(graph):
+                graph = graph.subgraph(component)
+            graph.trim_forks_by_freq(w)
+            graph.trim_noncutting_paths_by_freq(w)
+            graph.trim_tails_by_freq(w)
 
-            unresolved_components.extend(digraph_connected_components(assembly, component))
+            unresolved_components.extend(
+                [(graph, subcomponent, w) for subcomponent in graph.connected_components()]
+            )
         else:
-            for source, sink in itertools.product(
-                assembly.get_sources(component), assembly.get_sinks(component)
-            ):
-                for path in nx.all_simple_paths(assembly, source, sink):
-                    s = path[0] + ''.join([p[-1] for p in path[1:]])
-                    score = 0
-                    for i in range(0, len(path) - 1):
-                        score += assembly.get_edge_freq(path[i], path[i + 1])
-                    path_scores[s] = max(path_scores.get(s, 0), score)
+            for seq, score in _unitig_path_scores(graph, sources, encoding):
+                path_scores[seq] = max(path_scores.get(seq, 0), score)
     return path_scores
 
 
+def _unitig_path_scores(assembly, sources, encoding=None):
+    """
+    enumerates all paths from the given source nodes over the unitigs of the graph
+
+    Yields:
+        Tuple[str, int]: the sequence of the path and the sum of the edge freq along it
+    """
+    if encoding is None:
+        decode = str
+        last_char = operator.itemgetter(-1)
+    else:
+        decode = encoding.decode
+        last_char = encoding.last_char
+    unitigs = {}  # first node => (sequence added by the unitig, score, last node)
+
+    def compact(start):
+        if start not in unitigs:
+            nodes, score = assembly.unitig(start)
+            unitigs[start] = (''.join([last_char(n) for n in nodes]), score, nodes[-1])
+        return unitigs[start]
+
+    for source in sorted(sources):
+        seq, score, last = compact(source)
+        stack = [(decode(source) + seq[1:], score, last, last != source)]
+        while stack:
+            seq, score, last, has_edges = stack.pop()
+            out_edges = assembly.out_edge_freqs(last)
+            if not out_edges:
+                if has_edges:  # a path must have at least one edge
+                    yield seq, score
+                continue
+            for tgt, freq in out_edges:
+                tail, tail_score, tail_last = compact(tgt)
+                stack.append((seq + tail, score + freq + tail_score, tail_last, True))
+
+
+class IntegerKmerEncoding:
+    """
+    packs fixed length sequences into integers using the fewest bits per character that will
+    represent the alphabet of the input sequences (2 bits for plain ACGT sequences)
+
+    Characters are ranked alphabetically so that sorting the encoded values gives the same order
+    as sorting the original sequences
+
+    Args:
+        sequences (:class:`list` of :class:`str`): the sequences which will be encoded
+        size (int): the length of the sequences (k-mers) to be encoded
+    """
+
+    DIGITS = '0123456789abcdefghijklmnopqrstuv'
+
+    def __init__(self, sequences, size):
+        self.alphabet = sorted(set(itertools.chain.from_iterable(sequences)))
+        if len(self.alphabet) > len(self.DIGITS):
+            raise ValueError(
+                'cannot encode an alphabet of more than {} characters'.format(len(self.DIGITS)),
+                len(self.alphabet),
+            )
+        self.size = size
+        self.bits = max(1, (len(self.alphabet) - 1).bit_length())
+        self.char_mask = (1 << self.bits) - 1
+        self.mask = (1 << (self.bits * size)) - 1
+        self._translation = str.maketrans(''.join(self.alphabet), self.DIGITS[: len(self.alphabet)])
+
+    def windows(self, seq):
+        """
+        encode all substrings of the encoding size from an input sequence
+
+        Returns:
+            :class:`list` of :class:`int`: the encoded substrings in the order they occur in the sequence
+        """
+        value = int(seq.translate(self._translation), 1 << self.bits)
+        bits = self.bits
+        mask = self.mask
+        return [
+            (value >> shift) & mask for shift in range((len(seq) - self.size) * bits, -1, -bits)
+        ]
+
+    def decode(self, value):
+        """
+        convert an encoded value back to the original sequence
+        """
+        return ''.join(
+            [
+                self.alphabet[(value >> shift) & self.char_mask]
+                for shift in range((self.size - 1) * self.bits, -1, -self.bits)
+            ]
+        )
+
+    def last_char(self, value):
+        """
+        returns the last character of an encoded sequence
+        """
+        return self.alphabet[value & self.char_mask]
+
+
+class KmerGraph:
+    """
+    DeBruijn graph which does not depend on networkx. Edge frequencies are stored directly in the
+    successor and predecessor tables and the trimming methods follow the same rules as the
+    equivalent :class:`DeBruijnGraph` methods
+
+    Nodes are expected to be integer encoded k-mers (see :class:`IntegerKmerEncoding`) but any
+    sortable and hashable value can be used
+    """
+
+    def __init__(self):
+        self.succ = {}
+        self.pred = {}
+
+    def add_node(self, node):
+        if node not in self.succ:
+            self.succ[node] = {}
+            self.pred[node] = {}
+
+    def add_edge(self, n1, n2, freq=1):
+        """
+        add a given edge to the graph, if it exists add the frequency to the existing frequency count
+        """
+        if n1 not in self.succ:
+            self.add_node(n1)
+        if n2 not in self.succ:
+            self.add_node(n2)
+        freq += self.succ[n1].get(n2, 0)
+        self.succ[n1][n2] = freq
+        self.pred[n2][n1] = freq
+
+    def __len__(self):
+        return len(self.succ)
+
+    def has_node(self, node):
+        return node in self.succ
+
+    def has_edge(self, n1, n2):
+        return n1 in self.succ and n2 in self.succ[n1]
+
+    def get_edge_freq(self, n1, n2):
+        """
+        returns the freq for a specified edge
+        """
+        if not self.has_edge(n1, n2):
+            raise KeyError('missing edge', n1, n2)
+        return self.succ[n1][n2]
+
+    def nodes(self):
+        return list(self.succ)
+
+    def edges(self):
+        return [(src, tgt) for src, targets in self.succ.items() for tgt in targets]
+
+    def in_degree(self, node):
+        return len(self.pred[node])
+
+    def out_degree(self, node):
+        return len(self.succ[node])
+
+    def degree(self, node):
+        return len(self.pred[node]) + len(self.succ[node])
+
+    def all_edges(self, node):
+        """
+        returns the incoming and then outgoing edges of a node as (src, tgt, freq) tuples
+        """
+        return [(src, node, freq) for src, freq in self.pred[node].items()] + [
+            (node, tgt, freq) for tgt, freq in self.succ[node].items()
+        ]
+
+    def edge_freqs(self, nodes):
+        """
+        returns the freq of all incoming and outgoing edges of the given nodes
+        """
+        return [freq for node in nodes for src, tgt, freq in self.all_edges(node)]
+
+    def out_edge_freqs(self, node):
+        """
+        returns the outgoing edges of a node as (tgt, freq) tuples
+        """
+        return list(self.succ[node].items())
+
+    def remove_edge(self, n1, n2):
+        del self.succ[n1][n2]
+        del self.pred[n2][n1]
+
+    def remove_node(self, node):
+        for tgt in self.succ.pop(node):
+            del self.pred[tgt][node]
+        for src in self.pred.pop(node):
+            del self.succ[src][node]
+
+    def subgraph(self, nodes):
+        """
+        returns a copy of the graph restricted to the given nodes
+        """
+        graph = KmerGraph()
+        for node in nodes:
+            if node in self.succ:
+                graph.succ[node] = {
+                    tgt: freq for tgt, freq in self.succ[node].items() if tgt in nodes
+                }
+                graph.pred[node] = {
+                    src: freq for src, freq in self.pred[node].items() if src in nodes
+                }
+        return graph
+
+    def has_path(self, source, target):
+        """
+        check if the target node is reachable from the source node
+        """
+        if source == target:
+            return True
+        visited = {source}
+        queue = [source]
+        while queue:
+            for tgt in self.succ[queue.pop()]:
+                if tgt == target:
+                    return True
+                if tgt not in visited:
+                    visited.add(tgt)
+                    queue.append(tgt)
+        return False
+
+    def is_acyclic(self, nodes=None):
+        """
+        check that the graph (or the part of the graph spanned by the given nodes) has no cycles
+        """
+        if nodes is None:
+            nodes = self.succ
+        in_degree = {node: sum([1 for src in self.pred[node] if src in nodes]) for node in nodes}
+        queue = [node for node, degree in in_degree.items() if degree == 0]
+        resolved = 0
+        while queue:
+            resolved += 1
+            for tgt in self.succ[queue.pop()]:
+                if tgt in in_degree:
+                    in_degree[tgt] -= 1
+                    if in_degree[tgt] == 0:
+                        queue.append(tgt)
+        return resolved == len(in_degree)
+
+    def connected_components(self, subgraph=None):
+        """
+        returns the weakly connected components of the graph. Components are returned in the same
+        order as :func:`digraph_connected_components` would return them
+
+        Args:
+            subgraph (set): restrict the components to this set of nodes
+
+        Returns:
+            :class:`list` of :class:`set`: the nodes in each component
+        """
+        if subgraph is None:
+            subgraph = self.succ
+        components = []
+        visited = set()
+        # components are ordered by the first node (in insertion order) with an edge in the subgraph
+        for node in self.succ:
+            if node in visited or node not in subgraph:
+                continue
+            if not any([tgt in subgraph for tgt in self.succ[node]]):
+                continue
+            component = {node}
+            queue = [node]
+            while queue:
+                curr = queue.pop()
+                for adj in itertools.chain(self.succ[curr], self.pred[curr]):
+                    if adj not in component and adj in subgraph:
+                        component.add(adj)
+                        queue.append(adj)
+            visited.update(component)
+            components.append(component)
+        # followed by any nodes without edges
+        for node in subgraph:
+            if node in self.succ and node not in visited:
+                components.append({node})
+        return components
+
+    def unitig(self, start):
+        """
+        follow the non-branching path starting from a given node
+
+        Returns:
+            Tuple[:class:`list`, int]: the nodes along the path and the sum of the freq of the edges between them
+        """
+        nodes = [start]
+        score = 0
+        curr = start
+        while len(self.succ[curr]) == 1:
+            tgt, freq = next(iter(self.succ[curr].items()))
+            if len(self.pred[tgt]) != 1 or tgt == start:
+                break
+            nodes.append(tgt)
+            score += freq
+            curr = tgt
+        return nodes, score
+
+    def trim_tails_by_freq(self, min_weight):
+        """
+        for any paths where all edges are lower than the minimum weight trim
+
+        Args:
+            min_weight (int): the minimum weight for an edge to be retained
+        """
+        ends = sorted([n for n in self.succ if not self.succ[n] or not self.pred[n]])
+        visited = set()
+
+        while ends:
+            curr = ends.pop()
+            if curr not in self.succ or curr in visited:
+                continue
+            visited.add(curr)
+            # follow until the path forks or we run out of low weigh edges
+            if not self.succ[curr] or not self.pred[curr]:
+                for src, tgt, freq in self.all_edges(curr):
+                    if freq < min_weight:
+                        self.remove_edge(src, tgt)
+                    if src not in visited:
+                        ends.append(src)
+                    if tgt not in visited:
+                        ends.append(tgt)
+
+        # remove any resulting singlets
+        for node in visited:
+            if node in self.succ and not self.succ[node] and not self.pred[node]:
+                self.remove_node(node)
+
+    def trim_forks_by_freq(self, min_weight):
+        """
+        for all nodes in the graph, if the node has an out-degree > 1 and one of the outgoing
+        edges has freq < min_weight. then that outgoing edge is deleted
+        """
+        nodes = [n for n in self.succ if len(self.succ[n]) + len(self.pred[n]) > 2]
+        for node in sorted(nodes):
+            if len(self.succ[node]) > 1:
+                outgoing_edges = list(self.succ[node].items())
+                best = max([freq for tgt, freq in outgoing_edges])
+                for tgt, freq in outgoing_edges:
+                    if freq < min_weight and freq != best:
+                        self.remove_edge(node, tgt)
+            if len(self.pred[node]) > 1:
+                ingoing_edges = list(self.pred[node].items())
+                best = max([freq for src, freq in ingoing_edges])
+                for src, freq in ingoing_edges:
+                    if freq < min_weight and freq != best:
+                        self.remove_edge(src, node)
+
+    def trim_noncutting_paths_by_freq(self, min_weight):
+        """
+        trim any low weight edges where another path exists between the source and target
+        of higher weight
+        """
+        current_edges = [
+            (freq, src, tgt) for src, targets in self.succ.items() for tgt, freq in targets.items()
+        ]
+        for edge_freq, src, tgt in sorted(current_edges):
+            # come up with the path by extending this edge either direction until the degree > 2
+            if src not in self.succ or tgt not in self.succ or tgt not in self.succ[src]:
+                continue
+
+            if src == tgt and edge_freq < min_weight:
+                self.remove_edge(src, tgt)
+            else:
+                path = []
+                while len(self.pred[src]) == 1 and len(self.succ[src]) == 1:
+                    s, freq = next(iter(self.pred[src].items()))
+                    if freq >= min_weight or s in path:
+                        break
+                    path.insert(0, src)
+                    src = s
+                path.insert(0, src)
+
+                while len(self.pred[tgt]) == 1 and len(self.succ[tgt]) == 1:
+                    t, freq = next(iter(self.succ[tgt].items()))
+                    if freq >= min_weight or t in path:
+                        break
+                    path.append(tgt)
+                    tgt = t
+                path.append(tgt)
+                start_edge_freq = self.succ[path[0]][path[1]]
+                self.remove_edge(path[0], path[1])
+
+                end_edge_freq = None
+                if len(path) > 2:
+                    end_edge_freq = self.succ[path[-2]][path[-1]]
+                    self.remove_edge(path[-2], path[-1])
+
+                if not self.has_path(src, tgt):
+                    self.add_edge(path[0], path[1], start_edge_freq)
+                    if len(path) > 2:
+                        self.add_edge(path[-2], path[-1], end_edge_freq)
+                else:
+                    for node in path[1:-1]:
+                        self.remove_node(node)
+
+    def get_sinks(self, subgraph=None):
+        """
+        returns all nodes with an outgoing degree of zero
+        """
+        if subgraph is None:
+            subgraph = self.succ
+        return {node for node in subgraph if node in self.succ and not self.succ[node]}
+
+    def get_sources(self, subgraph=None):
+        """
+        returns all nodes with an incoming degree of zero
+        """
+        if subgraph is None:
+            subgraph = self.succ
+        return {node for node in subgraph if node in self.pred and not self.pred[node]}
+
+
+def _max_mismatches(length, assembly_min_uniq):
+    """
+    the largest number of mismatches between two sequences of a given length for which the
+    normalized hamming distance is still below the minimum uniqueness threshold
+    """
+    mismatches = min(length, int(assembly_min_uniq * length) + 1)
+    while mismatches >= 0 and mismatches / float(length) >= assembly_min_uniq:
+        mismatches -= 1
+    return mismatches
+
+
+def _has_similar_window(query, target, max_mismatches, assembly_min_uniq):
+    """
+    check if any window of the target sequence is similar to the query sequence. Any window within
+    the maximum number of mismatches must match one of max_mismatches + 1 non-overlapping segments of
+    the query exactly, so only windows which contain one of these segments are compared
+    """
+    length = len(query)
+    seed_size = length // (max_mismatches + 1)
+    if seed_size < 1:
+        offsets = range(0, len(target) - length + 1)
+    else:
+        offsets = set()
+        for seed_start in range(0, seed_size * (max_mismatches + 1), seed_size):
+            seed = query[seed_start : seed_start + seed_size]
+            pos = target.find(seed)
+            while pos >= 0:
+                offset = pos - seed_start
+                if 0 <= offset <= len(target) - length:
+                    offsets.add(offset)
+                pos = target.find(seed, pos + 1)
+    for offset in offsets:
+        window = target[offset : offset + length]
+        if distance.hamming(query, window, normalized=True) < assembly_min_uniq:
+            return True
+    return False
+
+
 def filter_contigs(contigs, assembly_min_uniq=0.01):
     """
     given a list of contigs, removes similar contigs to leave the highest (of the similar) scoring contig only
+
+    Two contigs are similar when the shorter sequence (or its reverse complement) is less than
+    assembly_min_uniq different (normalized hamming distance) from some window of the longer
+    sequence. Similar sequences must share an exact seed so the kept contigs are indexed by their
+    seeds and only contigs sharing a seed are compared
     """
+    max_mismatches = {}
+    seed_sizes = []
+    for length in {len(c.seq) for c in contigs}:
+        if length:
+            max_mismatches[length] = _max_mismatches(length, assembly_min_uniq)
+            if max_mismatches[length] >= 0:
+                seed_sizes.append(length // (max_mismatches[length] + 1))
+    seed_size = min(seed_sizes) if seed_sizes else 0
+    seed_index = {}  # seed => kept sequences containing the seed
     filtered_contigs = {}
     # ordering: highest scoring, then longest, then aphanumeric
     for contig in sorted(contigs, key=lambda x: (-1 * x.score, -1 * len(x.seq), x.seq)):
         rseq = reverse_complement(contig.seq)
         if contig.seq in filtered_contigs or rseq in filtered_contigs:
             continue
+        if seed_size > 0:
+            candidates = set()
+            for seq in [contig.seq, rseq]:
+                for seed in kmers(seq, seed_size):
+                    candidates.update(seed_index.get(seed, []))
+        else:
+            candidates = filtered_contigs
         drop = False
         # drop all contigs that are more than 'x' percent similar to existing contigs
-        for other_seq in filtered_contigs:
+        for other_seq in candidates:
             kmer_length = min(len(other_seq), len(contig.seq))
-            okmer_list = set(kmers(other_seq, kmer_length))
-
-            for okmer, ckmer in itertools.product(okmer_list, set(kmers(contig.seq, kmer_length))):
-                if distance.hamming(okmer, ckmer, normalized=True) < assembly_min_uniq:
+            if not kmer_length or max_mismatches[kmer_length] < 0:
+                continue
+            if len(other_seq) <= len(contig.seq):
+                queries, targets = [other_seq], [contig.seq, rseq]
+            else:
+                queries, targets = [contig.seq, rseq], [other_seq]
+            for query, target in itertools.product(queries, targets):
+                if _has_similar_window(
+                    query, target, max_mismatches[kmer_length], assembly_min_uniq
+                ):
                     drop = True
                     break
-            if not drop:
-                for okmer, ckmer in itertools.product(okmer_list, set(kmers(rseq, kmer_length))):
-                    if distance.hamming(okmer, ckmer, normalized=True) < assembly_min_uniq:
-                        drop = True
-                        break
             if drop:
                 break
 
         if not drop:
             filtered_contigs[contig.seq] = contig
+            if seed_size > 0:
+                for seed in kmers(contig.seq, seed_size):
+                    seed_index.setdefault(seed, set()).add(contig.seq)
 
     return list(filtered_contigs.values())
 
@@ -364,6 +881,7 @@ def assemble(
         min_contig_length: Minimum length of contigs assemble to attempt remapping reads to. Shorter contigs will be ignored
         remap_min_exact_match: see :term:`assembly_min_exact_match_to_remap`
         assembly_max_paths: see :term:`assembly_max_paths`
+        assembly_engine: see :term:`assembly_engine`
         log (function): the log function
 
     Returns:
@@ -378,8 +896,104 @@ def assemble(
     remap_min_exact_match = kwargs.pop('remap_min_exact_match', 6)
     remap_min_match = kwargs.pop('remap_min_match', 0.95)
 
+    assembly_engine = ASSEMBLY_ENGINE.enforce(
+        kwargs.pop('assembly_engine', ASSEMBLY_ENGINE.NETWORKX)
+    )
+
     if kwargs:
         raise TypeError('unrecognized keyword argument(s)', kwargs)
+
+    if assembly_engine == ASSEMBLY_ENGINE.KMER:
+        path_scores = _assemble_kmer_graph(
+            sequences, kmer_size, min_edge_trim_weight, assembly_max_paths, log
+        )
+    else:
+        path_scores = _assemble_debruijn_graph(
+            sequences, kmer_size, min_edge_trim_weight, assembly_max_paths, log
+        )
+
+    # now map the contigs to the possible input sequences
+    log('filtering contigs by size and complexity', len(path_scores), time_stamp=False)
+    contigs = []
+    for seq, score in list(path_scores.items()):
+        contig = Contig(seq, score)
+        if len(contig.seq) >= min_contig_length and (
+            not min_complexity or contig.complexity() >= min_complexity
+        ):
+            contigs.append(contig)
+    log('filtering similar contigs', len(contigs))
+    # remap the input reads
+    contigs = filter_contigs(contigs, assembly_min_uniq)
+    log('remapping reads to {} contigs'.format(len(contigs)))
+    remapped = remap_sequences(
+        sequences,
+        contigs,
+        remap_min_overlap=remap_min_overlap,
+        remap_min_match=remap_min_match,
+        remap_min_exact_match=remap_min_exact_match,
+    )
+    for alignments in remapped.values():
+        for contig, read, multimap in alignments:
+            contig.add_mapped_sequence(read, multimap)
+    log('assemblies complete')
+    return contigs
+
+
+def remap_sequences(
+    sequences, contigs, remap_min_overlap, remap_min_match=0.95, remap_min_exact_match=6
+):
+    """
+    maps a set of input sequences to a set of contigs. Identical sequences are only aligned once. Each
+    sequence is kept only on the contig(s) with the best unique alignment
+
+    Args:
+        sequences (:class:`list` of :class:`str`): the sequences to remap (may contain duplicates)
+        contigs (:class:`list` of :class:`Contig`): the contigs to remap the sequences to
+        remap_min_overlap: Minimum amount of overlap between the contig and the remapped sequence
+        remap_min_match: Minimum match percentage of the remapped sequence (based on the exact matches in the cigar)
+        remap_min_exact_match: see :term:`assembly_min_exact_match_to_remap`
+
+    Returns:
+        :class:`dict` of :class:`list` of :class:`tuple` of :class:`Contig`, :class:`~mavis.bam.read.SamRead`, and :class:`int` by :class:`str`:
+            the best alignments and the number of contigs the sequence maps to (multimap) by input sequence.
+            Sequences which do not map to any contig are omitted
+    """
+    references = [(contig, NsbReference(contig.seq)) for contig in contigs]
+    result = {}
+    for input_seq in dict.fromkeys(sequences):
+        maps_to = []
+        for contig, reference in references:
+            alignment = nsb_align(
+                reference,
+                input_seq,
+                min_overlap_percent=min(
+                    1, remap_min_overlap / len(input_seq)
+                ),  # accounts for hardclipped reads which may be short
+                min_match=remap_min_match,
+                min_consecutive_match=remap_min_exact_match,
+            )
+            if len(alignment) != 1:
+                continue
+            if _cigar.match_percent(alignment[0].cigar) < remap_min_match:
+                continue
+            read = alignment[0]
+            score = (calculate_alignment_score(read), read.reference_end - read.reference_start)
+            maps_to.append((contig, read, score))
+        if maps_to:
+            max_score = max([score for contig, read, score in maps_to])
+            best_alignments = [
+                (contig, read) for contig, read, score in maps_to if score == max_score
+            ]
+            result[input_seq] = [
+                (contig, read, len(best_alignments)) for contig, read in best_alignments
+            ]
+    return result
+
+
+def _assemble_debruijn_graph(sequences, kmer_size, min_edge_trim_weight, assembly_max_paths, log):
+    """
+    builds and simplifies a :class:`DeBruijnGraph` and returns the scores of the paths through it
+    """
     assembly = DeBruijnGraph()
     for s in sequences:
         if len(s) < kmer_size:
@@ -418,52 +1032,45 @@ def assemble(
             )
         )
 
-    # now map the contigs to the possible input sequences
-    log('filtering contigs by size and complexity', len(path_scores), time_stamp=False)
-    contigs = []
-    for seq, score in list(path_scores.items()):
-        contig = Contig(seq, score)
-        if len(contig.seq) >= min_contig_length and (
-            not min_complexity or contig.complexity() >= min_complexity
-        ):
-            contigs.append(contig)
-    log('filtering similar contigs', len(contigs))
-    # remap the input reads
-    contigs = filter_contigs(contigs, assembly_min_uniq)
-    log('remapping reads to {} contigs'.format(len(contigs)))
+    return path_scores
 
-    for input_seq in sequences:
-        maps_to = {}  # contig, score
-        for contig in contigs:
-            alignment = nsb_align(
-                contig.seq,
-                input_seq,
-                min_overlap_percent=min(
-                    1, remap_min_overlap / len(input_seq)
-                ),  # accounts for hardclipped reads which may be short
-                min_match=remap_min_match,
-                min_consecutive_match=remap_min_exact_match,
+
+def _assemble_kmer_graph(sequences, kmer_size, min_edge_trim_weight, assembly_max_paths, log):
+    """
+    builds and simplifies a :class:`KmerGraph` and returns the scores of the paths through it
+    """
+    encoding = IntegerKmerEncoding(sequences, kmer_size - 1)
+    assembly = KmerGraph()
+    for s in sequences:
+        if len(s) < kmer_size:
+            continue
+        nodes = encoding.windows(s)
+        for src, tgt in zip(nodes, nodes[1:]):
+            assembly.add_edge(src, tgt)
+    # drop all cyclic components
+    for component in assembly.connected_components():
+        if not assembly.is_acyclic(component):
+            log('dropping cyclic component', time_stamp=False)
+            for node in component:
+                assembly.remove_node(node)
+    # initial data cleaning
+    assembly.trim_forks_by_freq(min_edge_trim_weight)
+    assembly.trim_tails_by_freq(min_edge_trim_weight)
+    assembly.trim_noncutting_paths_by_freq(min_edge_trim_weight)
+
+    path_scores = {}
+    for component in assembly.connected_components():
+        path_scores.update(
+            pull_contigs_from_component(
+                assembly.subgraph(component),
+                component,
+                min_edge_trim_weight=min_edge_trim_weight,
+                assembly_max_paths=assembly_max_paths,
+                log=log,
+                encoding=encoding,
             )
-            if len(alignment) != 1:
-                continue
-            if _cigar.match_percent(alignment[0].cigar) < remap_min_match:
-                continue
-            maps_to[contig] = alignment[0]
-        if maps_to:
-            scores = []
-            for contig, read in maps_to.items():
-                score = calculate_alignment_score(read)
-                scores.append((contig, read, score, read.reference_end - read.reference_start))
-            max_score = max([(t[2], t[3]) for t in scores])[0:2]
-            best_alignments = []
-            for contig, read, score1, score2 in scores:
-                if max_score == (score1, score2):
-                    best_alignments.append((contig, read))
-            assert len(best_alignments) >= 1
-            for contig, read in best_alignments:
-                contig.add_mapped_sequence(read, len(best_alignments))
-    log('assemblies complete')
-    return contigs
+        )
+    return path_scores
 
 
 def kmers(s, size):
@@ -1,29 +1,123 @@
 import atexit
+from bisect import bisect_left
+from collections import OrderedDict
 import logging
 import re
 import warnings
 
 import pysam
 
-from .read import SamRead
+from .read import CompactRead, SamRead, full_read
 from ..annotate.base import ReferenceName
 from ..interval import Interval
 from .. import util as _util
 
 
+def _fetch_end(read):
+    """
+    the end position used by htslib when deciding if a read overlaps a fetched region. Reads which
+    do not consume any reference positions (including unmapped reads placed beside their mate) are
+    treated as covering a single position
+    """
+    if read.is_unmapped or not read.reference_end:
+        return read.reference_start + 1
+    return max(read.reference_end, read.reference_start + 1)
+
+
+class PrefetchRegion:
+    """
+    a merged region of the bam file which is read once and then shared by all of the evidence
+    windows it contains
+    """
+
+    def __init__(self, chrom, start, end, max_reads=None):
+        """
+        Args:
+            chrom (str): the reference name (as it appears in the bam header)
+            start (int): the start position (same coordinates as passed to fetch)
+            end (int): the end position
+            max_reads (int): the maximum number of reads to buffer before giving up on the region
+        """
+        self.chrom = chrom
+        self.start = start
+        self.end = end
+        self.max_reads = max_reads
+        self.pending = 0  # number of windows which have not yet been released
+        self.reads = None
+        self.starts = []
+        self.ends = []
+        self.max_span = 0
+        self.dense = False
+
+    def covers(self, start, end):
+        return self.start <= start and end <= self.end
+
+    @property
+    def loaded(self):
+        return self.reads is not None
+
+    def load(self, fh):
+        """
+        read all alignments overlapping this region from the bam file. If there are more than
+        max_reads alignments the region is marked as dense and nothing is buffered since direct
+        fetching with read limits will be cheaper
+        """
+        reads = []
+        for read in fh.fetch(self.chrom, self.start, self.end):
+            if self.max_reads is not None and len(reads) >= self.max_reads:
+                self.dense = True
+                reads = []
+                break
+            reads.append(read)
+        self.reads = reads
+        self.starts = [r.reference_start for r in reads]
+        self.ends = [_fetch_end(r) for r in reads]
+        self.max_span = max([e - s for s, e in zip(self.starts, self.ends)] + [0])
+
+    def fetch(self, start, end):
+        """
+        yields the buffered reads overlapping the input region, in the same order they would be
+        returned by fetching the region directly from the bam file
+        """
+        for i in range(bisect_left(self.starts, start - self.max_span), len(self.reads)):
+            if self.starts[i] >= end:
+                break
+            if self.ends[i] > start:
+                yield self.reads[i]
+
+    def release(self):
+        self.reads = None
+        self.starts = []
+        self.ends = []
+
+
 class BamCache:
     """
     caches reads by name to facilitate getting read mates without jumping around
-    the file if we've already read that section
+    the file if we've already read that section. Reads are cached as compact records
+    (see :class:`~mavis.bam.read.CompactRead`)
     """
 
-    def __init__(self, bamfile, stranded=False):
+    def __init__(self, bamfile, stranded=False, max_cache_bytes=None):
         """
         Args:
             bamfile (str): path to the input bam file
+            stranded (bool): the bam file is from a strand specific protocol
+            max_cache_bytes (int): the maximum (approximate) size in bytes of the cached reads. When this is exceeded
+              the least recently used read groups (by query name) are evicted
         """
-        self.cache = {}
+        self.cache = OrderedDict()  # read groups by query name in order of last use
+        # cached reads by (query_name, is_read1, reference_id, reference_start)
+        self.mate_index = {}
         self.stranded = stranded
+        self.max_cache_bytes = max_cache_bytes
+        self.cache_size = 0  # total number of reads in the cache
+        self.cache_bytes = 0  # approximate size of the cached reads in bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetch_regions = {}  # prefetch regions by chromosome
+        self.prefetch_windows = {}  # prefetch region(s) for each planned window
         self.fh = bamfile
         if not hasattr(bamfile, 'fetch'):
             self.fh = pysam.AlignmentFile(bamfile, 'rb')
@@ -52,11 +146,82 @@ class BamCache:
         if not read.is_unmapped and read.reference_start == read.reference_end:
             _util.LOG('ignoring invalid read', read.query_name, level=logging.DEBUG)
             return
-        if not isinstance(read, SamRead):
-            read = SamRead.copy(read)
+        read = CompactRead.from_read(read)
         self.cache.setdefault(read.query_name, set())
+        self.cache.move_to_end(read.query_name)
         if read not in self.cache[read.query_name]:
             self.cache[read.query_name].add(read)
+            self.mate_index.setdefault(self._mate_index_key(read), []).append(read)
+            self.cache_size += 1
+            self.cache_bytes += read.approximate_size()
+            if self.max_cache_bytes is not None and self.cache_bytes > self.max_cache_bytes:
+                self._evict()
+
+    def _pending_window_overlaps(self, read):
+        """
+        checks if a read overlaps any prefetch region which still has pending (unreleased) windows
+        """
+        if not self.prefetch_regions or read.is_unmapped or read.reference_id < 0:
+            return False
+        try:
+            chrom = self.fh.get_reference_name(read.reference_id)
+        except (AttributeError, ValueError, KeyError):
+            return False
+        end = _fetch_end(read)
+        for region in self.prefetch_regions.get(chrom, []):
+            if region.start <= end and read.reference_start <= region.end:
+                return True
+        return False
+
+    def _evict(self):
+        """
+        evicts least recently used read groups until the cache is back below its low-water mark (90% of the
+        limit). Read groups which overlap a window of a pending evidence object are kept where possible
+        """
+        target = self.max_cache_bytes - max(1, self.max_cache_bytes // 10)
+        kept = []
+        while self.cache and self.cache_bytes > target:
+            query_name, reads = self.cache.popitem(last=False)
+            if any([self._pending_window_overlaps(r) for r in reads]):
+                kept.append((query_name, reads))
+            else:
+                self._remove_read_group(reads)
+        # still over the limit, evict reachable reads in LRU order
+        while kept and self.cache_bytes > target:
+            self._remove_read_group(kept.pop(0)[1])
+        # restore the remaining groups as the least recently used
+        for query_name, reads in reversed(kept):
+            self.cache[query_name] = reads
+            self.cache.move_to_end(query_name, last=False)
+        _util.LOG(
+            'evicted reads from the bam cache ({} reads remain)'.format(self.cache_size),
+            level=logging.DEBUG,
+        )
+
+    def _remove_read_group(self, reads):
+        """
+        removes a read group, already popped from the cache, from the mate index and the cache totals
+        """
+        for read in reads:
+            key = self._mate_index_key(read)
+            indexed = [r for r in self.mate_index.get(key, []) if r is not read]
+            if indexed:
+                self.mate_index[key] = indexed
+            else:
+                self.mate_index.pop(key, None)
+            self.cache_bytes -= read.approximate_size()
+        self.cache_size -= len(reads)
+        self.evictions += len(reads)
+
+    @staticmethod
+    def _mate_index_key(read):
+        """
+        the key a read is stored under in the mate index. Unmapped reads are indexed by query name only
+        since they are returned as a mate of any read with the same query name
+        """
+        if read.is_unmapped:
+            return (read.query_name,)
+        return (read.query_name, read.is_read1, read.reference_id, read.reference_start)
 
     def has_read(self, read):
         """
@@ -84,6 +249,110 @@ class BamCache:
             raise KeyError('invalid reference name not present in bam file', chrom)
         return tid
 
+    def _bam_reference_name(self, input_chrom):
+        """
+        Args:
+            input_chrom (str): the chromosome name (with or without the chr prefix)
+        Returns:
+            str: the chromosome name as it appears in the bam file header
+        Raises:
+            KeyError: the chromosome is not present in the bam file
+        """
+        chrom = input_chrom
+        if str(chrom) not in self.fh.references:
+            chrom = re.sub('^chr', '', chrom)
+            if chrom not in self.fh.references:
+                chrom = 'chr' + chrom
+            if chrom not in self.fh.references:
+                raise KeyError('bam file does not contain the expected reference', input_chrom)
+        return chrom
+
+    def plan_prefetch(self, windows, max_region_size=None):
+        """
+        plans the bam regions to read for a batch of evidence windows. Overlapping and adjacent windows
+        on the same chromosome are merged so that each merged region is read (and decompressed) only
+        once, the first time any of its windows is fetched. The buffered reads are then dispatched to
+        every window fetch they overlap until all of the windows in the region have been released
+        (see :meth:`release_prefetch`)
+
+        Args:
+            windows (iterable of tuple of str, int, int, int): the chromosome, start, end and read limit of each window
+            max_region_size (int): do not grow merged regions past this size
+        """
+        windows_by_chrom = {}
+        for chrom, start, end, read_limit in windows:
+            try:
+                chrom = self._bam_reference_name(chrom)
+            except KeyError:
+                continue
+            windows_by_chrom.setdefault(chrom, []).append((start, end, read_limit))
+
+        for chrom, chrom_windows in windows_by_chrom.items():
+            regions = self.prefetch_regions.setdefault(chrom, [])
+            current = None
+            for start, end, read_limit in sorted(chrom_windows, key=lambda x: (x[0], x[1])):
+                # reads are counted per query name so allow for both reads in a pair
+                max_reads = None if read_limit is None else read_limit * 2
+                if (
+                    current is None
+                    or start > current.end + 1
+                    or (
+                        max_region_size
+                        and max(end, current.end) - current.start + 1 > max_region_size
+                    )
+                ):
+                    current = PrefetchRegion(chrom, start, end, max_reads)
+                    regions.append(current)
+                else:
+                    current.end = max(end, current.end)
+                    if current.max_reads is not None:
+                        current.max_reads = (
+                            None if max_reads is None else current.max_reads + max_reads
+                        )
+                current.pending += 1
+                self.prefetch_windows.setdefault((chrom, start, end), []).append(current)
+
+    def release_prefetch(self, windows):
+        """
+        marks planned windows as no longer needed. Buffered regions are freed once all their windows have
+        been released
+
+        Args:
+            windows (iterable of tuple of str, int, int, int): the windows previously passed to :meth:`plan_prefetch`
+        """
+        for chrom, start, end, read_limit in windows:
+            try:
+                chrom = self._bam_reference_name(chrom)
+            except KeyError:
+                continue
+            regions = self.prefetch_windows.get((chrom, start, end), [])
+            if not regions:
+                continue
+            region = regions.pop(0)
+            if not regions:
+                del self.prefetch_windows[(chrom, start, end)]
+            region.pending -= 1
+            if region.pending <= 0:
+                region.release()
+                self.prefetch_regions[chrom].remove(region)
+                if not self.prefetch_regions[chrom]:
+                    del self.prefetch_regions[chrom]
+
+    def _fetch_region(self, chrom, start, stop):
+        """
+        fetch the reads overlapping a region using a planned prefetch region when one covers the input
+        region and falling back to reading from the bam file otherwise
+        """
+        for region in self.prefetch_regions.get(chrom, []):
+            if not region.covers(start, stop) or region.dense:
+                continue
+            if not region.loaded:
+                region.load(self.fh)
+                if region.dense:
+                    continue
+            return region.fetch(start, stop)
+        return self.fh.fetch(chrom, start, stop)
+
     def get_read_reference_name(self, read):
         """
         Args:
@@ -140,10 +409,12 @@ class BamCache:
             filter_if (function): if returns True then the read is not returned as part of the result
             stop_on_cached_read (bool): stop reading at the first read found that is already in the cache
         Note:
-            the cache_if and filter_if functions must be any function that takes a read as input and returns a boolean
+            the cache_if and filter_if functions must be any function that takes a read as input and returns a boolean.
+            They are given the :class:`~mavis.bam.read.CompactRead` record of the read
 
         Returns:
-            set of :class:`pysam.AlignedSegment`: a set of reads which overlap the input region
+            set of :class:`~mavis.bam.read.CompactRead`: a set of reads which overlap the input region. Use
+            :meth:`~mavis.bam.read.CompactRead.to_read` for a full read
         """
         # try using the cache to avoid fetching regions more than once
         result = []
@@ -170,11 +441,11 @@ class BamCache:
             if not read.is_unmapped and read.reference_start == read.reference_end:
                 _util.LOG('ignoring invalid read', read.query_name, level=logging.DEBUG)
                 continue
-            read = SamRead.copy(read)
-            if not filter_if(read):
-                result.append(read)
-            if cache_if(read):
-                self.add_read(read)
+            compact_read = CompactRead.from_read(read)
+            if not filter_if(compact_read):
+                result.append(compact_read)
+            if cache_if(compact_read):
+                self.add_read(compact_read)
             if read.query_name not in temp_cache:
                 count += 1
                 temp_cache.add(read.query_name)
@@ -203,23 +474,18 @@ class BamCache:
             read_limit (int): the maximum number of reads to parse
             cache (bool): flag to store reads
             sample_bins (int): number of bins to split the region into
-            cache_if (callable): function to check to against a read to determine if it should be cached
+            cache_if (callable): function to check to against a read (:class:`~mavis.bam.read.CompactRead`) to determine if it should be cached
             bin_gap_size (int): gap between the bins for the fetch area
 
         Returns:
-            :class:`set` of :class:`pysam.AlignedSegment`: set of reads gathered from the region
+            :class:`set` of :class:`~mavis.bam.read.CompactRead`: set of reads gathered from the region. Use
+            :meth:`~mavis.bam.read.CompactRead.to_read` for a full read
         """
         # try using the cache to make grabbing mate pairs easier
         result = []
         bin_limit = int(read_limit / sample_bins) if read_limit else None
-        chrom = input_chrom
         # split into multiple fetches based on the 'sample_bins'
-        if str(chrom) not in self.fh.references:
-            chrom = re.sub('^chr', '', chrom)
-            if chrom not in self.fh.references:
-                chrom = 'chr' + chrom
-            if chrom not in self.fh.references:
-                raise KeyError('bam file does not contain the expected reference', input_chrom)
+        chrom = self._bam_reference_name(input_chrom)
         bins = self.__class__._generate_fetch_bins(start, stop, sample_bins, min_bin_size)
         running_surplus = 0
         temp_cache = set()
@@ -227,23 +493,54 @@ class BamCache:
             count = 0
             running_surplus += bin_limit
 
-            for read in self.fh.fetch(chrom, fstart, fend):
+            for read in self._fetch_region(chrom, fstart, fend):
                 if bin_limit is not None and count >= running_surplus:
                     break
                 if not read.is_unmapped and read.reference_start == read.reference_end:
                     _util.LOG('ignoring invalid read', read.query_name, level=logging.DEBUG)
                     continue
-                read = SamRead.copy(read)
-                if not filter_if(read):
-                    result.append(read)
+                compact_read = CompactRead.from_read(read)
+                if not filter_if(compact_read):
+                    result.append(compact_read)
                 if read.query_name not in temp_cache:
                     count += 1
                     temp_cache.add(read.query_name)
-                if cache and cache_if(read):
-                    self.add_read(read)
+                if cache and cache_if(compact_read):
+                    self.add_read(compact_read)
             running_surplus -= count
         return set(result)
 
+    def _cached_mates(self, read, primary_only=True, count=True):
+        """
+        Args:
+            count (bool): count the lookup in the cache hits and misses
+
+        Returns:
+            :class:`list` of :class:`~mavis.bam.read.CompactRead`: cached mates of the input read
+        """
+        mates = []
+        key = (
+            read.query_name,
+            not read.is_read1,
+            read.next_reference_id,
+            read.next_reference_start,
+        )
+        for mate in self.mate_index.get(key, []):
+            if primary_only and (mate.is_secondary or mate.is_supplementary):
+                continue
+            elif abs(read.template_length) != abs(mate.template_length):
+                continue
+            mates.append(mate)
+        # unmapped reads are returned as mates of any read with the same query name
+        mates.extend(self.mate_index.get((read.query_name,), []))
+        if mates:
+            self.cache.move_to_end(read.query_name)
+            if count:
+                self.hits += 1
+        elif count:
+            self.misses += 1
+        return mates
+
     def get_mate(self, read, primary_only=True, allow_file_access=False):
         """
         Args:
@@ -251,24 +548,10 @@ class BamCache:
             primary_only (bool): ignore secondary alignments
             allow_file_access (bool): determines if the bam can be accessed to try to find the mate
         Returns:
-            :class:`list` of :class:`pysam.AlignedSegment`: list of mates of the input read
+            :class:`list` of :class:`~mavis.bam.read.SamRead`: list of mates of the input read (created from the cached records)
         """
         # NOTE: will return all mate alignments that have been cached
-        putative_mates = self.cache.get(read.query_name, set())
-        mates = []
-        for mate in putative_mates:
-            if not mate.is_unmapped:
-                if any(
-                    [
-                        read.is_read1 == mate.is_read1,
-                        read.next_reference_start != mate.reference_start,
-                        read.next_reference_id != mate.reference_id,
-                        primary_only and (mate.is_secondary or mate.is_supplementary),
-                        abs(read.template_length) != abs(mate.template_length),
-                    ]
-                ):
-                    continue
-            mates.append(mate)
+        mates = [m.to_read() for m in self._cached_mates(read, primary_only)]
         if len(mates) == 0:
             if not allow_file_access or read.mate_is_unmapped:
                 raise KeyError('mate is not found in the cache')
@@ -278,12 +561,109 @@ class BamCache:
                     ' requests may be slow. This should also not be using in a loop iterating using the file pointer '
                     ' as it will change the file pointer position'.format(read.query_name)
                 )
-                m = self.fh.mate(read)
+                m = self.fh.mate(full_read(read))
                 m = SamRead.copy(m)
                 self.add_read(m)
                 return [m]
         return mates
 
+    def get_mates(self, reads, primary_only=True, allow_file_access=False, max_gap=1000):
+        """
+        finds the mates for a batch of reads. When file access is allowed, the mates which are not in the
+        cache are grouped into regions by position and each region is read once, in sorted order, rather
+        than looking up each mate individually
+
+        Args:
+            reads (iterable of pysam.AlignedSegment): the reads to find mates for
+            primary_only (bool): ignore secondary alignments
+            allow_file_access (bool): determines if the bam can be accessed to try to find uncached mates
+            max_gap (int): mate positions closer than this are read from the bam in a single fetch
+
+        Returns:
+            :class:`dict` of :class:`list` of :class:`~mavis.bam.read.SamRead` by :class:`pysam.AlignedSegment`:
+            mates of each input read. Reads without any mates found are not included
+        """
+        result = {}
+        uncached = []
+        for read in reads:
+            mates = self._cached_mates(read, primary_only)
+            if mates:
+                result[read] = [m.to_read() for m in mates]
+            elif allow_file_access and not read.mate_is_unmapped and read.next_reference_id >= 0:
+                uncached.append(read)
+        if not uncached:
+            return result
+        # group the missing mates into regions of the bam file to fetch
+        uncached.sort(key=lambda r: (r.next_reference_id, r.next_reference_start))
+        wanted = {
+            (r.query_name, not r.is_read1, r.next_reference_id, r.next_reference_start)
+            for r in uncached
+        }
+        regions = []
+        for read in uncached:
+            if (
+                regions
+                and regions[-1][0] == read.next_reference_id
+                and read.next_reference_start - regions[-1][2] <= max_gap
+            ):
+                regions[-1][2] = read.next_reference_start
+            else:
+                regions.append(
+                    [read.next_reference_id, read.next_reference_start, read.next_reference_start]
+                )
+        for reference_id, start, end in regions:
+            chrom = self.fh.get_reference_name(reference_id)
+            for mate in self.fh.fetch(chrom, start, end + 1):
+                if self._mate_index_key(mate) in wanted:
+                    self.add_read(mate)
+        for read in uncached:
+            # already counted as a miss on the first lookup
+            mates = self._cached_mates(read, primary_only, count=False)
+            if mates:
+                result[read] = [m.to_read() for m in mates]
+        return result
+
+    def fill_read_data(self, reads, max_gap=1000):
+        """
+        sets the base qualities and tags of reads created from cached records (which do not keep them, see
+        :class:`~mavis.bam.read.CompactRead`) from the matching records of the bam file. Tags set on the
+        read since it was created are kept. The reads are grouped into regions by their original position
+        and each region is read once
+
+        Args:
+            reads (iterable of pysam.AlignedSegment): the reads to fill in
+            max_gap (int): read positions closer than this are read from the bam in a single fetch
+        """
+        missing = {}
+        for read in reads:
+            # the key holds the position the read was created with
+            if read.query_qualities is None and read.key()[2] >= 0:
+                missing.setdefault(read.key(), []).append(read)
+        regions = []
+        for reference_id, start in sorted({(key[2], key[3]) for key in missing}):
+            if regions and regions[-1][0] == reference_id and start - regions[-1][2] <= max_gap:
+                regions[-1][2] = start
+            else:
+                regions.append([reference_id, start, start])
+        for reference_id, start, end in regions:
+            chrom = self.fh.get_reference_name(reference_id)
+            for record in self.fh.fetch(chrom, start, end + 1):
+                key = (
+                    record.query_name,
+                    record.query_sequence,
+                    record.reference_id,
+                    record.reference_start,
+                    record.is_supplementary,
+                )
+                for read in missing.pop(key, []):
+                    tags = record.get_tags(with_value_type=True)
+                    names = {tag[0] for tag in tags}
+                    tags.extend(
+                        [t for t in read.get_tags(with_value_type=True) if t[0] not in names]
+                    )
+                    read.query_qualities = record.query_qualities
+                    read.set_tags(tags)
+
     def close(self):
         """
         close the bam file handle
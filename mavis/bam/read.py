@@ -1,12 +1,10 @@
 from copy import copy
 import itertools
-import re
 import subprocess
 
 import pysam
 from Bio.Data import IUPACData as iupac
 
-from . import cigar as _cigar
 from .cigar import (
     EVENT_STATES,
     QUERY_ALIGNED_STATES,
@@ -17,6 +15,7 @@ from ..constants import (
     CIGAR,
     DNA_ALPHABET,
     ORIENT,
+    PYSAM_READ_FLAGS,
     READ_PAIR_TYPE,
     STRAND,
     SVTYPE,
@@ -24,6 +23,16 @@ from ..constants import (
 )
 from ..interval import Interval
 
+EVENT_READ_PAIR_TYPES = {
+    SVTYPE.DEL: {READ_PAIR_TYPE.LR},
+    SVTYPE.INS: {READ_PAIR_TYPE.LR},
+    SVTYPE.TRANS: {READ_PAIR_TYPE.LR, READ_PAIR_TYPE.RL},
+    SVTYPE.ITRANS: {READ_PAIR_TYPE.LL, READ_PAIR_TYPE.RR},
+    SVTYPE.INV: {READ_PAIR_TYPE.LL, READ_PAIR_TYPE.RR},
+    SVTYPE.DUP: {READ_PAIR_TYPE.RL},
+}
+""":class:`dict` of :class:`set` of :attr:`~mavis.constants.READ_PAIR_TYPE` by :attr:`~mavis.constants.SVTYPE`: the read pair types which support each event type"""
+
 
 class SamRead(pysam.AlignedSegment):
     """
@@ -159,6 +168,203 @@ class SamRead(pysam.AlignedSegment):
         return hash(self.key())
 
 
+class CompactRead:
+    """
+    Minimal read record used for caching reads. Stores the alignment fields used in filtering reads and
+    finding mates. The sequence is stored encoded and only decoded on access. Base qualities and tags
+    are not kept. Use :meth:`to_read` to create a full :class:`SamRead` when the read is to be used as
+    evidence
+    """
+
+    __slots__ = [
+        'query_name',
+        'flag',
+        'reference_id',
+        'reference_start',
+        'reference_end',
+        'next_reference_id',
+        'next_reference_start',
+        'template_length',
+        'mapping_quality',
+        'cigar',
+        '_reference_name',
+        '_next_reference_name',
+        '_seq',
+        '_key',
+    ]
+
+    def __init__(
+        self,
+        query_name=None,
+        flag=0,
+        reference_id=-1,
+        reference_start=-1,
+        reference_end=None,
+        next_reference_id=-1,
+        next_reference_start=-1,
+        template_length=0,
+        mapping_quality=NA_MAPPING_QUALITY,
+        cigar=None,
+        query_sequence=None,
+        reference_name=None,
+        next_reference_name=None,
+    ):
+        self.query_name = query_name
+        self.flag = flag
+        self.reference_id = reference_id
+        self.reference_start = reference_start
+        self.reference_end = reference_end
+        self.next_reference_id = next_reference_id
+        self.next_reference_start = next_reference_start
+        self.template_length = template_length
+        self.mapping_quality = mapping_quality
+        self.cigar = tuple(cigar) if cigar else ()
+        self._reference_name = reference_name
+        self._next_reference_name = next_reference_name
+        self._seq = None if query_sequence is None else query_sequence.encode('ascii')
+        self._key = (
+            self.query_name,
+            query_sequence,
+            self.reference_id,
+            self.reference_start,
+            self.is_supplementary,
+        )
+
+    @classmethod
+    def from_read(cls, read):
+        """
+        Args:
+            read (pysam.AlignedSegment): the read to store
+        """
+        if isinstance(read, cls):
+            return read
+        paired = read.is_paired
+        return cls(
+            query_name=read.query_name,
+            flag=read.flag,
+            reference_id=read.reference_id,
+            reference_start=read.reference_start,
+            reference_end=read.reference_end,
+            next_reference_id=read.next_reference_id if paired else -1,
+            next_reference_start=read.next_reference_start if paired else -1,
+            template_length=read.template_length,
+            mapping_quality=read.mapping_quality,
+            cigar=read.cigar,
+            query_sequence=read.query_sequence,
+            reference_name=read.reference_name,
+            next_reference_name=read.next_reference_name if paired else None,
+        )
+
+    def to_read(self):
+        """
+        A new read is created on each call so that changes made to it (for example standardizing the cigar)
+        do not change the cached record
+
+        Returns:
+            SamRead: a full read object with the same alignment and sequence. Base qualities and tags are not set
+        """
+        read = SamRead(
+            reference_name=self._reference_name, next_reference_name=self._next_reference_name
+        )
+        read.query_name = self.query_name
+        read.query_sequence = self.query_sequence
+        read.flag = self.flag
+        read.reference_id = self.reference_id
+        read.reference_start = self.reference_start
+        read.cigar = list(self.cigar)
+        read.mapping_quality = self.mapping_quality
+        read.template_length = self.template_length
+        if self.is_paired:
+            read.next_reference_id = self.next_reference_id
+            read.next_reference_start = self.next_reference_start
+        read.set_key()
+        return read
+
+    @property
+    def query_sequence(self):
+        return None if self._seq is None else self._seq.decode('ascii')
+
+    @property
+    def reference_name(self):
+        return self._reference_name
+
+    @property
+    def next_reference_name(self):
+        return self._next_reference_name
+
+    @property
+    def is_paired(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.MULTIMAP)
+
+    @property
+    def is_proper_pair(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.PROPER_PAIR)
+
+    @property
+    def is_unmapped(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.UNMAPPED)
+
+    @property
+    def mate_is_unmapped(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.MATE_UNMAPPED)
+
+    @property
+    def is_reverse(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.REVERSE)
+
+    @property
+    def mate_is_reverse(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.MATE_REVERSE)
+
+    @property
+    def is_read1(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.FIRST_IN_PAIR)
+
+    @property
+    def is_read2(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.LAST_IN_PAIR)
+
+    @property
+    def is_secondary(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.SECONDARY)
+
+    @property
+    def is_supplementary(self):
+        return bool(self.flag & PYSAM_READ_FLAGS.SUPPLEMENTARY)
+
+    def key(self):
+        return self._key
+
+    def approximate_size(self):
+        """
+        Returns:
+            int: a rough estimate of the memory (in bytes) used by the record
+        """
+        size = 600 + len(self.query_name or '') + 100 * len(self.cigar)
+        if self._seq is not None:
+            size += 2 * len(self._seq)  # the sequence is also part of the key
+        return size
+
+    def __eq__(self, other):
+        return self.key() == SamRead.key(other)
+
+    def __hash__(self):
+        return hash(self.key())
+
+
+def full_read(read):
+    """
+    Args:
+        read (pysam.AlignedSegment): the read or its cached :class:`CompactRead` record
+
+    Returns:
+        pysam.AlignedSegment: the input read, or a full read created from it if it is a compact record
+    """
+    if isinstance(read, CompactRead):
+        return read.to_read()
+    return read
+
+
 def pileup(reads, filter_func=None):
     """
     For a given set of reads generate a pileup of all reads (excluding those for which the filter_func returns True)
@@ -290,6 +496,104 @@ def calculate_alignment_score(read, consec_bonus=1):
     return score / max_score
 
 
+_NSB_S, _NSB_EQ, _NSB_X = CIGAR.S, CIGAR.EQ, CIGAR.X
+_NSB_MATCH_TABLE = []
+
+
+def _nsb_match_table():
+    """
+    table of :attr:`DNA_ALPHABET.match` for all pairs of single byte characters. Built the
+    first time it is required
+    """
+    if not _NSB_MATCH_TABLE:
+        import numpy as np
+
+        chars = [chr(i) for i in range(256)]
+        _NSB_MATCH_TABLE.append(
+            np.array([[DNA_ALPHABET.match(x, y) for y in chars] for x in chars], dtype=bool)
+        )
+    return _NSB_MATCH_TABLE[0]
+
+
+def _nsb_codes(seq):
+    """
+    the sequence as an array of byte codes, or None if it cannot be encoded as single bytes
+    """
+    import numpy as np
+
+    try:
+        return np.frombuffer(seq.encode('latin-1'), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return None
+
+
+class NsbReference:
+    """
+    a reference sequence prepared for repeated calls to :func:`nsb_align` (ex. the same contig
+    for many reads). Stores the encoded sequence and an index of the k-mer positions for each
+    k-mer size requested
+
+    Args:
+        seq (str): the reference sequence
+    """
+
+    def __init__(self, seq):
+        self.seq = str(seq)
+        self.codes = _nsb_codes(self.seq)
+        self._seeds = {}
+
+    def __len__(self):
+        return len(self.seq)
+
+    def seed_positions(self, size):
+        """
+        start positions of each k-mer in the reference. As with :func:`re.finditer`, overlapping
+        occurrences of the same k-mer are not reported
+
+        Returns:
+            :class:`dict` of :class:`list` of :class:`int` by :class:`str`: positions by k-mer
+        """
+        if size not in self._seeds:
+            seeds = {}
+            for pos in range(0, len(self.seq) - size + 1):
+                kmer = self.seq[pos : pos + size]
+                positions = seeds.get(kmer)
+                if positions is None:
+                    seeds[kmer] = [pos]
+                elif pos >= positions[-1] + size:
+                    positions.append(pos)
+            self._seeds[size] = seeds
+        return self._seeds[size]
+
+
+def _nsb_match_states(ref, seq, starts):
+    """
+    compares the sequence to the reference at each of the start positions
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray]: which positions overlap the reference and which positions match
+    """
+    import numpy as np
+
+    positions = np.asarray(starts, dtype=np.int64)[:, None] + np.arange(len(seq))
+    inside = (positions >= 0) & (positions < len(ref))
+    seq_codes = _nsb_codes(seq)
+    if ref.codes is not None and seq_codes is not None:
+        matched = _nsb_match_table()[ref.codes[np.clip(positions, 0, len(ref) - 1)], seq_codes]
+    else:
+        matched = np.array(
+            [
+                [
+                    0 <= r < len(ref) and DNA_ALPHABET.match(ref.seq[r], seq[i])
+                    for i, r in enumerate(row)
+                ]
+                for row in positions.tolist()
+            ],
+            dtype=bool,
+        )
+    return inside, matched & inside
+
+
 def nsb_align(
     ref,
     seq,
@@ -305,7 +609,7 @@ def nsb_align(
     given relative to the length of the reference sequence (1-based)
 
     Args:
-        ref (str): the reference sequence
+        ref (str): the reference sequence (or :class:`NsbReference` when aligning many sequences to the same reference)
         seq (str): the sequence being aligned
         weight_of_score (float): when scoring alignments this determines the amount
             of weight to place on the cigar match. Should be a number between 0 and 1
@@ -319,10 +623,11 @@ def nsb_align(
         :class:`list` of :class:`~pysam.AlignedSegment`: list of aligned segments
 
     Note:
-        using a higher min_match may improve performance as low quality alignments are rejected more quickly. However
-        this may also result in no match being returned when there is no high quality match to be found.
+        all putative start positions are compared in a single array operation and aligned segments are only
+        created for the best scoring alignments
     """
-    ref = str(ref)
+    if not isinstance(ref, NsbReference):
+        ref = NsbReference(ref)
     if len(ref) < 1 or len(seq) < 1:
         raise AttributeError(
             'cannot overlap on an empty sequence: len(ref)={}, len(seq)={}'.format(
@@ -336,67 +641,64 @@ def nsb_align(
         raise AttributeError('percent must be greater than 0 and up to 1', min_overlap_percent)
 
     min_overlap = int(round(min_overlap_percent * len(seq), 0))
-    # store to improve speed and space (don't need to store all alignments)
-    best_score = (0, 0)
-    results = []
 
     putative_start_positions = range(min_overlap - len(seq), len(ref) + len(seq) - min_overlap)
     if min_consecutive_match > 1:
         putative_start_positions = set()
-        kmers_checked = {}
+        seeds = ref.seed_positions(min_consecutive_match)
         for i in range(0, len(seq) - min_consecutive_match):
-            current_kmer = seq[i : i + min_consecutive_match]
-            if current_kmer in kmers_checked:
-                putative_start_positions.update([p - i for p in kmers_checked[current_kmer]])
-                continue
-            rp = [m.start() for m in re.finditer(current_kmer, ref)]
-            kmers_checked[current_kmer] = rp
-            putative_start_positions.update([p - i for p in rp])
-    for ref_start in putative_start_positions:
-        score = 0
-        cigar = []
-        mismatches = 0
-        length = len(seq)
-        for i in range(0, len(seq)):
-            if length == 0:
-                break
-            r = ref_start + i
-            if r < 0 or r >= len(ref):  # outside the length of the reference seq
-                cigar.append((CIGAR.S, 1))
-                length -= 1
-                continue
-            if DNA_ALPHABET.match(ref[r], seq[i]):
-                cigar.append((CIGAR.EQ, 1))
-            else:
-                cigar.append((CIGAR.X, 1))
-                mismatches += 1
-                if mismatches / length > 1 - min_match:
-                    break
-        if length == 0 or mismatches / length > 1 - min_match:
-            continue
+            rp = seeds.get(seq[i : i + min_consecutive_match])
+            if rp:
+                putative_start_positions.update([p - i for p in rp])
+    putative_start_positions = list(putative_start_positions)
+    if not putative_start_positions:
+        return []
+
+    inside, matched = _nsb_match_states(ref, seq, putative_start_positions)
+    overlap = inside.sum(axis=1)
+    mismatches = overlap - matched.sum(axis=1)
+    max_mismatch_rate = 1 - min_match
 
-        cigar = _cigar.join(cigar)
+    # store to improve speed and space (don't need to store all alignments)
+    best_score = (0, 0)
+    results = []
+    for index in overlap.nonzero()[0].tolist():
+        if mismatches[index] / overlap[index] > max_mismatch_rate:
+            continue
+        states = [
+            _NSB_S if not i else _NSB_EQ if m else _NSB_X
+            for i, m in zip(inside[index].tolist(), matched[index].tolist())
+        ]
+        cigar = [(state, len(list(group))) for state, group in itertools.groupby(states)]
         # end mismatches we set as soft-clipped
-        if cigar[0][0] == CIGAR.X:
-            cigar[0] = (CIGAR.S, cigar[0][1])
-        if cigar[-1][0] == CIGAR.X:
-            cigar[-1] = (CIGAR.S, cigar[-1][1])
-
-        qstart = 0 if cigar[0][0] != CIGAR.S else cigar[0][1]
-
-        a = SamRead(query_sequence=str(seq), reference_start=ref_start + qstart, cigar=cigar)
-        qlen = a.reference_end - a.reference_start
-        score = (
-            scoring_function(a),
-            qlen,
-        )  # this way for equal identity matches we take the longer alignment
+        if cigar[0][0] == _NSB_X:
+            cigar[0] = (_NSB_S, cigar[0][1])
+        if cigar[-1][0] == _NSB_X:
+            cigar[-1] = (_NSB_S, cigar[-1][1])
+
+        qstart = 0 if cigar[0][0] != _NSB_S else cigar[0][1]
+        ref_start = putative_start_positions[index] + qstart
+        qlen = sum([v for c, v in cigar if c != _NSB_S])
+
+        if scoring_function is calculate_alignment_score:
+            read = None
+            score = sum([v + v - 1 for c, v in cigar if c == _NSB_EQ]) / (qlen + qlen - 1)
+        else:
+            read = SamRead(query_sequence=str(seq), reference_start=ref_start, cigar=cigar)
+            score = scoring_function(read)
+        score = (score, qlen)  # this way for equal identity matches we take the longer alignment
         if qlen < min_overlap:
             continue
         if score >= best_score:
             best_score = score
-            results.append((a, score))
-
-    filtered = [x for x, y in results if y == best_score]
+            results.append((read, ref_start, cigar, score))
+
+    filtered = []
+    for read, ref_start, cigar, score in results:
+        if score == best_score:
+            if read is None:
+                read = SamRead(query_sequence=str(seq), reference_start=ref_start, cigar=cigar)
+            filtered.append(read)
     return filtered
 
 
@@ -489,21 +791,9 @@ def orientation_supports_type(read, event_type):
             - ``True`` - the read pair is in the correct orientation for this event type
             - ``False`` - the read is not in the correct orientation
     """
-    if event_type == SVTYPE.DEL or event_type == SVTYPE.INS:
-        if read_pair_type(read) != READ_PAIR_TYPE.LR:
-            return False
-    elif event_type == SVTYPE.TRANS:
-        if read_pair_type(read) != READ_PAIR_TYPE.LR and read_pair_type(read) != READ_PAIR_TYPE.RL:
-            return False
-    elif event_type == SVTYPE.ITRANS or event_type == SVTYPE.INV:
-        if read_pair_type(read) != READ_PAIR_TYPE.LL and read_pair_type(read) != READ_PAIR_TYPE.RR:
-            return False
-    elif event_type == SVTYPE.DUP:
-        if read_pair_type(read) != READ_PAIR_TYPE.RL:
-            return False
-    else:
+    if event_type not in EVENT_READ_PAIR_TYPES:
         raise ValueError('unexpected event type', event_type)
-    return True
+    return read_pair_type(read) in EVENT_READ_PAIR_TYPES[event_type]
 
 
 def convert_events_to_softclipping(read, orientation, max_event_size, min_anchor_size=None):
@@ -276,3 +276,25 @@ def compute_genome_bam_stats(
     err = hist.distribution_stderr(median, distribution_fraction)
 
     return BamStats(median, math.sqrt(err), np.median(read_lengths))
+
+
+def compute_read_density(bam_file_handle):
+    """
+    computes the mean number of mapped reads per base for each reference template in the input bam
+    file. Uses the counts from the bam index so no reads are read
+
+    Args:
+        bam_file_handle (BamCache): the input bam file handle
+
+    Returns:
+        dict of float by str: the read density by template name (with and without the 'chr' prefix)
+    """
+    lengths = dict(zip(bam_file_handle.fh.references, bam_file_handle.fh.lengths))
+    result = {}
+    for stat in bam_file_handle.fh.get_index_statistics():
+        if lengths.get(stat.contig):
+            result[stat.contig] = stat.mapped / lengths[stat.contig]
+    for template, density in list(result.items()):
+        alias = template[3:] if template.startswith('chr') else 'chr' + template
+        result.setdefault(alias, density)
+    return result
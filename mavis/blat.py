@@ -13,11 +13,9 @@
 -- http://wiki.bits.vib.be/index.php/Blat
 
 """
+import bisect
 import logging
 import math
-import re
-
-import tab
 
 from .align import query_coverage_interval
 from .bam import cigar as _cigar
@@ -35,6 +33,64 @@ from .util import LOG
 from .interval import Interval
 
 
+PSLX_HEADER = [
+    'match',
+    'mismatch',
+    'repmatch',
+    'ncount',
+    'qgap_count',
+    'qgap_bases',
+    'tgap_count',
+    'tgap_bases',
+    'strand',
+    'qname',
+    'qsize',
+    'qstart',
+    'qend',
+    'tname',
+    'tsize',
+    'tstart',
+    'tend',
+    'block_count',
+    'block_sizes',
+    'qstarts',
+    'tstarts',
+    'qseqs',
+    'tseqs',
+]
+""":class:`list` of :class:`str`: the column names of the pslx output from blat"""
+
+_PSLX_INT_COLUMNS = [
+    'match',
+    'mismatch',
+    'repmatch',
+    'ncount',
+    'qgap_count',
+    'qgap_bases',
+    'tgap_count',
+    'tgap_bases',
+    'qsize',
+    'qstart',
+    'qend',
+    'tsize',
+    'tstart',
+    'tend',
+    'block_count',
+]
+_PSLX_INT_LIST_COLUMNS = ['block_sizes', 'qstarts', 'tstarts']
+_PSLX_SEQ_LIST_COLUMNS = ['qseqs', 'tseqs']
+_PSLX_STRANDS = {'+', '-'}
+
+
+def _split_pslx_list(value):
+    """
+    splits a comma delimited list column (ignoring the trailing comma)
+    """
+    if value.endswith(','):
+        value = value[:-1]
+    return value.split(',')
+
+
 class Blat:
     """
     """
@@ -110,99 +166,114 @@ class Blat:
     def percent_identity(row, is_protein=False, is_mrna=True):
         return 100 - int(Blat.millibad(row, is_protein, is_mrna)) * 0.1
 
+    @staticmethod
+    def iter_pslx(filename, seqid_to_sequence_mapping, is_protein=False, verbose=True):
+        """
+        reads the rows of an (unheadered) pslx file one at a time
+
+        Args:
+            filename (str): path to the pslx file
+            seqid_to_sequence_mapping (:class:`dict` of :class:`str` by :class:`str`): the input sequences by query name
+            is_protein (bool): the input sequences are protein sequences
+            verbose (bool): drop rows where blat has returned a negative count
+
+        Yields:
+            :class:`dict`: the row with the columns given by :attr:`PSLX_HEADER` as well as the score, percent
+            identity and full query sequence
+
+        Raises:
+            ValueError: if a line does not have the expected number of columns or does not give a valid strand
+        """
+        with open(filename, 'r') as fh:
+            for index, line in enumerate(fh):
+                line = line.rstrip('\r\n')
+                if not line or line.lstrip().startswith('##'):
+                    continue
+                fields = line.split('\t')
+                if len(fields) != len(PSLX_HEADER):
+                    raise ValueError(
+                        'expected {} columns but found {} at line {}'.format(
+                            len(PSLX_HEADER), len(fields), index
+                        )
+                    )
+                row = dict(zip(PSLX_HEADER, fields))
+                for col in _PSLX_INT_COLUMNS:
+                    row[col] = int(row[col])
+                if row['strand'] not in _PSLX_STRANDS:
+                    raise ValueError('invalid strand at line {}'.format(index), row['strand'])
+                if row['tname'].startswith('chr'):
+                    row['tname'] = row['tname'][3:]
+                for col in _PSLX_INT_LIST_COLUMNS:
+                    row[col] = [int(v) for v in _split_pslx_list(row[col])]
+                for col in _PSLX_SEQ_LIST_COLUMNS:
+                    row[col] = _split_pslx_list(row[col].upper())
+                row['_index'] = index
+                try:
+                    row['score'] = Blat.score(row, is_protein=is_protein)
+                    row['percent_ident'] = Blat.percent_identity(row, is_protein=is_protein)
+                    row['qseq_full'] = seqid_to_sequence_mapping[row['qname']]
+
+                    for x in [
+                        'qgap_count',
+                        'qgap_bases',
+                        'tgap_count',
+                        'tgap_bases',
+                        'qsize',
+                        'tsize',
+                        'ncount',
+                        'match',
+                        'mismatch',
+                        'repmatch',
+                    ]:
+                        if row[x] < 0 and verbose:
+                            raise AssertionError(
+                                'Blat error: blat returned a negative number, which are not allowed: {}={}'.format(
+                                    x, row[x]
+                                )
+                            )
+                    yield row
+                except AssertionError as err:
+                    LOG(type(err), ':', str(err), level=logging.DEBUG)
+
     @staticmethod
     def read_pslx(filename, seqid_to_sequence_mapping, is_protein=False, verbose=True):
-        pslx_header = [
-            'match',
-            'mismatch',
-            'repmatch',
-            'ncount',
-            'qgap_count',
-            'qgap_bases',
-            'tgap_count',
-            'tgap_bases',
-            'strand',
-            'qname',
-            'qsize',
-            'qstart',
-            'qend',
-            'tname',
-            'tsize',
-            'tstart',
-            'tend',
-            'block_count',
-            'block_sizes',
-            'qstarts',
-            'tstarts',
-            'qseqs',
-            'tseqs',
-        ]
-
-        def split_csv_trailing_seq(x):
-            return [s.upper() for s in re.sub(',$', '', x).split(',')]
-
-        def split_csv_trailing_ints(x):
-            return [int(s) for s in re.sub(',$', '', x).split(',')]
-
-        header, rows = tab.read_file(
-            filename,
-            header=pslx_header,
-            cast={
-                'match': int,
-                'mismatch': int,
-                'repmatch': int,
-                'ncount': int,
-                'qgap_count': int,
-                'qgap_bases': int,
-                'tgap_count': int,
-                'tgap_bases': int,
-                'qsize': int,
-                'qstart': int,
-                'qend': int,
-                'tsize': int,
-                'tstart': int,
-                'tend': int,
-                'block_count': int,
-                'tname': lambda x: re.sub('^chr', '', x),
-                'block_sizes': split_csv_trailing_ints,
-                'qstarts': split_csv_trailing_ints,
-                'tstarts': split_csv_trailing_ints,
-                'qseqs': split_csv_trailing_seq,
-                'tseqs': split_csv_trailing_seq,
-            },
-            validate={'strand': r'^[\+-]$'},
+        """
+        reads all the rows of an (unheadered) pslx file. See :func:`Blat.iter_pslx`
+
+        Returns:
+            Tuple[:class:`list` of :class:`str`,:class:`list` of :class:`dict`]: the column names and the rows
+        """
+        return (
+            PSLX_HEADER[:],
+            list(
+                Blat.iter_pslx(
+                    filename, seqid_to_sequence_mapping, is_protein=is_protein, verbose=verbose
+                )
+            ),
         )
 
-        final_rows = []
-        for row in rows:
-            try:
-                row['score'] = Blat.score(row, is_protein=is_protein)
-                row['percent_ident'] = Blat.percent_identity(row, is_protein=is_protein)
-                qseq = seqid_to_sequence_mapping[row['qname']]
-                row['qseq_full'] = qseq
-
-                for x in [
-                    'qgap_count',
-                    'qgap_bases',
-                    'tgap_count',
-                    'tgap_bases',
-                    'qsize',
-                    'tsize',
-                    'ncount',
-                    'match',
-                    'mismatch',
-                    'repmatch',
-                ]:
-                    if row[x] < 0 and verbose:
-                        raise AssertionError(
-                            'Blat error: blat returned a negative number, which are not allowed: {}={}'.format(
-                                x, row[x]
-                            )
-                        )
-                final_rows.append(row)
-            except AssertionError as err:
-                LOG(type(err), ':', str(err), level=logging.DEBUG)
-        return header, final_rows
+    @staticmethod
+    def check_pslx_row(row, bam_cache, reference_genome):
+        """
+        checks the parts of a pslx row which do not require converting it to a read (see
+        :func:`Blat.pslx_row_to_pysam`)
+
+        Raises:
+            KeyError: the reference template name is not recognized
+            AssertionError: the aligned blocks overlap or are outside the query sequence
+        """
+        bam_cache.reference_id(row['tname'])
+        if reference_genome:
+            reference_genome[row['tname']]
+        prev_qend = None
+        prev_tend = None
+        for qstart, tstart, size in zip(row['qstarts'], row['tstarts'], row['block_sizes']):
+            if prev_qend is not None and (qstart < prev_qend or tstart < prev_tend):
+                raise AssertionError('block ranges overlap in row', row)
+            prev_qend = qstart + size
+            prev_tend = tstart + size
+        if prev_qend is not None and prev_qend > len(row['qseq_full']):
+            raise AssertionError('block ranges extend past the end of the query sequence', row)
 
     @staticmethod
     def pslx_row_to_pysam(row, bam_cache, reference_genome):
@@ -367,18 +438,17 @@ def process_blat_output(
 ):
     """
     converts the blat output pslx (unheadered file) to bam reads
+
+    Rows are ranked by score for each query and only converted until blat_limit_top_aln reads have been kept.
+    The remaining rows are only checked for a recognized reference and valid blocks (see :func:`Blat.check_pslx_row`)
+    when counting the alignments and ranks of the kept reads
     """
     if is_protein:
         raise NotImplementedError('currently does not support aligning protein sequences')
 
-    try:
-        _, rows = Blat.read_pslx(aligner_output_file, query_id_mapping, is_protein=is_protein)
-    except tab.tab.EmptyFileError:
-        rows = []
-
     # split the rows by query id
     rows_by_query = {}
-    for row in rows:
+    for row in Blat.iter_pslx(aligner_output_file, query_id_mapping, is_protein=is_protein):
         rows_by_query.setdefault(row['qname'], []).append(row)
 
     reads_by_query = {}
@@ -388,44 +458,60 @@ def process_blat_output(
     for query_id, rows in rows_by_query.items():
         query_seq = query_id_mapping[query_id]
 
-        reads = []
+        valid_rows = []
         for row in rows:
+            try:
+                Blat.check_pslx_row(row, input_bam_cache, reference_genome)
+            except KeyError as err:
+                LOG(
+                    'warning: reference template name not recognized', str(err), level=logging.DEBUG
+                )
+            except AssertionError as err:
+                LOG('warning: invalid blat alignment', repr(err), level=logging.DEBUG)
+            else:
+                valid_rows.append(row)
+        valid_rows.sort(key=lambda x: x['score'], reverse=True)
+
+        reads = []
+        invalid_rows = []  # rows which passed the initial check but could not be converted
+        for row in valid_rows:
+            if len(reads) >= blat_limit_top_aln:
+                break
             try:
                 read = Blat.pslx_row_to_pysam(row, input_bam_cache, reference_genome)
             except KeyError as err:
                 LOG(
                     'warning: reference template name not recognized', str(err), level=logging.DEBUG
                 )
+                invalid_rows.append(row)
             except AssertionError as err:
                 LOG('warning: invalid blat alignment', repr(err), level=logging.DEBUG)
+                invalid_rows.append(row)
             else:
                 reads.append((row, read))
 
-        filtered_rows = [
-            (row, read)
-            for row, read in reads
-            if round(row['percent_ident'], 0) >= blat_min_identity
-        ]
-        # filter on score
-        filtered_rows.sort(key=lambda x: x[0]['score'], reverse=True)
         # filter on percent id
-        score_ranks = {}
-        for count, score in enumerate(sorted([row['score'] for row, read in reads], reverse=True)):
-            score_ranks[score] = count
-        min_rank = min(list(score_ranks.values()) + [0])
+        total_alignments = len(
+            [row for row in valid_rows if round(row['percent_ident'], 0) >= blat_min_identity]
+        ) - len(
+            [row for row in invalid_rows if round(row['percent_ident'], 0) >= blat_min_identity]
+        )
+        # rank on score (the number of other alignments with at least the same score)
+        scores = [row['score'] * -1 for row in valid_rows]
+        invalid_scores = [row['score'] * -1 for row in invalid_rows]
 
         filtered_reads = []
-        for count, (row, read) in enumerate(
-            sorted(reads, key=lambda x: x[0]['score'], reverse=True)
-        ):
-            if count >= blat_limit_top_aln:
-                break
-            row['rank'] = score_ranks[row['score']]
-            if row['rank'] > min_rank:
+        for row, read in reads:
+            row['rank'] = (
+                bisect.bisect_right(scores, row['score'] * -1)
+                - bisect.bisect_right(invalid_scores, row['score'] * -1)
+                - 1
+            )
+            if row['rank'] > 0:
                 read.mapping_quality = 0
             read.alignment_rank = row['rank']
             read.set_tag(PYSAM_READ_FLAGS.BLAT_SCORE, row['score'], value_type='i')
-            read.set_tag(PYSAM_READ_FLAGS.BLAT_ALIGNMENTS, len(filtered_rows), value_type='i')
+            read.set_tag(PYSAM_READ_FLAGS.BLAT_ALIGNMENTS, total_alignments, value_type='i')
             read.set_tag(PYSAM_READ_FLAGS.BLAT_PMS, blat_min_percent_of_max_score, value_type='f')
             read.set_tag(PYSAM_READ_FLAGS.BLAT_RANK, row['rank'], value_type='i')
             read.set_tag(
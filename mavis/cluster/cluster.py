@@ -146,51 +146,88 @@ def all_pair_group_keys(pair, explicit_strand=False):
     return result
 
 
+def _union_edges(starts1, ends1, starts2, ends2, cluster_radius):
+    """
+    find all pairs of nodes where the distance between the first breakpoints plus the distance
+    between the second breakpoints is within the cluster radius. Sweeps over the nodes sorted by
+    the start of the first breakpoint, comparing every node to each of the following nodes (by
+    offset, for all nodes at once) until the first breakpoint alone is too far away
+
+    Args:
+        starts1 (list of int): start of the first breakpoint for each node
+        ends1 (list of int): end of the first breakpoint for each node
+        starts2 (list of int): start of the second breakpoint for each node
+        ends2 (list of int): end of the second breakpoint for each node
+        cluster_radius (int): maximum combined distance for nodes to be joined
+
+    Returns:
+        tuple of numpy.ndarray: the indices of the first and second node of each edge
+    """
+    import numpy as np
+
+    order = np.argsort(np.asarray(starts1, dtype=np.int64), kind='stable')
+    start1, end1, start2, end2 = [
+        np.asarray(coords, dtype=np.int64)[order] for coords in [starts1, ends1, starts2, ends2]
+    ]
+    # following nodes can only be close enough while their first breakpoint starts within range
+    limit = np.searchsorted(start1, end1 + cluster_radius, side='right')
+    nodes = np.arange(len(order))
+    firsts = []
+    seconds = []
+    offset = 1
+    current = nodes[limit > nodes + offset]
+    while current.size:
+        other = current + offset
+        distance = np.maximum(
+            0, np.maximum(start1[other] - end1[current], start1[current] - end1[other])
+        ) + np.maximum(0, np.maximum(start2[other] - end2[current], start2[current] - end2[other]))
+        joined = distance <= cluster_radius
+        firsts.append(order[current[joined]])
+        seconds.append(order[other[joined]])
+        offset += 1
+        current = current[limit[current] > current + offset]
+    if not firsts:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.concatenate(firsts), np.concatenate(seconds)
+
+
 def merge_by_union(input_pairs, group_key, weight_adjustment=10, cluster_radius=200):
     """
     for a given set of breakpoint pairs, merge the union of all pairs that are
     within the given distance (cluster_radius)
     """
-    pairs_by_start = sorted(input_pairs, key=lambda x: x.break1.start)
-    pairs_by_end = sorted(input_pairs, key=lambda x: x.break2.start)
-    edges = {pair_key(p): set() for p in input_pairs}
+    pair_keys = [pair_key(p) for p in input_pairs]
+    # identical pairs are a single node. Nodes are numbered in order of first appearance
+    unique_keys = list(dict.fromkeys(pair_keys))
     pairs_by_key = {}
-
-    for i in range(0, len(input_pairs)):
-        pairs_by_key.setdefault(pair_key(pairs_by_start[i]), []).append(pairs_by_start[i])
-        for ordering in [pairs_by_start, pairs_by_end]:
-            # try all combinations until start distance alone is too far
-            curr = ordering[i]
-            ckey = pair_key(curr)
-            edges.setdefault(ckey, set())
-
-            for j in range(i + 1, len(input_pairs)):
-                other = ordering[j]
-                okey = pair_key(other)
-                distance = abs(Interval.dist(curr.break1, other.break1))
-                if distance > cluster_radius:
-                    break
-                distance += abs(Interval.dist(curr.break2, other.break2))
-                if distance <= cluster_radius:
-                    edges[ckey].add(okey)
-                    edges[okey].add(ckey)
-
-    merged = set()
-    merge_nodes = []
-    for node in edges:
-        if node in merged:
-            continue
-        adj = edges[node] | {node}
-        merged.add(node)
-        unmerged = adj - merged
-        # follow edges to merge all connected nodes until all edges have been visited
-        # extracts the current connected component
-        while unmerged:
-            for other in unmerged:
-                adj.update(edges[other])
-                merged.add(other)
-            unmerged = adj - merged
-        merge_nodes.append(adj)
+    for i in sorted(range(len(input_pairs)), key=lambda i: input_pairs[i].break1.start):
+        pairs_by_key.setdefault(pair_keys[i], []).append(input_pairs[i])
+
+    firsts, seconds = _union_edges(
+        [k[2] for k in unique_keys],
+        [k[4] for k in unique_keys],
+        [k[3] for k in unique_keys],
+        [k[5] for k in unique_keys],
+        cluster_radius,
+    )
+    # union-find where the root of each component is its first node
+    parent = list(range(len(unique_keys)))
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for first, second in zip(firsts.tolist(), seconds.tolist()):
+        first, second = find(first), find(second)
+        if first != second:
+            parent[max(first, second)] = min(first, second)
+
+    components = {}
+    for node in range(len(unique_keys)):
+        components.setdefault(find(node), []).append(unique_keys[node])
+    merge_nodes = list(components.values())
     nodes = {}
     for node_keys in merge_nodes:
         pairs = []
@@ -229,8 +266,271 @@ def merge_by_union(input_pairs, group_key, weight_adjustment=10, cluster_radius=
     return nodes
 
 
+class _CenterGrid:
+    """
+    buckets breakpoint pairs into square cells by the centers of their breakpoints so that the
+    pairs near a given pair can be found without comparing it to every pair. Pairs are also
+    numbered in the order they were added so that nearby pairs can be returned in that order
+    """
+
+    def __init__(self, cluster_radius, pairs=None):
+        # cells at least as wide as the radius so that only the adjacent cells need to be searched
+        self.cell_size = max(1, cluster_radius)
+        self.cells = {}
+        self.position = {}
+        self.count = 0
+        for pair in pairs or []:
+            self.add(pair)
+
+    def cell(self, pair):
+        return (
+            int(pair.break1.center // self.cell_size),
+            int(pair.break2.center // self.cell_size),
+        )
+
+    def add(self, pair):
+        if pair in self.position:
+            return
+        self.position[pair] = self.count
+        self.count += 1
+        self.cells.setdefault(self.cell(pair), {})[pair] = None
+
+    def remove(self, pair):
+        del self.position[pair]
+        del self.cells[self.cell(pair)][pair]
+
+    def near(self, pair):
+        """
+        returns the pairs in the cells surrounding the given pair (in the order they were added).
+        Includes every pair whose combined center distance is within the cluster radius
+        """
+        x, y = self.cell(pair)
+        result = []
+        for i, j in itertools.product([x - 1, x, x + 1], [y - 1, y, y + 1]):
+            result.extend(self.cells.get((i, j), {}))
+        return sorted(result, key=lambda p: self.position[p])
+
+
+def _merge_group(
+    group_key, pairs, phase2_pairs, cluster_radius, cluster_initial_size_limit, explicit_strand
+):
+    """
+    merges the breakpoint pairs of a single group (see :func:`merge_breakpoint_pairs`)
+
+    Args:
+        group_key (BreakpointPairGroupKey): the group the breakpoint pairs belong to
+        pairs (list of BreakpointPair): the pairs to be merged in the first phase
+        phase2_pairs (list of BreakpointPair): the pairs to be merged in the second phase
+        cluster_radius (int) maximum distance allowed for a node to merge
+        cluster_initial_size_limit (int): maximum size of breakpoint intervals allowed in the first merging phase
+        explicit_strand (bool): the input pairs are stranded
+
+    Returns:
+        dict of list of BreakpointPair by BreakpointPair: mapping of merged breakpoint pairs to the input pairs used in the merge
+    """
+
+    def pair_center_distance(pair1, pair2):
+        d = abs(pair1.break1.center - pair2.break1.center)
+        d += abs(pair1.break2.center - pair2.break2.center)
+        return d
+
+    nodes = merge_by_union(
+        pairs,
+        group_key,
+        weight_adjustment=cluster_initial_size_limit,
+        cluster_radius=cluster_radius,
+    )
+
+    # phase 2. Sort all the breakpoint pairs left by size and merge the smaller ones in first
+    # this is be/c we assume that a larger breakpoint interval indicates less certainty in the call
+    phase2_pairs = sorted(
+        phase2_pairs,
+        key=lambda p: (len(p.break1) + len(p.break2), pair_key(p)),
+    )
+
+    grid = _CenterGrid(cluster_radius, nodes)
+    for pair in phase2_pairs:
+        distances = [(pair_center_distance(pair, node), node) for node in grid.near(pair)]
+        distances = sorted([d for d in distances if d[0] <= cluster_radius], key=lambda x: x[0])
+        merged = False
+
+        if len(distances) > 0:
+            best = min(distances, key=lambda x: x[0])
+            for dist, node in distances:
+                if dist > best[0]:
+                    break
+                pairs = nodes[node] + [pair]
+
+                itvl1 = merge_integer_intervals(
+                    *[p.break1 for p in pairs], weight_adjustment=cluster_initial_size_limit
+                )
+                itvl2 = merge_integer_intervals(
+                    *[p.break2 for p in pairs], weight_adjustment=cluster_initial_size_limit
+                )
+                if group_key.chr1 == group_key.chr2:
+                    itvl1.end = min(itvl2.end, itvl1.end)
+                    itvl1.start = min(itvl1.start, itvl1.end)
+                    itvl2.start = max(
+                        itvl2.start,
+                        itvl1.start + 2 if not any([p.opposing_strands for p in pairs]) else 1,
+                    )  # for merging putative deletion events
+                    itvl1.start = min(itvl1.start, itvl1.end)
+                    itvl2.end = max(itvl2.end, itvl2.start)
+
+                b1 = Breakpoint(
+                    group_key.chr1,
+                    itvl1.start,
+                    itvl1.end,
+                    orient=group_key.orient1,
+                    strand=group_key.strand1,
+                )
+                b2 = Breakpoint(
+                    group_key.chr2,
+                    itvl2.start,
+                    itvl2.end,
+                    orient=group_key.orient2,
+                    strand=group_key.strand2,
+                )
+
+                new_bpp = BreakpointPair(
+                    b1,
+                    b2,
+                    opposing_strands=group_key.opposing_strands,
+                    stranded=explicit_strand,
+                )
+                del nodes[node]
+                grid.remove(node)
+                nodes.setdefault(new_bpp, []).extend(pairs)
+                grid.add(new_bpp)
+                merged = True
+        if not merged:
+            b1 = Breakpoint(
+                group_key.chr1,
+                pair.break1.start,
+                pair.break1.end,
+                orient=group_key.orient1,
+                strand=group_key.strand1,
+            )
+
+            b2 = Breakpoint(
+                group_key.chr2,
+                pair.break2.start,
+                pair.break2.end,
+                orient=group_key.orient2,
+                strand=group_key.strand2,
+            )
+
+            new_bpp = BreakpointPair(
+                b1, b2, opposing_strands=group_key.opposing_strands, stranded=explicit_strand
+            )
+            nodes.setdefault(new_bpp, []).append(pair)
+            grid.add(new_bpp)
+    return nodes
+
+
+def _pair_coordinates(pair):
+    """
+    the breakpoint positions and the attributes of a breakpoint pair which are used in merging, as a
+    tuple which is cheap to send to a worker process (see :func:`_merge_group_coordinates`)
+    """
+    return (
+        pair.break1.start,
+        pair.break1.end,
+        pair.break1.orient,
+        pair.break1.strand,
+        pair.break2.start,
+        pair.break2.end,
+        pair.break2.orient,
+        pair.break2.strand,
+        pair.opposing_strands,
+        pair.stranded,
+    )
+
+
+def _merge_group_coordinates(group_key, coordinates, phase2_coordinates, **kwargs):
+    """
+    merges a single group from the coordinates of its breakpoint pairs (see :func:`_pair_coordinates`)
+
+    Returns:
+        list of tuple: the breakpoint positions of each merged node and the indices of its input pairs.
+        The phase 2 pairs are indexed following the first phase pairs
+    """
+    pairs = []
+    for index, coords in enumerate(coordinates + phase2_coordinates):
+        start1, end1, orient1, strand1, start2, end2, orient2, strand2, opposing, stranded = coords
+        pair = BreakpointPair(
+            Breakpoint(group_key.chr1, start1, end1, orient=orient1, strand=strand1),
+            Breakpoint(group_key.chr2, start2, end2, orient=orient2, strand=strand2),
+            opposing_strands=opposing,
+            stranded=stranded,
+        )
+        pair.data['tag'] = index
+        pairs.append(pair)
+    nodes = _merge_group(group_key, pairs[: len(coordinates)], pairs[len(coordinates) :], **kwargs)
+    return [
+        (
+            (node.break1.start, node.break1.end, node.break2.start, node.break2.end),
+            [pair.data['tag'] for pair in node_pairs],
+        )
+        for node, node_pairs in nodes.items()
+    ]
+
+
+def _merge_groups_in_parallel(groups, phase2_groups, group_keys, processes, **kwargs):
+    """
+    merges each group in a pool of worker processes. Only the coordinates of the breakpoint pairs are
+    sent to the workers and the merged nodes are rebuilt from the results
+
+    Returns:
+        generator of dict: the merged nodes of each group (see :func:`_merge_group`) in the order of the group keys given
+    """
+    from concurrent import futures
+
+    with futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        jobs = {}
+        # start the largest groups first so that they do not hold up the end of the run
+        for group_key in sorted(
+            group_keys,
+            key=lambda k: len(groups.get(k, [])) + len(phase2_groups.get(k, [])),
+            reverse=True,
+        ):
+            jobs[group_key] = pool.submit(
+                _merge_group_coordinates,
+                group_key,
+                [_pair_coordinates(p) for p in groups.get(group_key, [])],
+                [_pair_coordinates(p) for p in phase2_groups.get(group_key, [])],
+                **kwargs
+            )
+        for group_key in group_keys:
+            group_pairs = groups.get(group_key, []) + phase2_groups.get(group_key, [])
+            nodes = {}
+            for (start1, end1, start2, end2), indices in jobs.pop(group_key).result():
+                b1 = Breakpoint(
+                    group_key.chr1,
+                    start1,
+                    end1,
+                    orient=group_key.orient1,
+                    strand=group_key.strand1,
+                )
+                b2 = Breakpoint(
+                    group_key.chr2,
+                    start2,
+                    end2,
+                    orient=group_key.orient2,
+                    strand=group_key.strand2,
+                )
+                node = BreakpointPair(
+                    b1,
+                    b2,
+                    opposing_strands=group_key.opposing_strands,
+                    stranded=kwargs['explicit_strand'],
+                )
+                nodes[node] = [group_pairs[i] for i in indices]
+            yield nodes
+
+
 def merge_breakpoint_pairs(
-    input_pairs, cluster_radius=200, cluster_initial_size_limit=25, verbose=False
+    input_pairs, cluster_radius=200, cluster_initial_size_limit=25, verbose=False, processes=1
 ):
     """
     two-step merging process
@@ -245,16 +545,12 @@ def merge_breakpoint_pairs(
         input_pairs (list of BreakpointPair): the pairs to be merged
         cluster_radius (int) maximum distance allowed for a node to merge
         cluster_initial_size_limit (int): maximum size of breakpoint intervals allowed in the first merging phase
+        processes (int): the number of worker processes to merge the groups (by chromosome, orientation, and strand) in
 
     Returns:
         dict of list of BreakpointPair by BreakpointPair: mapping of merged breakpoint pairs to the input pairs used in the merge
     """
 
-    def pair_center_distance(pair1, pair2):
-        d = abs(pair1.break1.center - pair2.break1.center)
-        d += abs(pair1.break2.center - pair2.break2.center)
-        return d
-
     mapping = {}
     groups = {}  # split the groups by putative pairings
     pair_weight = {}
@@ -282,99 +578,27 @@ def merge_breakpoint_pairs(
             else:
                 groups.setdefault(key, []).append(pair)
     # now try all pairwise combinations within groups
-    for group_key in sorted(set(list(groups) + list(phase2_groups))):
-        count = len(groups.get(group_key, [])) + len(phase2_groups.get(group_key, []))
-        if verbose:
-            LOG(group_key, 'pairs:', count)
-        nodes = merge_by_union(
-            groups.get(group_key, []),
-            group_key,
-            weight_adjustment=cluster_initial_size_limit,
-            cluster_radius=cluster_radius,
-        )
-
-        # phase 2. Sort all the breakpoint pairs left by size and merge the smaller ones in first
-        # this is be/c we assume that a larger breakpoint interval indicates less certainty in the call
-        phase2_pairs = sorted(
-            phase2_groups.get(group_key, []),
-            key=lambda p: (len(p.break1) + len(p.break2), pair_key(p)),
+    group_keys = sorted(set(list(groups) + list(phase2_groups)))
+    merge_args = dict(
+        cluster_radius=cluster_radius,
+        cluster_initial_size_limit=cluster_initial_size_limit,
+        explicit_strand=explicit_strand,
+    )
+    if processes > 1 and len(group_keys) > 1:
+        merged_groups = _merge_groups_in_parallel(
+            groups, phase2_groups, group_keys, processes, **merge_args
         )
-
-        for pair in phase2_pairs:
-            distances = sorted(
-                [(pair_center_distance(pair, node), node) for node in nodes], key=lambda x: x[0]
+    else:
+        merged_groups = (
+            _merge_group(
+                group_key, groups.get(group_key, []), phase2_groups.get(group_key, []), **merge_args
             )
-            merged = False
-
-            if len(distances) > 0:
-                best = min(distances, key=lambda x: x[0])
-                for dist, node in distances:
-                    if dist > best[0] or dist > cluster_radius:
-                        break
-                    pairs = nodes[node] + [pair]
-
-                    itvl1 = merge_integer_intervals(
-                        *[p.break1 for p in pairs], weight_adjustment=cluster_initial_size_limit
-                    )
-                    itvl2 = merge_integer_intervals(
-                        *[p.break2 for p in pairs], weight_adjustment=cluster_initial_size_limit
-                    )
-                    if group_key.chr1 == group_key.chr2:
-                        itvl1.end = min(itvl2.end, itvl1.end)
-                        itvl1.start = min(itvl1.start, itvl1.end)
-                        itvl2.start = max(
-                            itvl2.start,
-                            itvl1.start + 2 if not any([p.opposing_strands for p in pairs]) else 1,
-                        )  # for merging putative deletion events
-                        itvl1.start = min(itvl1.start, itvl1.end)
-                        itvl2.end = max(itvl2.end, itvl2.start)
-
-                    b1 = Breakpoint(
-                        group_key.chr1,
-                        itvl1.start,
-                        itvl1.end,
-                        orient=group_key.orient1,
-                        strand=group_key.strand1,
-                    )
-                    b2 = Breakpoint(
-                        group_key.chr2,
-                        itvl2.start,
-                        itvl2.end,
-                        orient=group_key.orient2,
-                        strand=group_key.strand2,
-                    )
-
-                    new_bpp = BreakpointPair(
-                        b1,
-                        b2,
-                        opposing_strands=group_key.opposing_strands,
-                        stranded=explicit_strand,
-                    )
-                    del nodes[node]
-                    nodes.setdefault(new_bpp, []).extend(pairs)
-                    merged = True
-            if not merged:
-                b1 = Breakpoint(
-                    group_key.chr1,
-                    pair.break1.start,
-                    pair.break1.end,
-                    orient=group_key.orient1,
-                    strand=group_key.strand1,
-                )
-
-                b2 = Breakpoint(
-                    group_key.chr2,
-                    pair.break2.start,
-                    pair.break2.end,
-                    orient=group_key.orient2,
-                    strand=group_key.strand2,
-                )
-
-                new_bpp = BreakpointPair(
-                    b1, b2, opposing_strands=group_key.opposing_strands, stranded=explicit_strand
-                )
-                nodes.setdefault(new_bpp, []).append(pair)
+            for group_key in group_keys
+        )
+    for group_key, nodes in zip(group_keys, merged_groups):
+        count = len(groups.get(group_key, [])) + len(phase2_groups.get(group_key, []))
         if verbose:
+            LOG(group_key, 'pairs:', count)
             LOG('merged', count, 'down to', len(nodes))
         for node, pairs in nodes.items():
             if node in mapping:
@@ -4,6 +4,7 @@ from ..util import WeakMavisNamespace
 DEFAULTS = WeakMavisNamespace()
 """
 - :term:`cluster_initial_size_limit`
+- :term:`cluster_processes`
 - :term:`cluster_radius`
 - :term:`limit_to_chr`
 - :term:`max_files`
@@ -24,6 +25,14 @@ DEFAULTS.add(
     'phase (combining based on overlap)',
 )
 DEFAULTS.add('cluster_radius', 100, defn='maximum distance allowed between paired breakpoint pairs')
+DEFAULTS.add(
+    'cluster_processes',
+    1,
+    cast_type=int,
+    defn='the number of worker processes used to merge the breakpoint pairs. When greater than 1, the groups of '
+    'pairs (by chromosome, orientation, and strand) are merged in separate processes and the clusters are '
+    'collected in the same order as a single process',
+)
 DEFAULTS.add(
     'max_proximity',
     5000,
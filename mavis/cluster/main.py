@@ -1,3 +1,5 @@
+import functools
+import heapq
 import inspect
 import itertools
 import os
@@ -6,7 +8,12 @@ import time
 
 from .cluster import merge_breakpoint_pairs
 from .constants import DEFAULTS
-from ..constants import COLUMNS
+from ..bam.cache import BamCache
+from ..bam.stats import compute_read_density
+from ..breakpoint import BreakpointPair
+from ..constants import COLUMNS, ORIENT, PROTOCOL
+from ..interval import Interval
+from ..validate.constants import DEFAULTS as VALIDATION_DEFAULTS
 from ..util import (
     filter_on_overlap,
     filter_uninformative,
@@ -20,13 +27,82 @@ from ..util import (
 )
 
 
+def estimate_validation_cost(
+    pair,
+    read_length,
+    median_fragment_size,
+    stdev_fragment_size,
+    read_density=None,
+    call_error=VALIDATION_DEFAULTS.call_error,
+    stdev_count_abnormal=VALIDATION_DEFAULTS.stdev_count_abnormal,
+    fetch_reads_limit=VALIDATION_DEFAULTS.fetch_reads_limit,
+    trans_fetch_reads_limit=VALIDATION_DEFAULTS.trans_fetch_reads_limit,
+):
+    """
+    estimates the relative time it will take to validate a breakpoint pair. This is the number of reads
+    expected in the evidence windows of the pair (see :meth:`~mavis.validate.evidence.GenomeEvidence.generate_window`),
+    up to the fetch limit for the protocol, for each of the event types the pair may be called as
+
+    Args:
+        pair (BreakpointPair): the breakpoint pair to be validated
+        read_length (int): the length of the reads in the bam file
+        median_fragment_size (int): the median insert size
+        stdev_fragment_size (int): the standard deviation of the insert size
+        read_density (dict of float by str): the mean reads per base by chromosome (see :func:`~mavis.bam.stats.compute_read_density`).
+          If not given the cost is the size of the evidence windows instead
+
+    Returns:
+        float: the estimated cost
+    """
+    max_expected_fragment_size = int(
+        round(median_fragment_size + stdev_fragment_size * stdev_count_abnormal, 0)
+    )
+    windows = []
+    for breakpoint in [pair.break1, pair.break2]:
+        start = breakpoint.start - max_expected_fragment_size - call_error + 1
+        end = breakpoint.end + max_expected_fragment_size + call_error - 1
+
+        if breakpoint.orient == ORIENT.LEFT:
+            end = breakpoint.end + call_error + read_length - 1
+        elif breakpoint.orient == ORIENT.RIGHT:
+            start = breakpoint.start - call_error - read_length + 1
+        windows.append(Interval(max([1, start]), max([end, 1])))
+    # reads are only collected once for overlapping windows
+    if pair.interchromosomal or not Interval.overlaps(*windows):
+        windows = [(pair.break1.chr, windows[0]), (pair.break2.chr, windows[1])]
+    else:
+        windows = [(pair.break1.chr, Interval.union(*windows))]
+
+    limit = fetch_reads_limit
+    if pair.data.get(COLUMNS.protocol) == PROTOCOL.TRANS and trans_fetch_reads_limit is not None:
+        limit = trans_fetch_reads_limit
+    reads = 0
+    for chrom, window in windows:
+        if not read_density:
+            reads += len(window)
+        else:
+            density = read_density.get(chrom, sum(read_density.values()) / len(read_density))
+            reads += min(limit, len(window) * density)
+    return reads * max(1, len(BreakpointPair.classify(pair)))
+
+
 def split_clusters(
-    clusters, outputdir, batch_id, min_clusters_per_file=0, max_files=1, write_bed_summary=True
+    clusters,
+    outputdir,
+    batch_id,
+    min_clusters_per_file=0,
+    max_files=1,
+    write_bed_summary=True,
+    cost=None,
 ):
     """
     For a set of clusters creates a bed file representation of all clusters.
     Also splits the clusters evenly into multiple files based on the user parameters (min_clusters_per_file, max_files)
 
+    Args:
+        cost (callable): returns the estimated validation cost of a cluster (see :func:`estimate_validation_cost`). If given,
+          the clusters are split so that each file has a similar total cost instead of a similar number of clusters
+
     Returns:
         list: of output file names (not including the bed file)
     """
@@ -47,9 +123,25 @@ def split_clusters(
         clusters, key=lambda x: (x.break1.chr, x.break1.start, x.break2.chr, x.break2.start)
     )
 
-    # split up consecutive clusters
-    for i, cluster in enumerate(clusters):
-        jobs[i % len(jobs)].append(cluster)
+    if cost is None:
+        # split up consecutive clusters
+        for i, cluster in enumerate(clusters):
+            jobs[i % len(jobs)].append(cluster)
+    else:
+        # add the most expensive clusters first, each to the file with the lowest total cost so far
+        costs = [cost(cluster) for cluster in clusters]
+        totals = [(0, 0, j) for j in range(0, number_of_jobs)]
+        for i in sorted(range(len(clusters)), key=lambda i: costs[i], reverse=True):
+            total, count, j = heapq.heappop(totals)
+            jobs[j].append(i)
+            heapq.heappush(totals, (total + costs[i], count + 1, j))
+        # keep the clusters in each file in positional order
+        jobs = [[clusters[i] for i in sorted(job)] for job in jobs]
+        LOG(
+            'estimated validation cost per file: {:.0f}-{:.0f}'.format(
+                min([t[0] for t in totals]), max([t[0] for t in totals])
+            )
+        )
 
     assert sum([len(j) for j in jobs]) == len(clusters)
     output_files = []
@@ -73,10 +165,15 @@ def main(
     limit_to_chr=DEFAULTS.limit_to_chr,
     cluster_initial_size_limit=DEFAULTS.cluster_initial_size_limit,
     cluster_radius=DEFAULTS.cluster_radius,
+    cluster_processes=DEFAULTS.cluster_processes,
     uninformative_filter=DEFAULTS.uninformative_filter,
     max_proximity=DEFAULTS.max_proximity,
     min_clusters_per_file=DEFAULTS.min_clusters_per_file,
     max_files=DEFAULTS.max_files,
+    bam_file=None,
+    read_length=None,
+    median_fragment_size=None,
+    stdev_fragment_size=None,
     batch_id=None,
     split_only=False,
     start_time=int(time.time()),
@@ -92,6 +189,7 @@ def main(
         masking (object): see :func:`~mavis.annotate.file_io.load_masking_regions`
         cluster_clique_size (int): the maximum size of cliques to search for using the exact algorithm
         cluster_radius (int): distance (in breakpoint pairs) used in deciding to join bpps in a cluster
+        cluster_processes (int): the number of worker processes used to merge the breakpoint pairs
         uninformative_filter (bool): if True then clusters should be filtered out if they are not
           within a specified (max_proximity) distance to any annotation
         max_proximity (int): the maximum distance away an annotation can be before the uninformative_filter
@@ -99,6 +197,14 @@ def main(
         annotations (ReferenceFile): see :func:`~mavis.annotate.file_io.load_reference_genes`
         min_clusters_per_file (int): the minimum number of clusters to output to a file
         max_files (int): the maximum number of files to split clusters into
+        bam_file (str): path to the indexed bam file of the library. Used to estimate the validation cost of the clusters
+        read_length (int): the length of the reads in the bam file
+        median_fragment_size (int): the median insert size
+        stdev_fragment_size (int): the standard deviation of the insert size
+
+    Note:
+        when the read length and fragment size are given the clusters are split by their estimated validation cost
+        (see :func:`estimate_validation_cost`). The validate settings used in the estimate are taken from kwargs
     """
     if uninformative_filter:
         annotations.load()
@@ -189,6 +295,7 @@ def main(
             breakpoint_pairs,
             cluster_radius=cluster_radius,
             cluster_initial_size_limit=cluster_initial_size_limit,
+            processes=cluster_processes,
         )
 
         hist = {}
@@ -239,6 +346,34 @@ def main(
         output_tabbed_file(rows.values(), cluster_assign_output)
         breakpoint_pairs = list(clusters.keys())
 
+    cost = None
+    if None not in [read_length, median_fragment_size, stdev_fragment_size]:
+        read_density = None
+        if bam_file:
+            try:
+                bam_cache = BamCache(bam_file)
+                try:
+                    read_density = compute_read_density(bam_cache)
+                finally:
+                    bam_cache.close()
+            except (OSError, ValueError) as err:  # unreadable bam or no index statistics
+                LOG(
+                    'warning: could not read the index statistics of the bam file, the validation cost is '
+                    'estimated from the size of the evidence windows only:',
+                    repr(err),
+                )
+        cost = functools.partial(
+            estimate_validation_cost,
+            read_length=read_length,
+            median_fragment_size=median_fragment_size,
+            stdev_fragment_size=stdev_fragment_size,
+            read_density=read_density,
+            **{
+                arg: kwargs[arg]
+                for arg in inspect.signature(estimate_validation_cost).parameters
+                if arg in kwargs and arg in VALIDATION_DEFAULTS
+            }
+        )
     output_files = split_clusters(
         breakpoint_pairs,
         output,
@@ -246,6 +381,7 @@ def main(
         min_clusters_per_file=min_clusters_per_file,
         max_files=max_files,
         write_bed_summary=True,
+        cost=cost,
     )
 
     generate_complete_stamp(output, LOG, start_time=start_time, prefix='MAVIS-{}.'.format(batch_id))
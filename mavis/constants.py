@@ -439,11 +439,13 @@ SUBCOMMAND = MavisNamespace(
     CONFIG='config',
     CONVERT='convert',
     OVERLAY='overlay',
+    COMPILE='compile',
 )
 """:class:`MavisNamespace`: holds controlled vocabulary for allowed pipeline stage values
 
 - annotate
 - cluster
+- compile
 - config
 - convert
 - pairing
@@ -586,6 +588,7 @@ PYSAM_READ_FLAGS = MavisNamespace(
     LAST_IN_PAIR=128,
     SECONDARY=256,
     MULTIMAP=1,
+    PROPER_PAIR=2,
     SUPPLEMENTARY=2048,
     TARGETED_ALIGNMENT='ta',
     RECOMPUTED_CIGAR='rc',
@@ -599,6 +602,7 @@ PYSAM_READ_FLAGS = MavisNamespace(
 """:class:`MavisNamespace`: Enum-like. For readable PYSAM flag constants
 
 - ``MULTIMAP``: template having multiple segments in sequencing
+- ``PROPER_PAIR``: each segment properly aligned according to the aligner
 - ``UNMAPPED``: segment unmapped
 - ``MATE_UNMAPPED``: next segment in the template unmapped
 - ``REVERSE``: SEQ being reverse complemented
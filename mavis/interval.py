@@ -1,3 +1,6 @@
+from bisect import bisect_left, bisect_right
+
+
 class Interval:
     """
     """
@@ -528,3 +531,60 @@ class IntervalMapping:
                 else:
                     return int(round(tgt_interval.start, 0))
         raise IndexError(pos, 'position not found in mapping', self.mapping.keys())
+
+
+class IntervalIndex:
+    """
+    static index over a list of intervals (anything which can be indexed as interval[0] and interval[1])
+    which finds the overlapping intervals by binary search rather than comparing against every interval.
+    The intervals are grouped by the magnitude of their length and each group is sorted by start, so a
+    query only visits the intervals starting within the longest length of each group before the query
+    start. A long interval therefore does not slow down the lookups for the shorter intervals
+    """
+
+    def __init__(self, intervals):
+        """
+        Args:
+            intervals (iterable): the intervals to be indexed
+        """
+        self.source = list(intervals)
+        groups = {}
+        for i, interval in enumerate(self.source):
+            groups.setdefault(max(interval[1] - interval[0], 0).bit_length(), []).append(i)
+        # the longest length, the sorted starts and the positions (in the source) of each group
+        self.groups = []
+        for group in sorted(groups):
+            positions = sorted(groups[group], key=lambda i: self.source[i][0])
+            self.groups.append(
+                (
+                    max([self.source[i][1] - self.source[i][0] for i in positions]),
+                    [self.source[i][0] for i in positions],
+                    positions,
+                )
+            )
+
+    def __len__(self):
+        return len(self.source)
+
+    def overlapping(self, other):
+        """
+        Args:
+            other (Interval): the interval to compare to
+
+        Returns:
+            list: the indexed intervals which overlap the input interval (see :meth:`Interval.overlaps`) in their original order
+
+        Example:
+            >>> index = IntervalIndex([Interval(10, 20), Interval(1, 5), Interval(4, 30)])
+            >>> index.overlapping(Interval(5, 9))
+            [Interval(1, 5), Interval(4, 30)]
+        """
+        start, end = other[0], other[1]
+        positions = []
+        for max_length, starts, group_positions in self.groups:
+            first = bisect_left(starts, start - max_length)
+            stop = bisect_right(starts, end, first)
+            for i in group_positions[first:stop]:
+                if self.source[i][1] >= start:
+                    positions.append(i)
+        return [self.source[i] for i in sorted(positions)]
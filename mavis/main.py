@@ -189,6 +189,14 @@ def convert_main(inputs, outputfile, file_type, strand_specific=False, assume_no
     _util.output_tabbed_file(bpp_results, outputfile)
 
 
+def compile_main(annotations, outputfile):
+    annotations.load()
+    if os.path.dirname(outputfile):
+        _util.mkdirp(os.path.dirname(outputfile))
+    _util.LOG('writing:', outputfile)
+    _annotate.file_io.write_compiled_annotations(annotations.content, outputfile)
+
+
 def main(argv=None):
     """
     sets up the parser and checks the validity of command line args
@@ -311,7 +319,21 @@ def main(argv=None):
         '--outputfile', '-o', required=True, help='path to the outputfile', metavar='FILEPATH'
     )
 
-    for command in set(SUBCOMMAND.values()) - {SUBCOMMAND.CONFIG, SUBCOMMAND.CONVERT}:
+    # compile
+    _config.augment_parser(['annotations'], required[SUBCOMMAND.COMPILE])
+    required[SUBCOMMAND.COMPILE].add_argument(
+        '--outputfile',
+        '-o',
+        required=True,
+        help='path to the compiled annotations file to be written',
+        metavar='FILEPATH',
+    )
+
+    for command in set(SUBCOMMAND.values()) - {
+        SUBCOMMAND.CONFIG,
+        SUBCOMMAND.CONVERT,
+        SUBCOMMAND.COMPILE,
+    }:
         required[command].add_argument(
             '-o', '--output', help='path to the output directory', required=True
         )
@@ -363,7 +385,11 @@ def main(argv=None):
         ['library', 'protocol', 'strand_specific', 'disease_status'], required[SUBCOMMAND.CLUSTER]
     )
     _config.augment_parser(
-        list(CLUSTER_DEFAULTS.keys()) + ['masking', 'annotations'], optional[SUBCOMMAND.CLUSTER]
+        list(CLUSTER_DEFAULTS.keys())
+        + ['masking', 'annotations']
+        + ['bam_file', 'read_length', 'stdev_fragment_size', 'median_fragment_size']
+        + ['call_error', 'stdev_count_abnormal', 'fetch_reads_limit', 'trans_fetch_reads_limit'],
+        optional[SUBCOMMAND.CLUSTER],
     )
     optional[SUBCOMMAND.CLUSTER].add_argument(
         '--batch_id', help='batch id to use for prefix of split files', type=_config.nameable_string
@@ -532,6 +558,7 @@ def main(argv=None):
                 SUBCOMMAND.SUMMARY,
                 SUBCOMMAND.OVERLAY,
                 SUBCOMMAND.SETUP,
+                SUBCOMMAND.COMPILE,
             },
         ]
     ):
@@ -564,6 +591,8 @@ def main(argv=None):
             convert_main(**args)
         elif command == SUBCOMMAND.OVERLAY:
             overlay_main(**args)
+        elif command == SUBCOMMAND.COMPILE:
+            compile_main(**args)
         elif command == SUBCOMMAND.CONFIG:
             _config.generate_config(args, parser, log=_util.LOG)
         elif command == SUBCOMMAND.SCHEDULE:
@@ -102,10 +102,16 @@ class LocalScheduler(Scheduler):
             return self.submitted[job.job_ident]
 
         # load any reference files not cached into the parent memory space
+        # the reference genome and annotations are moved into shared memory which the forked workers attach to
         for filetype in [f for f in REFERENCE_DEFAULTS.keys() if f != 'aligner_reference']:
-            if getattr(job, filetype) is not None:
-                ref = ReferenceFile(filetype, getattr(job, filetype))
+            filepaths = getattr(job, filetype)
+            if isinstance(filepaths, str):
+                # multiple files are newline delimited when read from the build file
+                filepaths = [f for f in filepaths.split('\n') if f]
+            if filepaths:
+                ref = ReferenceFile(filetype, *filepaths)
                 ref.load(verbose=False)
+                ref.share()
         # otherwise add it to the pool
         job.response = self.pool.submit(
             job.func, args
@@ -200,6 +200,15 @@ def cluster_args(config, libconf):
         'protocol',
         'disease_status',
         'strand_specific',
+        'bam_file',
+        'read_length',
+        'median_fragment_size',
+        'stdev_fragment_size',
+        # used to estimate the validation cost of each cluster when splitting
+        'call_error',
+        'stdev_count_abnormal',
+        'fetch_reads_limit',
+        'trans_fetch_reads_limit',
     ] + list(_CLUSTER.DEFAULTS.keys())
     args = {}
     args.update(_CLUSTER.DEFAULTS.items())
@@ -207,8 +216,12 @@ def cluster_args(config, libconf):
     args.update(config.cluster.items())
     args.update(config.illustrate.items())
     args.update(config.annotate.items())
+    args.update(config.validate.items())
     args.update(libconf.items())
     args = {k: v for k, v in args.items() if k in allowed_args}
+    for arg in ['bam_file', 'read_length', 'median_fragment_size', 'stdev_fragment_size']:
+        if args.get(arg) is None:
+            args.pop(arg, None)
     return args
 
 
@@ -17,7 +17,7 @@ from shortuuid import uuid
 from .breakpoint import Breakpoint, BreakpointPair
 from .constants import COLUMNS, ORIENT, PROTOCOL, sort_columns, STRAND, SVTYPE, MavisNamespace
 from .error import InvalidRearrangement
-from .interval import Interval
+from .interval import Interval, IntervalIndex
 
 ENV_VAR_PREFIX = 'MAVIS_'
 
@@ -212,20 +212,13 @@ def filter_on_overlap(bpps, regions_by_reference_name):
     LOG('filtering from', len(bpps), 'using overlaps with regions filter')
     failed = []
     passed = []
+    region_index = interval_index_by_chr(regions_by_reference_name)
     for bpp in bpps:
-        overlaps = False
-        for r in regions_by_reference_name.get(bpp.break1.chr, []):
-            if Interval.overlaps(r, bpp.break1):
-                overlaps = True
-                bpp.data[COLUMNS.filter_comment] = 'overlapped masked region: ' + str(r)
-                break
-        for r in regions_by_reference_name.get(bpp.break2.chr, []):
-            if overlaps:
-                break
-            if Interval.overlaps(r, bpp.break2):
-                overlaps = True
-                bpp.data[COLUMNS.filter_comment] = 'overlapped masked region: ' + str(r)
-        if overlaps:
+        regions = region_index(bpp.break1.chr).overlapping(bpp.break1)
+        if not regions:
+            regions = region_index(bpp.break2.chr).overlapping(bpp.break2)
+        if regions:
+            bpp.data[COLUMNS.filter_comment] = 'overlapped masked region: ' + str(regions[0])
             failed.append(bpp)
         else:
             passed.append(bpp)
@@ -271,6 +264,53 @@ def output_tabbed_file(bpps, filename, header=None):
             fh.write('\t'.join([str(row.get(c, None)) for c in header]) + '\n')
 
 
+class TabbedFileWriter:
+    """
+    Writes the rows of a tabbed file as they are produced (see :func:`output_tabbed_file`). The header
+    is written when the file is opened, so it must be given up front. Rows with columns which are not
+    in the header are not written and raise an error
+
+    Example:
+        >>> with TabbedFileWriter('output.tab', header) as writer:
+        ...     for bpp in bpps:
+        ...         writer.write(bpp)
+    """
+
+    def __init__(self, filename, header):
+        self.filename = filename
+        self.header = sort_columns(header)
+        self.columns = set(self.header)
+        LOG('writing:', filename)
+        self.fh = open(filename, 'w')
+        self.fh.write('#' + '\t'.join(self.header) + '\n')
+
+    def write(self, row):
+        """
+        Args:
+            row (dict): the row to be written (or an object with a flatten method)
+
+        Raises:
+            KeyError: the row has columns which are not in the header
+        """
+        if not isinstance(row, dict):
+            row = row.flatten()
+        missing = set(row) - self.columns
+        if missing:
+            raise KeyError('row has columns not in the header of', self.filename, sorted(missing))
+        self.fh.write('\t'.join([str(row.get(c, None)) for c in self.header]) + '\n')
+
+    def close(self):
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if exc_type is not None:  # do not leave a partial output file
+            os.remove(self.filename)
+
+
 def write_bed_file(filename, bed_rows):
     LOG('writing:', filename)
     with open(filename, 'w') as fh:
@@ -333,23 +373,59 @@ def generate_complete_stamp(output_dir, log=DEVNULL, prefix='MAVIS.', start_time
     return stamp
 
 
+def interval_index_by_chr(intervals_by_chr):
+    """
+    Args:
+        intervals_by_chr (:class:`dict` of :class:`list` of :class:`~mavis.interval.Interval` by :class:`str`): the intervals to index
+
+    Returns:
+        callable: returns the :class:`~mavis.interval.IntervalIndex` of the intervals on a given chromosome. The index of
+        each chromosome is built the first time it is requested
+    """
+    indices = {}
+
+    def index(chrom):
+        if chrom not in indices:
+            indices[chrom] = IntervalIndex(intervals_by_chr.get(chrom, []))
+        return indices[chrom]
+
+    return index
+
+
+def overlapping_pre_transcripts(annotations_by_chr, chrom, interval):
+    """
+    Args:
+        annotations_by_chr (:class:`dict` of :class:`list` of :class:`~mavis.annotate.genomic.Gene` by :class:`str`): the reference annotations
+        chrom (str): the chromosome to search
+        interval (Interval): the range to search
+
+    Returns:
+        :class:`list` of :class:`~mavis.annotate.genomic.PreTranscript`: transcripts overlapping the interval (in their
+        original order). Uses the per-chromosome index of the annotations where it has one
+    """
+    if hasattr(annotations_by_chr, 'transcript_index'):
+        return annotations_by_chr.transcript_index(chrom).overlapping(interval)
+    return [
+        transcript
+        for gene in annotations_by_chr.get(chrom, [])
+        for transcript in gene.transcripts
+        if Interval.overlaps(transcript, interval)
+    ]
+
+
 def filter_uninformative(annotations_by_chr, breakpoint_pairs, max_proximity=5000):
+    if hasattr(annotations_by_chr, 'gene_index'):
+        gene_index = annotations_by_chr.gene_index
+    else:
+        gene_index = interval_index_by_chr(annotations_by_chr)
     result = []
     filtered = []
     for bpp in breakpoint_pairs:
-        # loop over the annotations
-        overlaps_gene = False
         window1 = Interval(bpp.break1.start - max_proximity, bpp.break1.end + max_proximity)
         window2 = Interval(bpp.break2.start - max_proximity, bpp.break2.end + max_proximity)
-        for gene in annotations_by_chr.get(bpp.break1.chr, []):
-            if Interval.overlaps(gene, window1):
-                overlaps_gene = True
-                break
-        for gene in annotations_by_chr.get(bpp.break2.chr, []):
-            if Interval.overlaps(gene, window2):
-                overlaps_gene = True
-                break
-        if overlaps_gene:
+        if gene_index(bpp.break1.chr).overlapping(window1) or gene_index(
+            bpp.break2.chr
+        ).overlapping(window2):
             result.append(bpp)
         else:
             filtered.append(bpp)
@@ -13,6 +13,7 @@ from ..constants import (
     ORIENT,
     PROTOCOL,
     PYSAM_READ_FLAGS,
+    READ_PAIR_TYPE,
     reverse_complement,
     STRAND,
     SVTYPE,
@@ -21,6 +22,129 @@ from ..error import NotSpecifiedError
 from ..interval import Interval
 from ..util import DEVNULL
 
+_CIGAR_CLIPPED = (1 << CIGAR.S) | (1 << CIGAR.H)
+_CIGAR_INDEL = (1 << CIGAR.I) | (1 << CIGAR.D)
+_UNMAPPED_FLAGS = PYSAM_READ_FLAGS.UNMAPPED | PYSAM_READ_FLAGS.MATE_UNMAPPED
+_REVERSE = PYSAM_READ_FLAGS.REVERSE
+_MATE_REVERSE = PYSAM_READ_FLAGS.MATE_REVERSE
+_PROPER_PAIR = PYSAM_READ_FLAGS.PROPER_PAIR
+_SECONDARY = PYSAM_READ_FLAGS.SECONDARY
+_LR, _RL, _LL, _RR = READ_PAIR_TYPE.LR, READ_PAIR_TYPE.RL, READ_PAIR_TYPE.LL, READ_PAIR_TYPE.RR
+
+
+class EvidenceReadClassifier:
+    """
+    Read filter precompiled for a single evidence object. The evidence settings, putative event types and
+    the read pair types which support them are resolved once when the classifier is created. Each read is
+    then classified from its flag bits, a bitmask of its cigar operations and its read pair type.
+
+    The :meth:`cache_if` and :meth:`filter_if` methods are used as the callbacks when fetching reads (see
+    :meth:`~mavis.bam.cache.BamCache.fetch_from_bins`). Since these are called in succession for the same
+    read, the classification of the last read is kept
+    """
+
+    def __init__(self, evidence):
+        """
+        Args:
+            evidence (Evidence): the evidence the reads are being collected for
+        """
+        self.min_mapping_quality = evidence.min_mapping_quality
+        self.skip_flags = _SECONDARY if evidence.filter_secondary_alignments else 0
+        self.interchromosomal = evidence.interchromosomal
+        self.check_fragment_size = not evidence.interchromosomal and not evidence.opposing_strands
+        self.read_length = evidence.read_length
+        self.min_expected_fragment_size = evidence.min_expected_fragment_size
+        self.max_expected_fragment_size = evidence.max_expected_fragment_size
+        self.putative_pair_types = set()
+        for event_type in evidence.putative_event_types():
+            self.putative_pair_types.update(_read.EVENT_READ_PAIR_TYPES[event_type])
+        self.cache_pair_types = set(self.putative_pair_types)
+        if evidence.compatible_type:
+            self.cache_pair_types.update(_read.EVENT_READ_PAIR_TYPES[evidence.compatible_type])
+        self._last_read = None
+        self._last_result = (False, False)
+
+    @staticmethod
+    def pair_type(read):
+        """
+        equivalent to :func:`~mavis.bam.read.read_pair_type` but uses the read flag directly
+        """
+        flag = read.flag
+        if read.reference_id == read.next_reference_id:
+            reverse = read.reference_start > read.next_reference_start
+        else:
+            reverse = read.reference_id > read.next_reference_id
+        if not flag & _REVERSE:
+            if flag & _MATE_REVERSE:
+                return _RL if reverse else _LR
+            return _LL
+        elif flag & _MATE_REVERSE:
+            return _RR
+        return _LR if reverse else _RL
+
+    def supports_putative_type(self, read):
+        """
+        Returns:
+            bool: the read pair orientation supports one of the putative event types of the evidence
+        """
+        return self.pair_type(read) in self.putative_pair_types
+
+    def classify(self, read):
+        """
+        Args:
+            read (:class:`~mavis.bam.read.CompactRead`): the read to classify
+
+        Returns:
+            :class:`tuple` of :class:`bool`: the read should be cached, and the read should be kept as evidence
+        """
+        if read is self._last_read:
+            return self._last_result
+        flag = read.flag
+        if flag & _UNMAPPED_FLAGS:
+            result = (True, True)
+        elif flag & self.skip_flags or read.mapping_quality < self.min_mapping_quality:
+            result = (False, False)
+        else:
+            cigar_ops = 0
+            for state, _ in read.cigar:
+                cigar_ops |= 1 << state
+            cache = False
+            if cigar_ops & _CIGAR_CLIPPED:
+                cache = True
+            elif not flag & _PROPER_PAIR:
+                cache = self.pair_type(read) in self.cache_pair_types
+            elif self.check_fragment_size:
+                min_frag_est = (
+                    abs(read.reference_start - read.next_reference_start) - self.read_length
+                )
+                max_frag_est = min_frag_est + 3 * self.read_length
+                cache = (
+                    min_frag_est < self.min_expected_fragment_size
+                    or max_frag_est > self.max_expected_fragment_size
+                )
+            # reads with small indels are kept (but not cached) for intrachromosomal events
+            result = (
+                cache,
+                cache or bool(not self.interchromosomal and cigar_ops & _CIGAR_INDEL),
+            )
+        self._last_read = read
+        self._last_result = result
+        return result
+
+    def cache_if(self, read):
+        """
+        Returns:
+            bool: the read should be cached
+        """
+        return self.classify(read)[0]
+
+    def filter_if(self, read):
+        """
+        Returns:
+            bool: the read should not be kept as evidence
+        """
+        return not self.classify(read)[1]
+
 
 class Evidence(BreakpointPair):
     @property
@@ -153,6 +277,8 @@ class Evidence(BreakpointPair):
         self.contigs = []
 
         self.half_mapped = (set(), set())
+        # reference windows prepared for remapping split reads, by chromosome and window
+        self._nsb_references = {}
 
         try:
             self.compute_fragment_size(None, None)
@@ -280,7 +406,7 @@ class Evidence(BreakpointPair):
         read_interval = Interval(read.reference_start + 1, read.reference_end)
 
         if Interval.overlaps(combined, read_interval):
-
+            read = _read.full_read(read)
             if not read.has_tag(PYSAM_READ_FLAGS.RECOMPUTED_CIGAR) or not read.get_tag(
                 PYSAM_READ_FLAGS.RECOMPUTED_CIGAR
             ):
@@ -341,6 +467,9 @@ class Evidence(BreakpointPair):
             or mate.mapping_quality < self.min_mapping_quality
         ):
             return False
+        # cached reads are compact records, create full reads to standardize and store
+        read = _read.full_read(read)
+        mate = _read.full_read(mate)
         if not read.has_tag(PYSAM_READ_FLAGS.RECOMPUTED_CIGAR) or not read.get_tag(
             PYSAM_READ_FLAGS.RECOMPUTED_CIGAR
         ):
@@ -436,6 +565,9 @@ class Evidence(BreakpointPair):
         elif read.reference_id != read.next_reference_id:
             return False
 
+        # cached reads are compact records, create full reads to standardize and store
+        read = _read.full_read(read)
+        mate = _read.full_read(mate)
         if not read.has_tag(PYSAM_READ_FLAGS.RECOMPUTED_CIGAR) or not read.get_tag(
             PYSAM_READ_FLAGS.RECOMPUTED_CIGAR
         ):
@@ -577,6 +709,7 @@ class Evidence(BreakpointPair):
             )
             if strand != breakpoint.strand:
                 return False  # split read not on the appropriate strand
+        read = _read.full_read(read)
         unused = ''
         primary = ''
         clipped = ''
@@ -627,9 +760,12 @@ class Evidence(BreakpointPair):
 
         # try mapping the soft-clipped portion to the other breakpoint
         w = (opposite_window[0], opposite_window[1])
-        opposite_breakpoint_ref = self.reference_genome[opposite_breakpoint.chr].seq[
-            w[0] - 1 : w[1]
-        ]
+        opposite_breakpoint_ref = self._nsb_references.get((opposite_breakpoint.chr, w))
+        if opposite_breakpoint_ref is None:
+            opposite_breakpoint_ref = _read.NsbReference(
+                self.reference_genome[opposite_breakpoint.chr].seq[w[0] - 1 : w[1]]
+            )
+            self._nsb_references[(opposite_breakpoint.chr, w)] = opposite_breakpoint_ref
 
         putative_alignments = None
         # figure out how much of the read must match when remaped
@@ -839,6 +975,7 @@ class Evidence(BreakpointPair):
             kmer_size,
             min_edge_trim_weight=self.assembly_min_edge_trim_weight,
             assembly_max_paths=self.assembly_max_paths,
+            assembly_engine=self.assembly_engine,
             min_contig_length=self.read_length,
             log=log,
             remap_min_overlap=remap_min_overlap,
@@ -937,63 +1074,55 @@ class Evidence(BreakpointPair):
             list(filtered_contigs.values()), key=lambda x: (x.remap_score() * -1, x.seq)
         )
 
-    def load_evidence(self, log=DEVNULL):
+    def fetch_windows(self):
         """
-        open the associated bam file and read and store the evidence
-        does some preliminary read-quality filtering
+        Returns:
+            list of tuple of str, int, int, int: the chromosome, start, end and read limit of each
+            window read from the bam file by :meth:`load_evidence`
         """
-
-        def cache_if_true(read):
-            if read.is_unmapped or read.mate_is_unmapped:
-                return True
-            elif any(
+        windows = [
+            (self.break1.chr, self.outer_window1[0], self.outer_window1[1], self.fetch_reads_limit),
+            (self.break2.chr, self.outer_window2[0], self.outer_window2[1], self.fetch_reads_limit),
+        ]
+        if self.compatible_window1:
+            windows.extend(
                 [
-                    self.filter_secondary_alignments and read.is_secondary,
-                    read.mapping_quality < self.min_mapping_quality,
+                    (
+                        self.break1.chr,
+                        self.compatible_window1[0],
+                        self.compatible_window1[1],
+                        self.fetch_reads_limit,
+                    ),
+                    (
+                        self.break2.chr,
+                        self.compatible_window2[0],
+                        self.compatible_window2[1],
+                        self.fetch_reads_limit,
+                    ),
                 ]
-            ):
-                return False
-            elif set([x[0] for x in read.cigar]) & {CIGAR.S, CIGAR.H}:
-                return True
-            elif not read.is_proper_pair:
-                if any(
-                    [_read.orientation_supports_type(read, e) for e in self.putative_event_types()]
-                ):
-                    return True
-                elif self.compatible_type and _read.orientation_supports_type(
-                    read, self.compatible_type
-                ):
-                    return True
-            elif not self.interchromosomal and not self.opposing_strands:
-                min_frag_est = (
-                    abs(read.reference_start - read.next_reference_start) - self.read_length
-                )
-                max_frag_est = min_frag_est + 3 * self.read_length
-                if (
-                    min_frag_est < self.min_expected_fragment_size
-                    or max_frag_est > self.max_expected_fragment_size
-                ):
-                    return True
+            )
+        return windows
 
-            return False
+    def release_evidence(self):
+        """
+        drops the reads and contigs collected for this evidence (after its results have been written)
+        so that their memory can be reclaimed
+        """
+        self.split_reads = (set(), set())
+        self.flanking_pairs = set()
+        self.compatible_flanking_pairs = set()
+        self.spanning_reads = set()
+        self.half_mapped = (set(), set())
+        self.contigs = []
+        self._nsb_references = {}
 
-        def filter_if_true(read):
-            if not cache_if_true(read):
-                if any(
-                    [
-                        self.filter_secondary_alignments and read.is_secondary,
-                        read.mapping_quality < self.min_mapping_quality,
-                    ]
-                ):
-                    return True
-                elif not self.interchromosomal and set([x[0] for x in read.cigar]) & {
-                    CIGAR.I,
-                    CIGAR.D,
-                }:
-                    return False
-                return True
-            return False
+    def load_evidence(self, log=DEVNULL):
+        """
+        open the associated bam file and read and store the evidence
+        does some preliminary read-quality filtering
+        """
 
+        classifier = EvidenceReadClassifier(self)
         flanking_pairs = set()  # collect putative pairs
         half_mapped_partners1 = set()
         half_mapped_partners2 = set()
@@ -1006,8 +1135,8 @@ class Evidence(BreakpointPair):
             sample_bins=self.fetch_reads_bins,
             min_bin_size=self.fetch_min_bin_size,
             cache=True,
-            cache_if=cache_if_true,
-            filter_if=filter_if_true,
+            cache_if=classifier.cache_if,
+            filter_if=classifier.filter_if,
         ):
             if read.mapping_quality < self.min_mapping_quality:
                 continue
@@ -1019,12 +1148,7 @@ class Evidence(BreakpointPair):
             if read.mate_is_unmapped:
                 half_mapped_partners1.add(read)
             elif (
-                any(
-                    [
-                        _read.orientation_supports_type(read, et)
-                        for et in self.putative_event_types()
-                    ]
-                )
+                classifier.supports_putative_type(read)
                 and (read.reference_id != read.next_reference_id) == self.interchromosomal
             ):
                 flanking_pairs.add(read)
@@ -1037,8 +1161,8 @@ class Evidence(BreakpointPair):
             sample_bins=self.fetch_reads_bins,
             min_bin_size=self.fetch_min_bin_size,
             cache=True,
-            cache_if=cache_if_true,
-            filter_if=filter_if_true,
+            cache_if=classifier.cache_if,
+            filter_if=classifier.filter_if,
         ):
             if read.mapping_quality < self.min_mapping_quality:
                 continue
@@ -1052,34 +1176,27 @@ class Evidence(BreakpointPair):
             if read.mate_is_unmapped:
                 half_mapped_partners2.add(read)
             elif (
-                any(
-                    [
-                        _read.orientation_supports_type(read, et)
-                        for et in self.putative_event_types()
-                    ]
-                )
+                classifier.supports_putative_type(read)
                 and (read.reference_id != read.next_reference_id) == self.interchromosomal
             ):
                 flanking_pairs.add(read)
+        # try and get the mates from the cache
+        flanking_mates = self.bam_cache.get_mates(flanking_pairs, allow_file_access=False)
         for flanking_read in sorted(
             flanking_pairs, key=lambda x: (x.query_name, x.reference_start)
         ):
-            # try and get the mate from the cache
-            try:
-                mates = self.bam_cache.get_mate(flanking_read, allow_file_access=False)
-                for mate in mates:
-                    if mate.is_unmapped:
-                        log('ignoring unmapped mate', mate.query_name, level=logging.DEBUG)
-                        continue
-                    self.collect_flanking_pair(flanking_read, mate)
-            except KeyError:
-                pass
+            for mate in flanking_mates.get(flanking_read, []):
+                if mate.is_unmapped:
+                    log('ignoring unmapped mate', mate.query_name, level=logging.DEBUG)
+                    continue
+                self.collect_flanking_pair(flanking_read, mate)
 
         if self.compatible_window1:
             compatible_type = SVTYPE.DUP
             if SVTYPE.DUP in self.putative_event_types():
                 compatible_type = SVTYPE.INS
 
+            compatible_pair_types = _read.EVENT_READ_PAIR_TYPES[compatible_type]
             compt_flanking = set()
             for read in self.bam_cache.fetch_from_bins(
                 '{0}'.format(self.break1.chr),
@@ -1089,10 +1206,10 @@ class Evidence(BreakpointPair):
                 sample_bins=self.fetch_reads_bins,
                 min_bin_size=self.fetch_min_bin_size,
                 cache=True,
-                cache_if=cache_if_true,
-                filter_if=filter_if_true,
+                cache_if=classifier.cache_if,
+                filter_if=classifier.filter_if,
             ):
-                if _read.orientation_supports_type(read, compatible_type):
+                if classifier.pair_type(read) in compatible_pair_types:
                     compt_flanking.add(read)
 
             for read in self.bam_cache.fetch_from_bins(
@@ -1103,28 +1220,23 @@ class Evidence(BreakpointPair):
                 sample_bins=self.fetch_reads_bins,
                 min_bin_size=self.fetch_min_bin_size,
                 cache=True,
-                cache_if=cache_if_true,
-                filter_if=filter_if_true,
+                cache_if=classifier.cache_if,
+                filter_if=classifier.filter_if,
             ):
-                if _read.orientation_supports_type(read, compatible_type):
+                if classifier.pair_type(read) in compatible_pair_types:
                     compt_flanking.add(read)
 
+            # try and get the mates from the cache
+            compt_mates = self.bam_cache.get_mates(compt_flanking, allow_file_access=False)
             for flanking_read in compt_flanking:
-                # try and get the mate from the cache
-                try:
-                    mates = self.bam_cache.get_mate(flanking_read, allow_file_access=False)
-                    for mate in mates:
-                        if mate.is_unmapped:
-                            log('ignoring unmapped mate', mate.query_name, level=logging.DEBUG)
-                            continue
-                        try:
-                            self.collect_compatible_flanking_pair(
-                                flanking_read, mate, compatible_type
-                            )
-                        except ValueError:
-                            pass
-                except KeyError:
-                    pass
+                for mate in compt_mates.get(flanking_read, []):
+                    if mate.is_unmapped:
+                        log('ignoring unmapped mate', mate.query_name, level=logging.DEBUG)
+                        continue
+                    try:
+                        self.collect_compatible_flanking_pair(flanking_read, mate, compatible_type)
+                    except ValueError:
+                        pass
 
         # now collect the half mapped reads
         log(
@@ -1133,17 +1245,14 @@ class Evidence(BreakpointPair):
             'putative half mapped reads',
             time_stamp=False,
         )
-        mates_found = 0
-        for read in half_mapped_partners1 | half_mapped_partners2:
-            # try and get the mate from the cache
-            try:
-                mates = self.bam_cache.get_mate(read, allow_file_access=False)
-                mates_found += 1
-                for mate in mates:
-                    self.collect_half_mapped(read, mate)
-            except KeyError:
-                pass
-        log(mates_found, 'half-mapped mates found')
+        # try and get the mates from the cache
+        half_mapped_mates = self.bam_cache.get_mates(
+            half_mapped_partners1 | half_mapped_partners2, allow_file_access=False
+        )
+        for read, mates in half_mapped_mates.items():
+            for mate in mates:
+                self.collect_half_mapped(read, mate)
+        log(len(half_mapped_mates), 'half-mapped mates found')
 
     def copy(self):
         raise NotImplementedError('not appropriate for copy of evidence')
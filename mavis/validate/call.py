@@ -25,6 +25,46 @@ class EventCall(BreakpointPair):
     just a reference to the evidence object and decisions on class, exact breakpoints, etc
     """
 
+    FLATTEN_COLUMNS = (
+        COLUMNS.call_method,
+        COLUMNS.event_type,
+        COLUMNS.contig_seq,
+        COLUMNS.contig_remap_score,
+        COLUMNS.contig_alignment_score,
+        COLUMNS.contig_alignment_rank,
+        COLUMNS.contig_remapped_reads,
+        COLUMNS.contig_remapped_read_names,
+        COLUMNS.contig_strand_specific,
+        COLUMNS.contig_alignment_query_consumption,
+        COLUMNS.contig_build_score,
+        COLUMNS.contig_alignment_query_name,
+        COLUMNS.contig_remap_coverage,
+        COLUMNS.contig_read_depth,
+        COLUMNS.contig_break1_read_depth,
+        COLUMNS.contig_break2_read_depth,
+        COLUMNS.call_sequence_complexity,
+        COLUMNS.supplementary_call,
+        COLUMNS.repeat_count,
+        COLUMNS.flanking_pairs,
+        COLUMNS.flanking_median_fragment_size,
+        COLUMNS.flanking_stdev_fragment_size,
+        COLUMNS.flanking_pairs_read_names,
+        COLUMNS.break1_split_reads,
+        COLUMNS.break1_split_reads_forced,
+        COLUMNS.break1_split_read_names,
+        COLUMNS.break2_split_reads,
+        COLUMNS.break2_split_reads_forced,
+        COLUMNS.break2_split_read_names,
+        COLUMNS.linking_split_reads,
+        COLUMNS.linking_split_read_names,
+        COLUMNS.spanning_reads,
+        COLUMNS.spanning_read_names,
+        COLUMNS.flanking_pairs_compatible,
+        COLUMNS.flanking_pairs_compatible_read_names,
+        COLUMNS.net_size,
+    )
+    """tuple: the columns :meth:`flatten` adds to the columns of the source evidence"""
+
     @property
     def has_compatible(self):
         return False if self.compatible_type is None else True
@@ -1,5 +1,6 @@
 from ..constants import float_fraction
 from ..align import SUPPORTED_ALIGNER
+from ..assemble import ASSEMBLY_ENGINE
 from ..util import WeakMavisNamespace
 
 PASS_FILENAME = 'validation-passed.tab'
@@ -7,6 +8,11 @@ PASS_FILENAME = 'validation-passed.tab'
 DEFAULTS = WeakMavisNamespace()
 """
 - :term:`aligner`
+- :term:`aligner_cache_dir`
+- :term:`aligner_cache_limit`
+- :term:`aligner_server`
+- :term:`aligner_threads`
+- :term:`assembly_engine`
 - :term:`assembly_kmer_size`
 - :term:`assembly_max_paths`
 - :term:`assembly_min_edge_trim_weight`
@@ -25,7 +31,10 @@ DEFAULTS = WeakMavisNamespace()
 - :term:`contig_aln_min_extend_overlap`
 - :term:`contig_aln_min_query_consumption`
 - :term:`contig_aln_min_score`
+- :term:`evidence_batch_size`
+- :term:`fetch_cache_limit`
 - :term:`fetch_min_bin_size`
+- :term:`fetch_prefetch_region_size`
 - :term:`fetch_reads_bins`
 - :term:`fetch_reads_limit`
 - :term:`filter_secondary_alignments`
@@ -44,6 +53,7 @@ DEFAULTS = WeakMavisNamespace()
 - :term:`min_spanning_reads_resolution`
 - :term:`min_splits_reads_resolution`
 - :term:`outer_window_min_event_size`
+- :term:`processes`
 - :term:`stdev_count_abnormal`
 - :term:`strand_determining_read`
 
@@ -61,6 +71,49 @@ DEFAULTS.add(
     cast_type=SUPPORTED_ALIGNER,
     defn='the aligner to use to map the contigs/reads back to the reference e.g blat or bwa',
 )
+DEFAULTS.add(
+    'aligner_cache_dir',
+    None,
+    cast_type=str,
+    nullable=True,
+    defn='path to a directory used to cache the contig alignments between validation jobs. Alignments are stored by the '
+    'contig sequence, the aligner and its version, the aligner reference, and the alignment options. Contigs found in '
+    'the cache are not realigned. If this is None, contigs are always aligned',
+)
+DEFAULTS.add(
+    'aligner_cache_limit',
+    1024,
+    cast_type=int,
+    nullable=True,
+    defn='the maximum size (in MB) of the contig alignment cache. When exceeded, the least recently used alignments are '
+    'removed. If this is None, the cache is not limited',
+)
+DEFAULTS.add(
+    'aligner_server',
+    None,
+    cast_type=str,
+    nullable=True,
+    defn='address (host:port) of a running blat gfServer with the aligner reference already loaded. When given, contigs '
+    'are aligned with gfClient instead of starting blat (and reloading the reference) for each validation job. If the '
+    'server cannot be reached the standalone aligner is used instead. Align options which gfClient does not accept '
+    '(ex. -stepSize) are ignored with a warning. bwa mem does not need this setting since it uses an index loaded '
+    'with bwa shm automatically',
+)
+DEFAULTS.add(
+    'aligner_threads',
+    1,
+    cast_type=int,
+    nullable=True,
+    defn='the number of threads used by bwa mem when aligning contigs. If this is None, the number of CPUs available to '
+    'the validation job is used',
+)
+DEFAULTS.add(
+    'assembly_engine',
+    ASSEMBLY_ENGINE.NETWORKX,
+    cast_type=ASSEMBLY_ENGINE,
+    defn='the DeBruijn graph implementation used to assemble contigs. The kmer engine packs the kmers into integers '
+    'and does not use networkx but otherwise follows the same graph simplification rules',
+)
 DEFAULTS.add(
     'assembly_kmer_size',
     0.74,
@@ -164,6 +217,26 @@ DEFAULTS.add(
     defn='the minimum size of any bin for reading from a bam file. Increasing this number will result in smaller bins '
     'being merged or less bins being created (depending on the fetch method)',
 )
+DEFAULTS.add(
+    'fetch_cache_limit',
+    None,
+    cast_type=int,
+    nullable=True,
+    defn='the maximum size (in MB) of the reads held in the bam cache used for finding mates. The size of each read is '
+    'estimated from its sequence, qualities, cigar and tags. When exceeded, the least recently used reads (not '
+    'overlapping the window of an evidence object still to be loaded) are evicted. If this is None, the cache is not '
+    'limited',
+)
+DEFAULTS.add(
+    'fetch_prefetch_region_size',
+    None,
+    cast_type=int,
+    nullable=True,
+    defn='the maximum size of a merged region when prefetching reads for a batch of evidence windows. Overlapping '
+    'windows are merged and read from the bam file once. The reads of a merged region are held until all of its '
+    'windows have been gathered and are not counted against the fetch_cache_limit, so larger regions use more '
+    'memory. If this is None (the default), each window is read from the bam directly',
+)
 DEFAULTS.add(
     'fetch_reads_bins',
     5,
@@ -301,3 +374,21 @@ DEFAULTS.add(
     defn='Remove the aligner output files after the validation stage is complete. Not'
     ' required for subsequent steps but can be useful in debugging and deep investigation of events',
 )
+DEFAULTS.add(
+    'processes',
+    1,
+    cast_type=int,
+    defn='the number of worker processes used to validate the evidence clusters. When greater than 1, the clusters '
+    'are partitioned by genomic position and each partition is validated (with its own bam file handle and aligner '
+    'files) in a separate process. The results are merged back into the input order',
+)
+DEFAULTS.add(
+    'evidence_batch_size',
+    None,
+    cast_type=int,
+    nullable=True,
+    defn='the number of evidence clusters gathered and aligned together. The results and evidence files for each cluster '
+    'are written once its events are called and the collected reads are then released, so memory use scales with the '
+    'batch size rather than the input size. Each batch requires a separate call to the aligner. If this is None (the '
+    'default), all the clusters are processed as a single batch',
+)
@@ -1,5 +1,7 @@
+from concurrent import futures
 import hashlib
 import itertools
+import multiprocessing
 import os
 import re
 import time
@@ -8,16 +10,16 @@ import warnings
 import pysam
 from shortuuid import uuid
 
-from .call import call_events
+from .call import call_events, EventCall
 from .constants import DEFAULTS, PASS_FILENAME
 from .evidence import GenomeEvidence, TranscriptomeEvidence
-from ..align import align_sequences, select_contig_alignments, SUPPORTED_ALIGNER
+from ..align import AlignmentCache, align_sequences, select_contig_alignments, SUPPORTED_ALIGNER
 from ..annotate.base import BioInterval
 from ..bam import cigar as _cigar
 from ..bam.cache import BamCache
 from ..breakpoint import BreakpointPair
 from ..constants import CALL_METHOD, COLUMNS, MavisNamespace, PROTOCOL
-from ..util import filter_on_overlap, LOG, mkdirp, output_tabbed_file, read_inputs, write_bed_file
+from ..util import filter_on_overlap, LOG, mkdirp, read_inputs, TabbedFileWriter, write_bed_file
 
 
 def main(
@@ -80,7 +82,13 @@ def main(
     else:
         raise NotImplementedError('unsupported aligner', validation_settings.aligner)
     igv_batch_file = os.path.join(output, 'igv.batch')
-    input_bam_cache = BamCache(bam_file, strand_specific)
+    input_bam_cache = BamCache(
+        bam_file,
+        strand_specific,
+        max_cache_bytes=None
+        if validation_settings.fetch_cache_limit is None
+        else validation_settings.fetch_cache_limit * 1024 * 1024,
+    )
 
     bpps = read_inputs(
         inputs,
@@ -147,211 +155,70 @@ def main(
     evidence_clusters, filtered_evidence_clusters = filter_on_overlap(
         evidence_clusters, extended_masks
     )
-    contig_sequences = {}
-    for i, evidence in enumerate(evidence_clusters):
-        LOG()
-        LOG(
-            '({} of {})'.format(i + 1, len(evidence_clusters)),
-            'gathered evidence for:',
-            evidence.cluster_id,
-            ''
-            if COLUMNS.tracking_id not in evidence.data
-            else '(tracking_id: {})'.format(evidence.tracking_id),
-            time_stamp=True,
-        )
-        LOG(evidence, time_stamp=False)
-        LOG('possible event type(s):', BreakpointPair.classify(evidence), time_stamp=False)
-        LOG(
-            'outer window regions:  {}:{}-{}  {}:{}-{}'.format(
-                evidence.break1.chr,
-                evidence.outer_window1[0],
-                evidence.outer_window1[1],
-                evidence.break2.chr,
-                evidence.outer_window2[0],
-                evidence.outer_window2[1],
-            ),
-            time_stamp=False,
-        )
-        LOG(
-            'inner window regions:  {}:{}-{}  {}:{}-{}'.format(
-                evidence.break1.chr,
-                evidence.inner_window1[0],
-                evidence.inner_window1[1],
-                evidence.break2.chr,
-                evidence.inner_window2[0],
-                evidence.inner_window2[1],
-            ),
-            time_stamp=False,
-        )
-        evidence.load_evidence(log=LOG)
-        LOG(
-            'flanking pairs: {};'.format(len(evidence.flanking_pairs)),
-            'split reads: {}, {};'.format(*[len(a) for a in evidence.split_reads]),
-            'half-mapped reads: {}, {};'.format(*[len(a) for a in evidence.half_mapped]),
-            'spanning-reads: {};'.format(len(evidence.spanning_reads)),
-            'compatible flanking pairs:',
-            len(evidence.compatible_flanking_pairs),
-            time_stamp=False,
-        )
-        evidence.assemble_contig(log=LOG)
-        LOG('assembled {} contigs'.format(len(evidence.contigs)), time_stamp=False)
-        for contig in evidence.contigs:
-            name = 'seq-{}'.format(hashlib.md5(contig.seq.encode('utf-8')).hexdigest())
-            LOG(
-                '>',
-                name,
-                '(size={}; reads={:.0f}; coverage={:.2f})'.format(
-                    len(contig.seq), contig.remap_score(), contig.remap_coverage()
-                ),
-                time_stamp=False,
-            )
-            LOG(contig.seq[:140], time_stamp=False)
-            contig_sequences[name] = contig.seq
-
-    LOG('will output:', contig_aligner_fa, contig_aligner_output)
-    raw_contig_alignments = align_sequences(
-        contig_sequences,
-        input_bam_cache,
-        reference_genome=reference_genome.content,
-        aligner_fa_input_file=contig_aligner_fa,
-        aligner_output_file=contig_aligner_output,
-        clean_files=validation_settings.clean_aligner_files,
-        aligner=kwargs.get('aligner', validation_settings.aligner),
-        aligner_reference=aligner_reference.name[0],
-        aligner_output_log=contig_aligner_log,
-        blat_min_identity=kwargs.get('blat_min_identity', validation_settings.blat_min_identity),
-        blat_limit_top_aln=kwargs.get('blat_limit_top_aln', validation_settings.blat_limit_top_aln),
-        log=LOG,
-    )
-    for evidence in evidence_clusters:
-        select_contig_alignments(evidence, raw_contig_alignments)
-    LOG('alignment complete', time_stamp=True)
-    event_calls = []
-    total_pass = 0
     write_bed_file(
         evidence_bed,
         itertools.chain.from_iterable([e.get_bed_repesentation() for e in evidence_clusters]),
     )
-    validation_counts = {}
-    for index, evidence in enumerate(evidence_clusters):
-        LOG()
-        LOG(
-            '({} of {}) calling events for: {} {} (tracking_id: {})'.format(
-                index + 1,
-                len(evidence_clusters),
-                evidence.cluster_id,
-                evidence.putative_event_types(),
-                evidence.tracking_id,
-            ),
-            time_stamp=True,
+    validation_args = dict(
+        reference_genome=reference_genome.content,
+        aligner_reference=aligner_reference.name[0],
+        aligner_version=kwargs.get('aligner_version', None),
+        validation_settings=validation_settings,
+        contig_aligner_fa=contig_aligner_fa,
+        contig_aligner_output=contig_aligner_output,
+        contig_aligner_log=contig_aligner_log,
+        contig_bam=contig_bam if validation_settings.write_evidence_files else None,
+        raw_evidence_bam=raw_evidence_bam if validation_settings.write_evidence_files else None,
+    )
+    partitions = partition_evidence(evidence_clusters, validation_settings.processes)
+    if len(partitions) > 1:
+        results = _validate_in_parallel(
+            evidence_clusters,
+            partitions,
+            bam_file=input_bam_cache.fh.filename,  # reopened by each worker
+            strand_specific=strand_specific,
+            **validation_args
         )
-        LOG('source:', evidence)
-        calls = []
-        failure_comment = None
-        try:
-            calls = call_events(evidence)
-            event_calls.extend(calls)
-        except UserWarning as err:
-            LOG('warning: error in calling events', repr(err))
-            failure_comment = str(err)
-
-        if not calls:
-            failure_comment = (
-                ['zero events were called'] if failure_comment is None else failure_comment
-            )
-            evidence.data[COLUMNS.filter_comment] = failure_comment
-            filtered_evidence_clusters.append(evidence)
-        else:
-            total_pass += 1
+    else:
+        results = validate_evidence_clusters(evidence_clusters, input_bam_cache, **validation_args)
 
-        LOG('called {} event(s)'.format(len(calls)), time_stamp=True)
-        for call in calls:
-            LOG(call)
-            if call.call_method == CALL_METHOD.CONTIG:
-                LOG(
-                    '\t{} {} [{}] contig_alignment_score: {}, contig_alignment_mq: {} contig_alignment_rank: {}'.format(
-                        call.event_type,
-                        call.call_method,
-                        call.contig_alignment.query_name,
-                        round(call.contig_alignment.score(), 2),
-                        tuple(call.contig_alignment.mapping_quality()),
-                        tuple(call.contig_alignment.alignment_rank()),
-                    )
-                )
-                LOG('\talignment:', call.contig_alignment.alignment_id())
-            elif call.contig_alignment:
-                LOG(
-                    '\t{} {} alignment:'.format(call.event_type, call.call_method),
-                    call.contig_alignment.alignment_id(),
-                )
-            else:
-                LOG('\t{} {}'.format(call.event_type, call.call_method), time_stamp=False)
-            validation_counts[call.cluster_id] = validation_counts.get(call.cluster_id, 0) + 1
-            call.data[COLUMNS.validation_id] = '{}-v{}'.format(
-                call.cluster_id, validation_counts[call.cluster_id]
-            )
-            LOG(
-                '\tremapped reads: {}; spanning reads: {}; split reads: [{} ({}), {} ({}), {}]'
-                ', flanking pairs: {}{}'.format(
-                    0 if not call.contig else len(call.contig.input_reads),
-                    len(call.spanning_reads),
-                    len(call.break1_split_read_names()),
-                    len(call.break1_split_read_names(tgt=True)),
-                    len(call.break2_split_read_names()),
-                    len(call.break2_split_read_names(tgt=True)),
-                    len(call.linking_split_read_names()),
-                    len(call.flanking_pairs),
-                    ''
-                    if not call.has_compatible
-                    else '(' + str(len(call.compatible_flanking_pairs)) + ')',
-                )
-            )
+    # the columns are known before validation so the rows can be written as they are produced
+    evidence_columns = set()
+    for evidence in evidence_clusters:
+        evidence_columns.update(evidence.flatten().keys())
+    passed_header = evidence_columns | set(EventCall.FLATTEN_COLUMNS)
+    passed_header.update(
+        [COLUMNS.validation_id, COLUMNS.break1_homologous_seq, COLUMNS.break2_homologous_seq]
+    )
+    failed_header = evidence_columns | {COLUMNS.filter_comment}
+    for evidence in filtered_evidence_clusters:
+        failed_header.update(evidence.flatten().keys())
 
-    # write the output validated clusters (split by type and contig)
-    for i, call in enumerate(event_calls):
-        b1_homseq = None
-        b2_homseq = None
-        try:
-            b1_homseq, b2_homseq = call.breakpoint_sequence_homology(reference_genome.content)
-        except AttributeError:
-            pass
-        call.data.update(
-            {COLUMNS.break1_homologous_seq: b1_homseq, COLUMNS.break2_homologous_seq: b2_homseq}
-        )
+    total_pass = 0
+    LOG('writing:', passed_bed_file)
+    with TabbedFileWriter(passed_output_file, passed_header) as passed_writer, TabbedFileWriter(
+        failed_output_file, failed_header
+    ) as failed_writer, open(passed_bed_file, 'w') as passed_bed_fh:
+        for evidence in filtered_evidence_clusters:
+            failed_writer.write(evidence)
+        # write the results for each cluster as they are validated
+        for call_rows, call_bed_rows, failed_row in results:
+            if failed_row is None:
+                total_pass += 1
+                for row in call_rows:
+                    passed_writer.write(row)
+                for bed in call_bed_rows:
+                    passed_bed_fh.write('\t'.join([str(c) for c in bed]) + '\n')
+            else:
+                failed_writer.write(failed_row)
     LOG(
         '{} putative calls resulted in {} events with 1 or more event call'.format(
             len(evidence_clusters), total_pass
         ),
         time_stamp=True,
     )
-    output_tabbed_file(event_calls, passed_output_file)
-    output_tabbed_file(filtered_evidence_clusters, failed_output_file)
-    write_bed_file(
-        passed_bed_file,
-        itertools.chain.from_iterable([e.get_bed_repesentation() for e in event_calls]),
-    )
 
     if validation_settings.write_evidence_files:
-        with pysam.AlignmentFile(contig_bam, 'wb', template=input_bam_cache.fh) as fh:
-            LOG('writing:', contig_bam, time_stamp=True)
-            for evidence in evidence_clusters:
-                for contig in evidence.contigs:
-                    for aln in contig.alignments:
-                        aln.read1.cigar = _cigar.convert_for_igv(aln.read1.cigar)
-                        fh.write(aln.read1)
-                        if aln.read2:
-                            aln.read2.cigar = _cigar.convert_for_igv(aln.read2.cigar)
-                            fh.write(aln.read2)
-
-        # write the evidence
-        with pysam.AlignmentFile(raw_evidence_bam, 'wb', template=input_bam_cache.fh) as fh:
-            LOG('writing:', raw_evidence_bam, time_stamp=True)
-            reads = set()
-            for evidence in evidence_clusters:
-                reads.update(evidence.supporting_reads())
-            for read in reads:
-                read.cigar = _cigar.convert_for_igv(read.cigar)
-                fh.write(read)
         # now sort the contig bam
         sort = re.sub(r'.bam$', '.sorted.bam', contig_bam)
         LOG('sorting the bam file:', contig_bam, time_stamp=True)
@@ -377,3 +244,454 @@ def main(
             fh.write('load {} name="{}"\n'.format(evidence_bed, 'evidence windows'))
             fh.write('load {} name="{}"\n'.format(raw_evidence_bam, 'raw evidence'))
             fh.write('load {} name="{} {} input"\n'.format(bam_file, library, protocol))
+
+
+def partition_evidence(evidence_clusters, partitions):
+    """
+    splits the evidence into (at most) a given number of partitions of genomically local clusters.
+    Evidence from the same cluster is always kept in the same partition so that validation ids are
+    assigned exactly as they would be for a single process
+
+    Args:
+        evidence_clusters (:class:`list` of :class:`~mavis.validate.base.Evidence`): the evidence to partition
+        partitions (int): the maximum number of partitions to create
+
+    Returns:
+        :class:`list` of :class:`list` of :class:`int`: the indices of the input evidence in each partition
+    """
+    groups = {}
+    for index, evidence in enumerate(evidence_clusters):
+        groups.setdefault(evidence.data.get(COLUMNS.cluster_id), []).append(index)
+
+    def position(group):
+        evidence = evidence_clusters[group[0]]
+        return (
+            evidence.break1.chr,
+            evidence.break1.start,
+            evidence.break2.chr,
+            evidence.break2.start,
+            group[0],
+        )
+
+    result = []
+    current = []
+    assigned = 0
+    for group in sorted(groups.values(), key=position):
+        if current and len(result) < partitions - 1:
+            target = (len(evidence_clusters) - assigned) / (partitions - len(result))
+            # close the current partition when adding this cluster moves it further from the target
+            if abs(len(current) + len(group) - target) > abs(len(current) - target):
+                result.append(current)
+                assigned += len(current)
+                current = []
+        current.extend(group)
+    if current:
+        result.append(current)
+    return result
+
+
+def validate_evidence_clusters(
+    evidence_clusters,
+    input_bam_cache,
+    reference_genome,
+    aligner_reference,
+    validation_settings,
+    contig_aligner_fa,
+    contig_aligner_output,
+    contig_aligner_log,
+    contig_bam=None,
+    raw_evidence_bam=None,
+    aligner_version=None,
+):
+    """
+    gathers the evidence, assembles and aligns contigs, and calls events for a set of evidence clusters
+
+    Args:
+        evidence_clusters (:class:`list` of :class:`~mavis.validate.base.Evidence`): the evidence to validate
+        input_bam_cache (BamCache): the bam cache the evidence reads are collected from
+        reference_genome (:class:`dict` of :class:`Bio.SeqRecord` by :class:`str`): dict of reference sequence by template/chr name
+        aligner_reference (str): path to the aligner reference file
+        validation_settings (MavisNamespace): the validation settings
+        contig_aligner_fa (str): path to the fasta file of contigs to be aligned
+        contig_aligner_output (str): path to the aligner output file
+        contig_aligner_log (str): path to the aligner log file
+        contig_bam (str): path to write the aligned contigs to (not written if None)
+        raw_evidence_bam (str): path to write the supporting reads to (not written if None)
+        aligner_version (str): the version of the aligner (used in caching the contig alignments)
+
+    Yields:
+        :class:`tuple`: for each evidence cluster (in the input order), the flattened event call rows, the event call bed
+        rows, and the flattened evidence row if no events were called (otherwise None)
+    """
+    if validation_settings.fetch_prefetch_region_size:
+        input_bam_cache.plan_prefetch(
+            itertools.chain.from_iterable([e.fetch_windows() for e in evidence_clusters]),
+            max_region_size=validation_settings.fetch_prefetch_region_size,
+        )
+    aligner_cache = None
+    if validation_settings.aligner_cache_dir:
+        aligner_cache = AlignmentCache(
+            validation_settings.aligner_cache_dir,
+            validation_settings.aligner,
+            aligner_reference,
+            aligner_version=aligner_version,
+            max_size=None
+            if validation_settings.aligner_cache_limit is None
+            else validation_settings.aligner_cache_limit * 1024 * 1024,
+        )
+    batch_size = validation_settings.evidence_batch_size or len(evidence_clusters)
+    batches = [
+        (batch_start, evidence_clusters[batch_start : batch_start + batch_size])
+        for batch_start in range(0, len(evidence_clusters), max(batch_size, 1))
+    ] or [(0, [])]
+    if len(batches) > 1:
+        aligner_files = [
+            _tagged_filename(f, 'batch')
+            for f in [contig_aligner_fa, contig_aligner_output, contig_aligner_log]
+        ]
+        for filename in [contig_aligner_fa, contig_aligner_output, contig_aligner_log]:
+            if os.path.exists(filename):
+                os.remove(filename)
+    else:
+        aligner_files = [contig_aligner_fa, contig_aligner_output, contig_aligner_log]
+    contig_fh = None
+    evidence_fh = None
+    written_reads = set()  # keys of the supporting reads already written to the evidence bam
+    try:
+        if contig_bam:
+            contig_fh = pysam.AlignmentFile(contig_bam, 'wb', template=input_bam_cache.fh)
+        if raw_evidence_bam:
+            evidence_fh = pysam.AlignmentFile(raw_evidence_bam, 'wb', template=input_bam_cache.fh)
+        validation_counts = {}
+        for batch_start, batch in batches:
+            contig_sequences = {}
+            for i, evidence in enumerate(batch, batch_start):
+                LOG()
+                LOG(
+                    '({} of {})'.format(i + 1, len(evidence_clusters)),
+                    'gathered evidence for:',
+                    evidence.cluster_id,
+                    ''
+                    if COLUMNS.tracking_id not in evidence.data
+                    else '(tracking_id: {})'.format(evidence.tracking_id),
+                    time_stamp=True,
+                )
+                LOG(evidence, time_stamp=False)
+                LOG('possible event type(s):', BreakpointPair.classify(evidence), time_stamp=False)
+                LOG(
+                    'outer window regions:  {}:{}-{}  {}:{}-{}'.format(
+                        evidence.break1.chr,
+                        evidence.outer_window1[0],
+                        evidence.outer_window1[1],
+                        evidence.break2.chr,
+                        evidence.outer_window2[0],
+                        evidence.outer_window2[1],
+                    ),
+                    time_stamp=False,
+                )
+                LOG(
+                    'inner window regions:  {}:{}-{}  {}:{}-{}'.format(
+                        evidence.break1.chr,
+                        evidence.inner_window1[0],
+                        evidence.inner_window1[1],
+                        evidence.break2.chr,
+                        evidence.inner_window2[0],
+                        evidence.inner_window2[1],
+                    ),
+                    time_stamp=False,
+                )
+                evidence.load_evidence(log=LOG)
+                input_bam_cache.release_prefetch(evidence.fetch_windows())
+                LOG(
+                    'flanking pairs: {};'.format(len(evidence.flanking_pairs)),
+                    'split reads: {}, {};'.format(*[len(a) for a in evidence.split_reads]),
+                    'half-mapped reads: {}, {};'.format(*[len(a) for a in evidence.half_mapped]),
+                    'spanning-reads: {};'.format(len(evidence.spanning_reads)),
+                    'compatible flanking pairs:',
+                    len(evidence.compatible_flanking_pairs),
+                    time_stamp=False,
+                )
+                LOG(
+                    'bam cache: {} reads; mate hits: {}; mate misses: {}; evicted reads: {}'.format(
+                        input_bam_cache.cache_size,
+                        input_bam_cache.hits,
+                        input_bam_cache.misses,
+                        input_bam_cache.evictions,
+                    ),
+                    time_stamp=False,
+                )
+                evidence.assemble_contig(log=LOG)
+                LOG('assembled {} contigs'.format(len(evidence.contigs)), time_stamp=False)
+                for contig in evidence.contigs:
+                    name = 'seq-{}'.format(hashlib.md5(contig.seq.encode('utf-8')).hexdigest())
+                    LOG(
+                        '>',
+                        name,
+                        '(size={}; reads={:.0f}; coverage={:.2f})'.format(
+                            len(contig.seq), contig.remap_score(), contig.remap_coverage()
+                        ),
+                        time_stamp=False,
+                    )
+                    LOG(contig.seq[:140], time_stamp=False)
+                    contig_sequences[name] = contig.seq
+
+            LOG('will output:', aligner_files[0], aligner_files[1])
+            raw_contig_alignments = align_sequences(
+                contig_sequences,
+                input_bam_cache,
+                reference_genome=reference_genome,
+                aligner_fa_input_file=aligner_files[0],
+                aligner_output_file=aligner_files[1],
+                clean_files=validation_settings.clean_aligner_files,
+                aligner=validation_settings.aligner,
+                aligner_reference=aligner_reference,
+                aligner_output_log=aligner_files[2],
+                blat_min_identity=validation_settings.blat_min_identity,
+                blat_limit_top_aln=validation_settings.blat_limit_top_aln,
+                aligner_server=validation_settings.aligner_server,
+                aligner_threads=validation_settings.aligner_threads,
+                aligner_cache=aligner_cache,
+                log=LOG,
+            )
+            for evidence in batch:
+                select_contig_alignments(evidence, raw_contig_alignments)
+            LOG('alignment complete', time_stamp=True)
+            if len(batches) > 1:
+                for batch_filename, filename in zip(
+                    aligner_files, [contig_aligner_fa, contig_aligner_output, contig_aligner_log]
+                ):
+                    _append_batch_file(batch_filename, filename, skip_header=batch_start > 0)
+            for index, evidence in enumerate(batch, batch_start):
+                LOG()
+                LOG(
+                    '({} of {}) calling events for: {} {} (tracking_id: {})'.format(
+                        index + 1,
+                        len(evidence_clusters),
+                        evidence.cluster_id,
+                        evidence.putative_event_types(),
+                        evidence.tracking_id,
+                    ),
+                    time_stamp=True,
+                )
+                LOG('source:', evidence)
+                calls = []
+                failure_comment = None
+                try:
+                    calls = call_events(evidence)
+                except UserWarning as err:
+                    LOG('warning: error in calling events', repr(err))
+                    failure_comment = str(err)
+
+                failed_row = None
+                if not calls:
+                    failure_comment = (
+                        ['zero events were called'] if failure_comment is None else failure_comment
+                    )
+                    evidence.data[COLUMNS.filter_comment] = failure_comment
+                    failed_row = evidence.flatten()
+
+                LOG('called {} event(s)'.format(len(calls)), time_stamp=True)
+                for call in calls:
+                    LOG(call)
+                    if call.call_method == CALL_METHOD.CONTIG:
+                        LOG(
+                            '\t{} {} [{}] contig_alignment_score: {}, contig_alignment_mq: {} contig_alignment_rank: {}'.format(
+                                call.event_type,
+                                call.call_method,
+                                call.contig_alignment.query_name,
+                                round(call.contig_alignment.score(), 2),
+                                tuple(call.contig_alignment.mapping_quality()),
+                                tuple(call.contig_alignment.alignment_rank()),
+                            )
+                        )
+                        LOG('\talignment:', call.contig_alignment.alignment_id())
+                    elif call.contig_alignment:
+                        LOG(
+                            '\t{} {} alignment:'.format(call.event_type, call.call_method),
+                            call.contig_alignment.alignment_id(),
+                        )
+                    else:
+                        LOG('\t{} {}'.format(call.event_type, call.call_method), time_stamp=False)
+                    validation_counts[call.cluster_id] = (
+                        validation_counts.get(call.cluster_id, 0) + 1
+                    )
+                    call.data[COLUMNS.validation_id] = '{}-v{}'.format(
+                        call.cluster_id, validation_counts[call.cluster_id]
+                    )
+                    LOG(
+                        '\tremapped reads: {}; spanning reads: {}; split reads: [{} ({}), {} ({}), {}]'
+                        ', flanking pairs: {}{}'.format(
+                            0 if not call.contig else len(call.contig.input_reads),
+                            len(call.spanning_reads),
+                            len(call.break1_split_read_names()),
+                            len(call.break1_split_read_names(tgt=True)),
+                            len(call.break2_split_read_names()),
+                            len(call.break2_split_read_names(tgt=True)),
+                            len(call.linking_split_read_names()),
+                            len(call.flanking_pairs),
+                            ''
+                            if not call.has_compatible
+                            else '(' + str(len(call.compatible_flanking_pairs)) + ')',
+                        )
+                    )
+                    b1_homseq = None
+                    b2_homseq = None
+                    try:
+                        b1_homseq, b2_homseq = call.breakpoint_sequence_homology(reference_genome)
+                    except AttributeError:
+                        pass
+                    call.data.update(
+                        {
+                            COLUMNS.break1_homologous_seq: b1_homseq,
+                            COLUMNS.break2_homologous_seq: b2_homseq,
+                        }
+                    )
+                yield (
+                    [call.flatten() for call in calls],
+                    list(itertools.chain.from_iterable([c.get_bed_repesentation() for c in calls])),
+                    failed_row,
+                )
+
+                # the rows have been written by the caller, write the evidence files and release the reads
+                if contig_fh:
+                    for contig in evidence.contigs:
+                        for aln in contig.alignments:
+                            aln.read1.cigar = _cigar.convert_for_igv(aln.read1.cigar)
+                            contig_fh.write(aln.read1)
+                            if aln.read2:
+                                aln.read2.cigar = _cigar.convert_for_igv(aln.read2.cigar)
+                                contig_fh.write(aln.read2)
+                if evidence_fh:
+                    reads = [r for r in evidence.supporting_reads() if r.key() not in written_reads]
+                    # reads created from the cache do not keep the base qualities and tags of the input
+                    input_bam_cache.fill_read_data(reads)
+                    for read in reads:
+                        written_reads.add(read.key())
+                        cigar = read.cigar  # reads may be shared with clusters not yet called
+                        read.cigar = _cigar.convert_for_igv(cigar)
+                        evidence_fh.write(read)
+                        read.cigar = cigar
+                evidence.release_evidence()
+    finally:
+        for fh in [contig_fh, evidence_fh]:
+            if fh:
+                fh.close()
+
+
+def _tagged_filename(filename, tag):
+    """
+    inserts a tag into a filename after its first part. ex. contigs.bam => contigs.part-1.bam
+    """
+    dirname, basename = os.path.split(filename)
+    prefix, suffix = (basename.split('.', 1) + [''])[:2]
+    return os.path.join(dirname, '{}.{}.{}'.format(prefix, tag, suffix).rstrip('.'))
+
+
+def _append_batch_file(batch_filename, filename, skip_header=False):
+    """
+    appends the aligner file for a single batch (or partition) to the aligner file for all of them and
+    removes it (SAM header lines are only kept for the first one)
+    """
+    if not os.path.exists(batch_filename):  # already removed by the aligner cleanup
+        return
+    with open(batch_filename, 'r') as batch_fh, open(filename, 'a') as fh:
+        for line in batch_fh:
+            if skip_header and line.startswith('@'):
+                continue
+            fh.write(line)
+    os.remove(batch_filename)
+
+
+_PARTITION_CONTEXT = {}
+"""dict: state shared with the forked worker processes which validate a partition of the evidence"""
+
+
+def _validate_partition(partition):
+    """
+    validates a single partition of the evidence in a worker process. The worker opens its own
+    handle to the input bam file and writes its own aligner and evidence files
+    """
+    context = _PARTITION_CONTEXT
+    evidence_clusters = [context['evidence_clusters'][i] for i in context['partitions'][partition]]
+    bam_cache = BamCache(
+        context['bam_file'],
+        context['strand_specific'],
+        max_cache_bytes=None
+        if context['validation_settings'].fetch_cache_limit is None
+        else context['validation_settings'].fetch_cache_limit * 1024 * 1024,
+    )
+    for evidence in evidence_clusters:
+        evidence.bam_cache = bam_cache
+
+    args = {}
+    for arg, value in context.items():
+        if arg in {'evidence_clusters', 'partitions', 'bam_file', 'strand_specific'}:
+            continue
+        elif arg in {
+            'contig_aligner_fa',
+            'contig_aligner_output',
+            'contig_aligner_log',
+            'contig_bam',
+            'raw_evidence_bam',
+        }:
+            value = _tagged_filename(value, 'part-{}'.format(partition + 1)) if value else value
+        args[arg] = value
+    try:
+        return list(validate_evidence_clusters(evidence_clusters, bam_cache, **args))
+    finally:
+        bam_cache.close()
+
+
+def _validate_in_parallel(evidence_clusters, partitions, **kwargs):
+    """
+    validates each partition of the evidence in a separate process and merges the results back into
+    the input order of the evidence (see :func:`validate_evidence_clusters`)
+    """
+    LOG(
+        'validating {} evidence clusters in {} partitions'.format(
+            len(evidence_clusters), len(partitions)
+        ),
+        time_stamp=True,
+    )
+    results = [None for evidence in evidence_clusters]
+    _PARTITION_CONTEXT.update(kwargs)
+    _PARTITION_CONTEXT.update({'evidence_clusters': evidence_clusters, 'partitions': partitions})
+    try:
+        # workers must be forked (regardless of the default start method) since they inherit the
+        # context above, this also avoids copying the reference genome and evidence
+        with futures.ProcessPoolExecutor(
+            max_workers=len(partitions), mp_context=multiprocessing.get_context('fork')
+        ) as pool:
+            for partition, partition_results in zip(
+                partitions, pool.map(_validate_partition, range(len(partitions)))
+            ):
+                for index, result in zip(partition, partition_results):
+                    results[index] = result
+    finally:
+        _PARTITION_CONTEXT.clear()
+
+    for filename in [
+        kwargs['contig_aligner_fa'],
+        kwargs['contig_aligner_output'],
+        kwargs['contig_aligner_log'],
+    ]:
+        if os.path.exists(filename):
+            os.remove(filename)
+        for partition in range(len(partitions)):
+            _append_batch_file(
+                _tagged_filename(filename, 'part-{}'.format(partition + 1)),
+                filename,
+                skip_header=partition > 0,
+            )
+
+    for bam in [kwargs['contig_bam'], kwargs['raw_evidence_bam']]:
+        if not bam:
+            continue
+        partition_bams = [
+            _tagged_filename(bam, 'part-{}'.format(p + 1)) for p in range(len(partitions))
+        ]
+        LOG('merging:', bam, time_stamp=True)
+        pysam.cat('-o', bam, *partition_bams)
+        for filename in partition_bams:
+            os.remove(filename)
+    return results
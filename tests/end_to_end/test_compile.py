@@ -0,0 +1,41 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from mavis.annotate.file_io import load_annotations, SharedAnnotations
+from mavis.constants import SUBCOMMAND
+from mavis.main import main
+
+from ..util import get_data
+
+
+class TestCompile(unittest.TestCase):
+    def setUp(self):
+        self.temp_output = tempfile.mkdtemp()
+
+    def test_compile_annotations(self):
+        outputfile = os.path.join(self.temp_output, 'annotations.db')
+        args = [
+            'mavis',
+            SUBCOMMAND.COMPILE,
+            '--annotations',
+            get_data('annotations_subsample.tab'),
+            '-o',
+            outputfile,
+        ]
+        with patch.object(sys, 'argv', args):
+            self.assertEqual(0, main())
+        expected = load_annotations(get_data('annotations_subsample.tab'))
+        result = load_annotations(outputfile)
+        self.assertIsInstance(result, SharedAnnotations)
+        self.assertEqual(sorted(expected.keys()), sorted(result.keys()))
+        self.assertEqual(
+            sum([len(genes) for genes in expected.values()]),
+            sum([len(genes) for genes in result.values()]),
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_output)
@@ -91,6 +91,15 @@ class TestHelpMenu(unittest.TestCase):
             else:
                 self.assertEqual(0, returncode)
 
+    def test_compile(self):
+        with patch.object(sys, 'argv', ['mavis', SUBCOMMAND.COMPILE, '-h']):
+            try:
+                returncode = main()
+            except SystemExit as err:
+                self.assertEqual(0, err.code)
+            else:
+                self.assertEqual(0, returncode)
+
     def test_overlay(self):
         with patch.object(sys, 'argv', ['mavis', SUBCOMMAND.OVERLAY, '-h']):
             try:
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mavis.annotate.file_io import ReferenceFile, SharedAnnotations, SharedReferenceGenome
+from mavis.constants import SUBCOMMAND
+from mavis.schedule.local import LocalJob, LocalScheduler
+
+from ...util import get_data
+
+
+def fetch_reference(args):
+    # runs in the worker process and reads from the content cached by the parent
+    reference_genome = ReferenceFile('reference_genome', get_data('mock_reference_genome.fa'))
+    annotations = ReferenceFile('annotations', get_data('mock_annotations.json'))
+    reference_genome.load()
+    annotations.load()
+    return (
+        type(reference_genome.content).__name__,
+        reference_genome.content['fake'].seq[100:120],
+        type(annotations.content).__name__,
+        sorted(annotations.content.keys()),
+    )
+
+
+class TestLocalSchedulerSubmit(unittest.TestCase):
+    def setUp(self):
+        self.temp_output = tempfile.mkdtemp()
+        self.cache = dict(ReferenceFile.CACHE)
+        ReferenceFile.CACHE.clear()
+
+    def tearDown(self):
+        ReferenceFile.CACHE.clear()
+        ReferenceFile.CACHE.update(self.cache)
+        shutil.rmtree(self.temp_output)
+
+    def test_workers_attach_to_shared_reference(self):
+        scheduler = LocalScheduler(concurrency_limit=1)
+        job = LocalJob(
+            stage=SUBCOMMAND.VALIDATE,
+            output_dir=self.temp_output,
+            name='test',
+            args=[],
+            func=fetch_reference,
+            reference_genome=get_data('mock_reference_genome.fa'),
+            annotations=[get_data('mock_annotations.json')],
+        )
+        scheduler.submit(job)
+        genome_name, seq, annotations_name, chroms = job.response.result()
+        scheduler.wait()
+
+        reference_genome = ReferenceFile('reference_genome', get_data('mock_reference_genome.fa'))
+        annotations = ReferenceFile('annotations', get_data('mock_annotations.json'))
+        self.assertIsInstance(reference_genome.load().content, SharedReferenceGenome)
+        self.assertIsInstance(annotations.load().content, SharedAnnotations)
+        self.assertEqual(SharedReferenceGenome.__name__, genome_name)
+        self.assertEqual(SharedAnnotations.__name__, annotations_name)
+        self.assertEqual(reference_genome.content['fake'].seq[100:120], seq)
+        self.assertEqual(sorted(annotations.content.keys()), chroms)
+        self.assertTrue(os.path.exists(job.complete_stamp()))
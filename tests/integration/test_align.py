@@ -1,7 +1,12 @@
+import os
 import shutil
+import subprocess
+import tempfile
 import unittest
 from unittest import mock
 
+import pysam
+
 from mavis import align
 from mavis.annotate.file_io import load_reference_genome
 from mavis.assemble import Contig
@@ -785,3 +790,247 @@ class TestGetAlignerVersion(unittest.TestCase):
             self.assertEqual(
                 '0.7.12-r1039', align.get_aligner_version(align.SUPPORTED_ALIGNER.BWA_MEM)
             )
+
+
+class TestAlignerServer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files = {
+            'aligner_fa_input_file': os.path.join(self.temp_dir.name, 'aligner_in.fa'),
+            'aligner_output_file': os.path.join(self.temp_dir.name, 'aligner_out.pslx'),
+            'aligner_output_log': os.path.join(self.temp_dir.name, 'aligner_out.log'),
+        }
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def align(self, **kwargs):
+        with mock.patch('mavis.blat.process_blat_output', mock.Mock(return_value={})):
+            align.align_sequences(
+                {'seq': 'ACTG'},
+                BAM_CACHE,
+                REFERENCE_GENOME,
+                aligner=align.SUPPORTED_ALIGNER.BLAT,
+                aligner_reference='/path/to/reference.2bit',
+                **self.files,
+                **kwargs
+            )
+
+    def test_parse_aligner_server(self):
+        self.assertEqual(('server', 1234), align.parse_aligner_server('server:1234'))
+        self.assertEqual(('localhost', 1234), align.parse_aligner_server('1234'))
+        with self.assertRaises(ValueError):
+            align.parse_aligner_server('server:port')
+
+    def test_uses_server(self):
+        with mock.patch('subprocess.check_call') as check_call:
+            self.align(aligner_server='server:1234')
+        self.assertEqual(1, check_call.call_count)
+        command = check_call.call_args[0][0]
+        self.assertTrue(command.startswith('gfClient server 1234 /path/to '))
+        self.assertIn('-minIdentity=70.0', command)
+
+    def test_server_align_options(self):
+        with mock.patch('subprocess.check_call') as check_call:
+            with self.assertWarns(UserWarning):
+                self.align(
+                    aligner_server='server:1234',
+                    align_options='-minIdentity=90 -stepSize=5 -maxIntron=100',
+                )
+        command = check_call.call_args[0][0]
+        self.assertIn('-minIdentity=90', command)
+        self.assertIn('-maxIntron=100', command)
+        self.assertNotIn('-minIdentity=70.0', command)
+        self.assertNotIn('-stepSize', command)
+
+    def test_fallback_on_server_error(self):
+        with mock.patch(
+            'subprocess.check_call',
+            mock.Mock(side_effect=[subprocess.CalledProcessError(255, 'gfClient'), None]),
+        ) as check_call:
+            self.align(aligner_server='server:1234')
+        self.assertEqual(2, check_call.call_count)
+        self.assertTrue(check_call.call_args[0][0].startswith('blat /path/to/reference.2bit '))
+
+    def test_no_server(self):
+        with mock.patch('subprocess.check_call') as check_call:
+            self.align()
+        self.assertEqual(1, check_call.call_count)
+        self.assertTrue(check_call.call_args[0][0].startswith('blat '))
+
+
+class TestBwaMemStream(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.files = {
+            'aligner_fa_input_file': os.path.join(self.temp_dir.name, 'aligner_in.fa'),
+            'aligner_output_file': os.path.join(self.temp_dir.name, 'aligner_out.sam'),
+            'aligner_output_log': os.path.join(self.temp_dir.name, 'aligner_out.log'),
+        }
+        self.sam = os.path.join(self.temp_dir.name, 'bwa.sam')
+        with open(self.sam, 'w') as fh:
+            fh.write('@SQ\tSN:reference3\tLN:3711\n')
+            fh.write('seq\t0\treference3\t1115\t60\t10M\t*\t0\t0\tCCTGAGCATG\t*\n')
+            fh.write('seq2\t4\t*\t0\t0\t*\t*\t0\t0\tAAAAAAAAAA\t*\n')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def align(self, output_command, aligner_reference='reference.fa', **kwargs):
+        popen = subprocess.Popen
+        commands = []
+
+        def mock_popen(command, **kwargs):
+            commands.append(command)
+            return popen(output_command, **kwargs)
+
+        with mock.patch('subprocess.Popen', mock_popen):
+            result = align.align_sequences(
+                {'seq': 'CCTGAGCATG', 'seq2': 'AAAAAAAAAA'},
+                BAM_CACHE,
+                REFERENCE_GENOME,
+                aligner=align.SUPPORTED_ALIGNER.BWA_MEM,
+                aligner_reference=aligner_reference,
+                **self.files,
+                **kwargs
+            )
+        return result, commands
+
+    def test_parse_stdout(self):
+        result, commands = self.align('cat {}'.format(self.sam))
+        self.assertEqual(['CCTGAGCATG'], list(result.keys()))
+        read = result['CCTGAGCATG'][0]
+        self.assertEqual(1114, read.reference_start)
+        self.assertEqual(BAM_CACHE.reference_id('reference3'), read.reference_id)
+        self.assertFalse(os.path.exists(self.files['aligner_output_file']))
+        self.assertNotIn('-t', commands[0].split())
+
+    def test_keep_output_file(self):
+        self.align('cat {}'.format(self.sam), clean_files=False, aligner_threads=4)
+        with pysam.AlignmentFile(self.files['aligner_output_file'], 'r') as fh:
+            self.assertEqual(['seq', 'seq2'], [r.query_name for r in fh])
+        with open(self.files['aligner_output_log'], 'r') as fh:
+            self.assertTrue(fh.readline().startswith('>>> bwa mem -Y -t 4 '))
+
+    def test_aligner_error(self):
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.align('exit 1')
+
+    def test_aligner_thread_count(self):
+        self.assertEqual(3, align.aligner_thread_count(3))
+        with mock.patch('os.sched_getaffinity', mock.Mock(return_value={0, 1}), create=True):
+            self.assertEqual(2, align.aligner_thread_count(None))
+
+    def test_cached_alignments(self):
+        cache = align.AlignmentCache(
+            os.path.join(self.temp_dir.name, 'cache'),
+            align.SUPPORTED_ALIGNER.BWA_MEM,
+            self.sam,
+            aligner_version='0.7.15-r1140',
+        )
+        exp, commands = self.align('cat {}'.format(self.sam), self.sam, aligner_cache=cache)
+        self.assertEqual(1, len(commands))
+        result, commands = self.align('exit 1', self.sam, aligner_cache=cache)
+        self.assertEqual([], commands)
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+        self.assertEqual([], result['AAAAAAAAAA'])
+        read = result['CCTGAGCATG'][0]
+        exp_read = exp['CCTGAGCATG'][0]
+        for attr in [
+            'query_name',
+            'flag',
+            'reference_id',
+            'reference_start',
+            'cigar',
+            'query_sequence',
+            'mapping_quality',
+        ]:
+            self.assertEqual(getattr(exp_read, attr), getattr(read, attr))
+        self.assertEqual(exp_read.get_tags(), read.get_tags())
+        self.assertEqual(exp_read.key(), read.key())
+        self.assertEqual('reference3', read.reference_name)
+
+
+class TestAlignmentCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.reference = get_data('mock_reference_genome.fa')
+        self.cache = align.AlignmentCache(
+            self.temp_dir.name, align.SUPPORTED_ALIGNER.BLAT, self.reference, aligner_version='36'
+        )
+        self.cache_handle = BamCache(MockBamFileHandle({'reference3': 3}))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def mock_read(self):
+        read = SamRead(
+            reference_name='reference3',
+            query_sequence='ACTGACTGAC',
+            reference_start=100,
+            cigar=[(CIGAR.S, 2), (CIGAR.EQ, 8)],
+            alignment_score=8,
+        )
+        read.alignment_rank = 1
+        read.set_tag('bs', 8, value_type='i')
+        read.set_tag('bi', 98.5, value_type='f')
+        return read
+
+    def test_get_missing(self):
+        self.assertIsNone(self.cache.get('ACTGACTGAC', {}, 'name', self.cache_handle))
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+
+    def test_put_and_get(self):
+        self.cache.put('ACTGACTGAC', {'align_options': None}, [self.mock_read()])
+        reads = self.cache.get('ACTGACTGAC', {'align_options': None}, 'name', self.cache_handle)
+        self.assertEqual(1, len(reads))
+        read = reads[0]
+        self.assertEqual('name', read.query_name)
+        self.assertEqual(3, read.reference_id)
+        self.assertEqual(100, read.reference_start)
+        self.assertEqual([(CIGAR.S, 2), (CIGAR.EQ, 8)], read.cigar)
+        self.assertEqual(1, read.alignment_rank)
+        self.assertEqual(8, read.alignment_score)
+        self.assertEqual(8, read.get_tag('bs'))
+        self.assertAlmostEqual(98.5, read.get_tag('bi'))
+
+    def test_options_in_key(self):
+        self.cache.put('ACTGACTGAC', {'align_options': None}, [self.mock_read()])
+        self.assertIsNone(
+            self.cache.get('ACTGACTGAC', {'align_options': '-k 10'}, 'name', self.cache_handle)
+        )
+        other_version = align.AlignmentCache(
+            self.temp_dir.name, align.SUPPORTED_ALIGNER.BLAT, self.reference, aligner_version='35'
+        )
+        self.assertIsNone(
+            other_version.get('ACTGACTGAC', {'align_options': None}, 'name', self.cache_handle)
+        )
+
+    def test_evict_least_recently_used(self):
+        for i, seq in enumerate(['AAAAAAAAAA', 'CCCCCCCCCC', 'GGGGGGGGGG']):
+            self.cache.put(seq, {}, [self.mock_read()])
+            os.utime(self.cache._path(seq, {}), (i, i))
+        size = os.path.getsize(self.cache._path('AAAAAAAAAA', {}))
+        self.cache.max_size = size * 2
+        self.cache.evict()
+        self.assertFalse(os.path.exists(self.cache._path('AAAAAAAAAA', {})))
+        self.assertTrue(os.path.exists(self.cache._path('CCCCCCCCCC', {})))
+        self.assertTrue(os.path.exists(self.cache._path('GGGGGGGGGG', {})))
+        self.assertEqual(size * 2, self.cache.size)
+
+    def test_evict_scans_only_when_over_size(self):
+        self.cache.put('AAAAAAAAAA', {}, [self.mock_read()])
+        size = os.path.getsize(self.cache._path('AAAAAAAAAA', {}))
+        self.cache.max_size = size * 2
+        self.cache.evict()  # first call scans to find the current size
+        self.assertEqual(size, self.cache.size)
+        with mock.patch('os.walk') as walk:
+            self.cache.put('CCCCCCCCCC', {}, [self.mock_read()])
+            self.cache.evict()
+            walk.assert_not_called()
+        self.assertEqual(size * 2, self.cache.size)
+        self.cache.put('GGGGGGGGGG', {}, [self.mock_read()])
+        os.utime(self.cache._path('AAAAAAAAAA', {}), (0, 0))
+        self.cache.evict()
+        self.assertEqual(size * 2, self.cache.size)
+        self.assertFalse(os.path.exists(self.cache._path('AAAAAAAAAA', {})))
@@ -1,7 +1,33 @@
 import os
+import pickle
+import shutil
+import struct
+import tempfile
 import unittest
 
-from mavis.annotate.file_io import convert_tab_to_json, load_annotations
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+import pysam
+
+from mavis.annotate.file_io import (
+    COMPILED_ANNOTATIONS_VERSION,
+    convert_tab_to_json,
+    IndexedReferenceGenome,
+    is_compiled_annotations,
+    load_annotations,
+    load_compiled_annotations,
+    load_reference_genome,
+    ReferenceAnnotations,
+    share_annotations,
+    share_reference_genome,
+    SharedAnnotations,
+    SharedReferenceGenome,
+    write_compiled_annotations,
+)
+from mavis.annotate.genomic import Gene
+from mavis.annotate.variant import overlapping_transcripts
+from mavis.breakpoint import Breakpoint
+from mavis.interval import Interval
 
 from ..util import get_data
 
@@ -42,3 +68,190 @@ class TestAnnotationLoading(unittest.TestCase):
     def test_load_json(self):
         result = load_annotations(self.json, warn=print)
         self.assertEqual(12, len(result.keys()))
+
+
+class TestReferenceGenomeLoading(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.fasta = os.path.join(self.temp_dir, 'mock_reference_genome.fa')
+        shutil.copyfile(get_data('mock_reference_genome.fa'), self.fasta)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_indexed_only_when_fai_exists(self):
+        self.assertIsInstance(load_reference_genome(self.fasta), dict)
+        pysam.faidx(self.fasta)
+        self.assertIsInstance(load_reference_genome(self.fasta), IndexedReferenceGenome)
+        self.assertIsInstance(load_reference_genome(self.fasta, indexed=False), dict)
+
+    def test_indexed_equivalent_to_in_memory(self):
+        expected = load_reference_genome(self.fasta)
+        pysam.faidx(self.fasta)
+        result = load_reference_genome(self.fasta)
+        self.assertEqual(sorted(expected.keys()), sorted(result.keys()))
+        for chrom in ['fake', 'chrfake', 'reference10', 'chrreference10']:
+            seq = str(expected[chrom].seq)
+            self.assertEqual(len(seq), len(result[chrom].seq))
+            self.assertEqual(seq, str(result[chrom].seq))
+            for start, end in [(0, 10), (1000, 1200), (len(seq) - 5, len(seq) + 5), (-20, -2)]:
+                self.assertEqual(seq[start:end], result[chrom].seq[start:end])
+            self.assertEqual(seq[500:100:-3], result[chrom].seq[500:100:-3])
+            self.assertEqual(seq[4095:4100], ''.join(result[chrom][i] for i in range(4095, 4100)))
+            self.assertEqual(seq[-1], result[chrom].seq[-1])
+        with self.assertRaises(IndexError):
+            result['fake'].seq[len(expected['fake'].seq)]
+
+    def test_indexed_upper_case(self):
+        with open(self.fasta, 'w') as fh:
+            fh.write('>1\nacgtNNacgt\n')
+        pysam.faidx(self.fasta)
+        result = load_reference_genome(self.fasta)
+        self.assertEqual('ACGTNNACGT', str(result['chr1'].seq))
+        self.assertEqual('GTNNA', result['1'].seq[2:7])
+        self.assertEqual('G', result['1'].seq[2])
+
+    def test_indexed_duplicate_alias(self):
+        with open(self.fasta, 'w') as fh:
+            fh.write('>1\nACGT\n>chr1\nACGT\n')
+        pysam.faidx(self.fasta)
+        with self.assertRaises(KeyError):
+            load_reference_genome(self.fasta)
+
+    def test_indexed_pickle(self):
+        pysam.faidx(self.fasta)
+        result = load_reference_genome(self.fasta)
+        expected = result['fake'].seq[100:150]
+        self.assertEqual(expected, pickle.loads(pickle.dumps(result))['fake'].seq[100:150])
+
+
+class TestSharedReferenceFiles(unittest.TestCase):
+    def test_share_reference_genome(self):
+        expected = load_reference_genome(get_data('mock_reference_genome.fa'))
+        result = share_reference_genome(expected)
+        self.assertIsInstance(result, SharedReferenceGenome)
+        self.assertEqual(sorted(expected.keys()), sorted(result.keys()))
+        for chrom in expected:
+            seq = str(expected[chrom].seq)
+            self.assertEqual(seq, str(result[chrom].seq))
+            self.assertEqual(seq[-10:], result[chrom].seq[-10:])
+            self.assertEqual(seq[5], result[chrom].seq[5])
+        # aliases point at the same bytes
+        self.assertEqual(result._offsets['fake'], result._offsets['chrfake'])
+        self.assertIs(result, share_reference_genome(result))
+
+    def test_share_distinct_aliased_records(self):
+        reference_genome = {
+            '1': SeqRecord(Seq('ACGT'), id='1'),
+            'chr1': SeqRecord(Seq('acgt'), id='chr1'),
+        }
+        result = share_reference_genome(reference_genome)
+        self.assertNotEqual(result._offsets['1'], result._offsets['chr1'])
+        self.assertEqual('ACGT', str(result['chr1'].seq))
+
+    def test_share_indexed_reference_genome(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            fasta = os.path.join(temp_dir, 'mock_reference_genome.fa')
+            shutil.copyfile(get_data('mock_reference_genome.fa'), fasta)
+            pysam.faidx(fasta)
+            reference_genome = load_reference_genome(fasta)
+            self.assertIs(reference_genome, share_reference_genome(reference_genome))
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_share_annotations(self):
+        expected = load_annotations(get_data('annotations_subsample.json'), warn=print)
+        result = share_annotations(expected)
+        self.assertIsInstance(result, SharedAnnotations)
+        self.assertEqual(sorted(expected.keys()), sorted(result.keys()))
+        self.assertEqual([], result.get('nonexistent', []))
+        for chrom in expected:
+            self.assertEqual(
+                [(g.name, g.start, g.end) for g in expected[chrom]],
+                [(g.name, g.start, g.end) for g in result[chrom]],
+            )
+            for gene in result[chrom]:
+                for transcript in gene.transcripts:
+                    self.assertIs(gene, transcript.gene)
+            self.assertIs(result[chrom], result[chrom])
+        self.assertIs(result, share_annotations(result))
+
+
+class TestCompiledAnnotations(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.compiled = os.path.join(self.temp_dir, 'annotations.db')
+        self.expected = load_annotations(get_data('annotations_subsample.json'), warn=print)
+        write_compiled_annotations(self.expected, self.compiled)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_compiled(self):
+        self.assertTrue(is_compiled_annotations(self.compiled))
+        self.assertFalse(is_compiled_annotations(get_data('annotations_subsample.json')))
+        result = load_annotations(self.compiled)
+        self.assertIsInstance(result, SharedAnnotations)
+        self.assertEqual(sorted(self.expected.keys()), sorted(result.keys()))
+        for chrom in self.expected:
+            self.assertEqual(
+                [(g.name, g.start, g.end, len(g.transcripts)) for g in self.expected[chrom]],
+                [(g.name, g.start, g.end, len(g.transcripts)) for g in result[chrom]],
+            )
+
+    def test_load_compiled_with_other_files(self):
+        other = load_annotations(get_data('mock_reference_annotations.tsv'))
+        result = load_annotations(self.compiled, get_data('mock_reference_annotations.tsv'))
+        self.assertIsInstance(result, dict)
+        self.assertEqual(len(self.expected['12']), len(result['12']))
+        self.assertEqual(len(other['fake']), len(result['fake']))
+
+    def test_wrong_format_version(self):
+        with open(self.compiled, 'r+b') as fh:
+            fh.seek(8)
+            fh.write(struct.pack('<I', COMPILED_ANNOTATIONS_VERSION + 1))
+        with self.assertRaises(ValueError):
+            load_compiled_annotations(self.compiled)
+
+    def test_not_compiled(self):
+        with self.assertRaises(ValueError):
+            load_compiled_annotations(get_data('annotations_subsample.json'))
+
+
+class TestReferenceAnnotationsIndex(unittest.TestCase):
+    def setUp(self):
+        self.annotations = load_annotations(get_data('annotations_subsample.json'), warn=print)
+        self.plain = {chrom: list(genes) for chrom, genes in self.annotations.items()}
+
+    def test_indexed_overlapping_transcripts(self):
+        self.assertIsInstance(self.annotations, ReferenceAnnotations)
+        for chrom, genes in self.plain.items():
+            for gene in genes:
+                for pos in [
+                    gene.start - 1,
+                    gene.start,
+                    (gene.start + gene.end) // 2,
+                    gene.end,
+                    gene.end + 1,
+                ]:
+                    breakpoint = Breakpoint(chrom, pos, pos + 10)
+                    self.assertEqual(
+                        overlapping_transcripts(self.plain, breakpoint),
+                        overlapping_transcripts(self.annotations, breakpoint),
+                    )
+        self.assertEqual(set(), overlapping_transcripts(self.annotations, Breakpoint('X', 1)))
+
+    def test_index_rebuilt_when_genes_added(self):
+        self.assertEqual([], self.annotations.gene_index('X').overlapping(Interval(1, 100)))
+        gene = Gene('X', 10, 20)
+        self.annotations.setdefault('X', []).append(gene)
+        self.assertEqual([gene], self.annotations.gene_index('X').overlapping(Interval(1, 100)))
+
+    def test_shared_annotations_index(self):
+        shared = share_annotations(self.annotations)
+        for chrom, genes in self.plain.items():
+            self.assertEqual(len(genes), len(shared.gene_index(chrom)))
+            self.assertEqual(
+                sum([len(g.transcripts) for g in genes]), len(shared.transcript_index(chrom))
+            )
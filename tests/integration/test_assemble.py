@@ -640,3 +640,19 @@ class TestAssemble(unittest.TestCase):
         for c in contigs:
             print(c.seq, c.remap_score())
         self.assertTrue(len(contigs))
+
+    @timeout_decorator.timeout(120)
+    @unittest.skipIf(
+        not RUN_FULL,
+        'slower tests will not be run unless the environment variable RUN_FULL is given',
+    )
+    def test_kmer_engine_long_filter(self):
+        contigs = {}
+        for engine in ['networkx', 'kmer']:
+            contigs[engine] = assemble(
+                self.long_filter_seq, 111, 3, 8, 0.1, 0.1, log=LOG, assembly_engine=engine
+            )
+        self.assertEqual(
+            sorted([(c.seq, c.score, c.remap_score()) for c in contigs['networkx']]),
+            sorted([(c.seq, c.score, c.remap_score()) for c in contigs['kmer']]),
+        )
@@ -4,17 +4,26 @@ import unittest
 from unittest import mock
 import warnings
 
+import pysam
+
 from mavis.annotate.file_io import load_reference_genes, load_reference_genome
 from mavis.bam import cigar as _cigar
 from mavis.bam import read as _read
-from mavis.bam.cache import BamCache
+from mavis.bam.cache import BamCache, PrefetchRegion
 from mavis.bam.read import (
+    CompactRead,
+    SamRead,
     breakpoint_pos,
     orientation_supports_type,
     read_pair_type,
     sequenced_strand,
 )
-from mavis.bam.stats import compute_genome_bam_stats, compute_transcriptome_bam_stats, Histogram
+from mavis.bam.stats import (
+    compute_genome_bam_stats,
+    compute_read_density,
+    compute_transcriptome_bam_stats,
+    Histogram,
+)
 from mavis.constants import (
     CIGAR,
     DNA_ALPHABET,
@@ -128,7 +137,7 @@ class TestBamCache(unittest.TestCase):
         s = b.fetch_from_bins('reference3', 1382, 1383, read_limit=1, sample_bins=1)
         self.assertEqual(1, len(s))
         r = list(s)[0]
-        self.assertEqual('HISEQX1_11:4:2122:14275:37717:split', r.qname)
+        self.assertEqual('HISEQX1_11:4:2122:14275:37717:split', r.query_name)
         b.close()
 
     def test_get_mate(self):
@@ -137,11 +146,272 @@ class TestBamCache(unittest.TestCase):
         s = b.fetch_from_bins('reference3', 1382, 1383, read_limit=1, sample_bins=1)
         self.assertEqual(1, len(s))
         r = list(s)[0]
-        self.assertEqual('HISEQX1_11:4:2122:14275:37717:split', r.qname)
+        self.assertEqual('HISEQX1_11:4:2122:14275:37717:split', r.query_name)
         o = b.get_mate(r, allow_file_access=True)
         self.assertEqual(1, len(o))
         self.assertEqual('HISEQX1_11:4:2122:14275:37717:split', o[0].qname)
 
+    def test_get_mate_counters(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        s = b.fetch_from_bins('reference3', 1382, 1383, read_limit=1, sample_bins=1)
+        r = list(s)[0]
+        with self.assertRaises(KeyError):
+            b.get_mate(r)
+        self.assertEqual((0, 1), (b.hits, b.misses))
+        b.get_mate(r, allow_file_access=True)
+        b.get_mate(r)
+        self.assertEqual((1, 2), (b.hits, b.misses))
+        b.close()
+
+    def test_get_mates_from_cache(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        reads = b.fetch('reference3', 1, 3711, limit=None)
+        paired = [r for r in reads if not r.mate_is_unmapped and not r.is_unmapped]
+        mates = b.get_mates(paired)
+        for read in paired:
+            try:
+                expected = sorted([m.key() for m in b.get_mate(read)])
+            except KeyError:
+                self.assertNotIn(read, mates)
+            else:
+                self.assertEqual(expected, sorted([m.key() for m in mates[read]]))
+        b.close()
+
+    def test_get_mates_file_access(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        s = b.fetch_from_bins('reference3', 1382, 1383, read_limit=1, sample_bins=1)
+        r = list(s)[0]
+        self.assertEqual({}, b.get_mates([r]))
+        mates = b.get_mates([r], allow_file_access=True)
+        self.assertEqual(1, len(mates[r]))
+        mate = mates[r][0]
+        self.assertEqual(r.query_name, mate.query_name)
+        self.assertNotEqual(r.is_read1, mate.is_read1)
+        self.assertEqual(r.next_reference_start, mate.reference_start)
+        self.assertEqual([mate.key()], [m.key() for m in b.get_mate(r)])  # now cached
+        b.close()
+
+    def test_get_mates_file_access_counters(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        s = b.fetch_from_bins('reference3', 1382, 1383, read_limit=1, sample_bins=1)
+        r = list(s)[0]
+        b.get_mates([r], allow_file_access=True)
+        self.assertEqual((0, 1), (b.hits, b.misses))
+        b.get_mates([r], allow_file_access=True)
+        self.assertEqual((1, 1), (b.hits, b.misses))
+        b.close()
+
+    def test_fill_read_data(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        reads = [r.to_read() for r in b.fetch('reference3', 1, 3711, limit=None)]
+        reads[0].set_tag('XX', 1, value_type='i')
+        b.fill_read_data(reads)
+        original = {SamRead.key(r): r for r in b.fh.fetch('reference3', 1, 3711)}
+        for read in reads:
+            expected = original[read.key()]
+            self.assertEqual(list(expected.query_qualities), list(read.query_qualities))
+            self.assertEqual(expected.get_tags(), read.get_tags()[: len(expected.get_tags())])
+        self.assertEqual(1, reads[0].get_tag('XX'))
+        b.close()
+
+    def test_mate_index_updated_on_eviction(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'), max_cache_bytes=5000)
+        b.fetch('reference3', 1, 3711, limit=None)
+        self.assertGreater(b.evictions, 0)
+        indexed = [r for reads in b.mate_index.values() for r in reads]
+        self.assertEqual(b.cache_size, len(indexed))
+        self.assertEqual({r.query_name for r in indexed}, set(b.cache.keys()))
+        b.close()
+
+    def test_caches_compact_reads(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        s = b.fetch_from_bins('reference3', 1382, 1383, read_limit=1, sample_bins=1, cache=True)
+        r = list(s)[0]
+        self.assertIsInstance(r, CompactRead)
+        for cached in b.cache[r.query_name]:
+            self.assertIsInstance(cached, CompactRead)
+        b.close()
+
+
+class TestCompactRead(unittest.TestCase):
+    def setUp(self):
+        self.fh = pysam.AlignmentFile(get_data('mini_mock_reads_for_events.sorted.bam'), 'rb')
+        self.reads = list(self.fh.fetch('reference3'))
+
+    def tearDown(self):
+        self.fh.close()
+
+    def test_flags(self):
+        for read in self.reads:
+            compact = CompactRead.from_read(read)
+            for attr in [
+                'is_paired',
+                'is_proper_pair',
+                'is_unmapped',
+                'mate_is_unmapped',
+                'is_reverse',
+                'mate_is_reverse',
+                'is_read1',
+                'is_read2',
+                'is_secondary',
+                'is_supplementary',
+            ]:
+                self.assertEqual(getattr(read, attr), getattr(compact, attr), attr)
+
+    def test_approximate_size(self):
+        read = self.reads[0]
+        compact = CompactRead.from_read(read)
+        self.assertGreater(compact.approximate_size(), 3 * len(read.query_sequence))
+        shorter = CompactRead(
+            query_name=read.query_name, cigar=read.cigar, query_sequence=read.query_sequence[:10]
+        )
+        self.assertLess(shorter.approximate_size(), compact.approximate_size())
+
+    def test_to_read(self):
+        for read in self.reads:
+            full = CompactRead.from_read(read).to_read()
+            self.assertEqual(SamRead.copy(read), full)
+            self.assertEqual(read.query_sequence, full.query_sequence)
+            self.assertEqual(read.cigar, full.cigar)
+            self.assertEqual(read.flag, full.flag)
+            self.assertEqual(read.mapping_quality, full.mapping_quality)
+            self.assertEqual(read.template_length, full.template_length)
+            self.assertEqual(read.next_reference_start, full.next_reference_start)
+            self.assertEqual(read.reference_name, full.reference_name)
+            self.assertIsNone(full.query_qualities)
+
+    def test_to_read_is_new_read(self):
+        compact = CompactRead.from_read(self.reads[0])
+        full = compact.to_read()
+        full.reference_start += 10
+        full.set_tag('XX', 1, value_type='i')
+        self.assertIsNot(full, compact.to_read())
+        self.assertEqual(self.reads[0].reference_start, compact.to_read().reference_start)
+        self.assertFalse(compact.to_read().has_tag('XX'))
+
+    def test_hash_matches_samread(self):
+        read = SamRead.copy(self.reads[0])
+        compact = CompactRead.from_read(self.reads[0])
+        self.assertEqual(compact, read)
+        self.assertIn(read, {compact})
+
+
+class TestBamCacheEviction(unittest.TestCase):
+    def cached_bytes(self, bam_cache):
+        return sum([r.approximate_size() for g in bam_cache.cache.values() for r in g])
+
+    def test_unlimited_by_default(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        b.fetch('reference3', 1, 3711, limit=None)
+        self.assertEqual(sum([len(g) for g in b.cache.values()]), b.cache_size)
+        self.assertEqual(self.cached_bytes(b), b.cache_bytes)
+        self.assertEqual(0, b.evictions)
+        b.close()
+
+    def test_evicts_least_recently_used(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'), max_cache_bytes=20000)
+        reads = b.fetch('reference3', 1, 3711, limit=None, cache_if=lambda x: not x.is_unmapped)
+        self.assertGreater(sum([CompactRead.from_read(r).approximate_size() for r in reads]), 20000)
+        self.assertLessEqual(b.cache_bytes, 20000)
+        self.assertEqual(self.cached_bytes(b), b.cache_bytes)
+        self.assertEqual(sum([len(g) for g in b.cache.values()]), b.cache_size)
+        self.assertEqual(len(reads), b.cache_size + b.evictions)
+        last = max(reads, key=lambda r: r.reference_start)
+        self.assertIn(last.query_name, b.cache)
+        b.close()
+
+    def test_keeps_reads_in_pending_windows(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'), max_cache_bytes=10000)
+        b.plan_prefetch([('reference3', 1000, 1100, None)])
+        first = b.fetch('reference3', 1000, 1100, limit=None)
+        self.assertGreater(len(first), 0)
+        self.assertLess(len(first), 9)
+        b.fetch('reference3', 2000, 3711, limit=None)
+        self.assertGreater(b.evictions, 0)
+        for read in first:
+            self.assertIn(read.query_name, b.cache)
+        b.close()
+
+
+class TestBamCachePrefetch(unittest.TestCase):
+    def setUp(self):
+        self.windows = [
+            ('reference3', 1200, 1500, 100),
+            ('reference3', 1400, 1800, 100),
+            ('reference3', 1801, 2000, 100),
+            ('reference10', 1000, 1500, 100),
+        ]
+
+    def fetch_keys(self, cache, chrom, start, end, read_limit):
+        return sorted(
+            [
+                r.key()
+                for r in cache.fetch_from_bins(
+                    chrom, start, end, read_limit=read_limit, sample_bins=3, min_bin_size=10
+                )
+            ]
+        )
+
+    def test_plan_merges_overlapping_and_adjacent_windows(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        b.plan_prefetch(self.windows)
+        self.assertEqual(
+            [(1200, 2000)], [(r.start, r.end) for r in b.prefetch_regions['reference3']]
+        )
+        self.assertEqual(3, b.prefetch_regions['reference3'][0].pending)
+        self.assertEqual(1, len(b.prefetch_regions['reference10']))
+        b.close()
+
+    def test_plan_max_region_size(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        b.plan_prefetch(self.windows, max_region_size=700)
+        self.assertEqual(
+            [(1200, 1800), (1801, 2000)],
+            [(r.start, r.end) for r in b.prefetch_regions['reference3']],
+        )
+        b.close()
+
+    def test_fetch_matches_direct_fetch(self):
+        direct = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        prefetched = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        prefetched.plan_prefetch(self.windows)
+        with mock.patch.object(
+            PrefetchRegion, 'load', autospec=True, side_effect=PrefetchRegion.load
+        ) as load_patcher:
+            for window in self.windows:
+                self.assertEqual(
+                    self.fetch_keys(direct, *window), self.fetch_keys(prefetched, *window)
+                )
+            self.assertEqual(2, load_patcher.call_count)  # once per merged region
+        direct.close()
+        prefetched.close()
+
+    def test_dense_region_falls_back_to_direct_fetch(self):
+        direct = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        prefetched = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        prefetched.plan_prefetch([('reference3', 1, 5000, 1)])
+        self.assertEqual(
+            self.fetch_keys(direct, 'reference3', 1, 5000, 1),
+            self.fetch_keys(prefetched, 'reference3', 1, 5000, 1),
+        )
+        self.assertTrue(prefetched.prefetch_regions['reference3'][0].dense)
+        direct.close()
+        prefetched.close()
+
+    def test_release_prefetch(self):
+        b = BamCache(get_data('mini_mock_reads_for_events.sorted.bam'))
+        b.plan_prefetch(self.windows)
+        self.fetch_keys(b, *self.windows[0])
+        region = b.prefetch_regions['reference3'][0]
+        self.assertTrue(region.loaded)
+        b.release_prefetch(self.windows[:2])
+        self.assertTrue(region.loaded)
+        b.release_prefetch(self.windows[2:])
+        self.assertFalse(region.loaded)
+        self.assertEqual({}, b.prefetch_regions)
+        self.assertEqual({}, b.prefetch_windows)
+        b.close()
+
 
 class TestModule(unittest.TestCase):
     """
@@ -243,6 +513,44 @@ class TestNsbAlign(unittest.TestCase):
         print(alignments)
         self.assertEqual(0, len(alignments))
 
+    def test_reference_seed_positions(self):
+        ref = _read.NsbReference('AAAAACGAAAA')
+        seeds = ref.seed_positions(2)
+        self.assertEqual([0, 2, 7, 9], seeds['AA'])  # non-overlapping, same as re.finditer
+        self.assertEqual([4], seeds['AC'])
+        self.assertIs(seeds, ref.seed_positions(2))
+
+    def test_prepared_reference(self):
+        ref = 'TAAGCTTCTTCCTTTTTCTATGCCACCTACATAGGCATTTTGCATGGTCAGATTGGAATTTACATAATGCATACATGCAAAGAAATATATAGAAGCCAGATATATAAGGTAGTACATTGGCAGGCTTCATATATATAGACTCCCCCATATTGTCTATATGCTAAAAAAGTATTTTAAATCCTTAAATTTTATTTTTGTTCTCTGCATTTGAAATCTTTATCAACTAGG'
+        seq = 'GCTAAAAAAGTATTTTAAATCCTTAAATGTTATTTTTGTTCTC'
+        prepared = _read.NsbReference(ref)
+        for min_consecutive_match in [1, 6]:
+            exp = _read.nsb_align(ref, seq, min_consecutive_match=min_consecutive_match)
+            alignments = _read.nsb_align(prepared, seq, min_consecutive_match=min_consecutive_match)
+            self.assertEqual(1, len(alignments))
+            self.assertEqual(exp[0].reference_start, alignments[0].reference_start)
+            self.assertEqual(exp[0].cigar, alignments[0].cigar)
+        self.assertEqual(159, alignments[0].reference_start)
+        self.assertEqual(
+            [(CIGAR.EQ, 28), (CIGAR.X, 1), (CIGAR.EQ, 14)], _cigar.join(alignments[0].cigar)
+        )
+
+    def test_ambiguous_and_end_mismatches(self):
+        alignments = _read.nsb_align('GGACGTNCGTTT', 'TCGTRCGG', min_overlap_percent=0.5)
+        self.assertEqual(1, len(alignments))
+        self.assertEqual(3, alignments[0].reference_start)
+        self.assertEqual([(CIGAR.S, 1), (CIGAR.EQ, 6), (CIGAR.S, 1)], alignments[0].cigar)
+
+    def test_custom_scoring_function(self):
+        ref = 'ACGTACGTTTACGTACGA'
+        seq = 'ACGTACG'
+        alignments = _read.nsb_align(ref, seq)
+        self.assertEqual([0, 10], [a.reference_start for a in alignments])
+        alignments = _read.nsb_align(
+            ref, seq, scoring_function=lambda read: -1 * read.reference_start
+        )
+        self.assertEqual([0], [a.reference_start for a in alignments])
+
 
 class TestReadPairStrand(unittest.TestCase):
     def setUp(self):
@@ -478,6 +786,16 @@ class TestBamStats(unittest.TestCase):
         self.assertTrue(stats.stdev_fragment_size < 50)
         bamfh.close()
 
+    def test_read_density(self):
+        bamfh = BamCache(get_data('mock_reads_for_events.sorted.bam'))
+        density = compute_read_density(bamfh)
+        for stat in bamfh.fh.get_index_statistics():
+            self.assertAlmostEqual(
+                stat.mapped / bamfh.fh.get_reference_length(stat.contig), density[stat.contig]
+            )
+        self.assertEqual(density['reference3'], density['chrreference3'])
+        bamfh.close()
+
 
 class TestMapRefRangeToQueryRange(unittest.TestCase):
     def setUp(self):
@@ -1,11 +1,13 @@
+import os
 import shutil
+import tempfile
 import unittest
 
 from Bio import SeqIO
 from mavis.align import query_coverage_interval
 from mavis.annotate.file_io import load_reference_genome
 from mavis.bam.cache import BamCache
-from mavis.blat import Blat
+from mavis.blat import Blat, process_blat_output
 from mavis.constants import CIGAR, reverse_complement
 from mavis.interval import Interval
 import mavis.bam.cigar as _cigar
@@ -66,6 +68,63 @@ class TestBlat(unittest.TestCase):
         ]
         self.assertEqual(expect_pslx_header, header)
 
+    def test_iter_pslx(self):
+        mapping = {}
+        for record in SeqIO.parse(get_data('blat_input.fa'), 'fasta'):
+            mapping[record.id] = record.seq
+        row = next(Blat.iter_pslx(get_data('blat_output.pslx'), mapping))
+        self.assertEqual('seq1', row['qname'])
+        self.assertEqual('Y', row['tname'])
+        self.assertEqual(3432307, row['tstart'])
+        self.assertEqual([20], row['block_sizes'])
+        self.assertEqual([93], row['qstarts'])
+        self.assertEqual(['AATACCAAATACATGATATA'], row['qseqs'])
+        self.assertEqual(20, row['score'])
+        self.assertEqual(0, row['_index'])
+
+    def test_iter_pslx_bad_strand(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'bad.pslx')
+            with open(filename, 'w') as fh:
+                fh.write(
+                    '20\t0\t0\t0\t0\t0\t0\t0\t?\tseq1\t20\t0\t20\tchrY\t100\t0\t20\t1\t20,\t0,\t0,\t'
+                    'aataccaaatacatgatata,\taataccaaatacatgatata,\n'
+                )
+            with self.assertRaises(ValueError):
+                list(Blat.iter_pslx(filename, {'seq1': 'AATACCAAATACATGATATA'}))
+
+    def test_process_blat_output_limit(self):
+        mapping = {}
+        for record in SeqIO.parse(get_data('blat_input.fa'), 'fasta'):
+            mapping[record.id] = str(record.seq)
+        chrom_to_tid = {str(i): i for i in range(1, 23)}
+        chrom_to_tid.update({'X': 23, 'Y': 24})
+        cache = BamCache(MockBamFileHandle(chrom_to_tid))
+
+        def summary(reads):
+            return [
+                (r.reference_start, r.cigar, r.mapping_quality, r.alignment_rank, r.get_tags())
+                for r in reads
+            ]
+
+        all_reads = process_blat_output(
+            cache,
+            mapping,
+            None,
+            aligner_output_file=get_data('blat_output.pslx'),
+            blat_limit_top_aln=100000,
+        )
+        top_reads = process_blat_output(
+            cache,
+            mapping,
+            None,
+            aligner_output_file=get_data('blat_output.pslx'),
+            blat_limit_top_aln=5,
+        )
+        self.assertEqual(set(all_reads.keys()), set(top_reads.keys()))
+        for query_seq, reads in all_reads.items():
+            self.assertEqual(summary(reads[:5]), summary(top_reads[query_seq]))
+
     def test_pslx_row_to_pysam_single_block(self):
         pslx_row = {
             'score': 20,
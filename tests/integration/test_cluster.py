@@ -1,10 +1,20 @@
+import os
+import shutil
+import tempfile
 import unittest
 
 from mavis.breakpoint import Breakpoint, BreakpointPair
-from mavis.cluster.cluster import merge_breakpoint_pairs, merge_integer_intervals
+from mavis.cluster.cluster import (
+    _union_edges,
+    all_pair_group_keys,
+    merge_breakpoint_pairs,
+    merge_by_union,
+    merge_integer_intervals,
+)
+from mavis.cluster.main import estimate_validation_cost, split_clusters
 from mavis.constants import COLUMNS, PROTOCOL, SVTYPE
 from mavis.interval import Interval
-from mavis.util import read_bpp_from_input_file
+from mavis.util import read_bpp_from_input_file, read_inputs
 
 
 from ..util import get_data
@@ -152,6 +162,89 @@ class TestMergeBreakpointPairs(unittest.TestCase):
         mapping = merge_breakpoint_pairs(bpps, 100, 25, verbose=True)
         self.assertEqual(2, len(mapping))
 
+    def test_wide_pairs_merge_with_nearest_node(self):
+        pairs = [
+            BreakpointPair(
+                Breakpoint('1', 1000, 1100, orient='L'),
+                Breakpoint('1', 5000, 5100, orient='R'),
+                opposing_strands=False,
+            ),
+            BreakpointPair(
+                Breakpoint('1', 1020, 1150, orient='L'),
+                Breakpoint('1', 5010, 5150, orient='R'),
+                opposing_strands=False,
+            ),
+            BreakpointPair(
+                Breakpoint('1', 1300, 1400, orient='L'),
+                Breakpoint('1', 5000, 5100, orient='R'),
+                opposing_strands=False,
+            ),
+            BreakpointPair(
+                Breakpoint('1', 90000, 90100, orient='L'),
+                Breakpoint('1', 95000, 95100, orient='R'),
+                opposing_strands=False,
+            ),
+        ]
+        mapping = merge_breakpoint_pairs(pairs, 200, 25)
+        self.assertEqual(3, len(mapping))
+        tags = sorted(sorted(p.data['tag'] for p in inputs) for inputs in mapping.values())
+        self.assertEqual([[0, 1], [2], [3]], tags)
+
+    def test_parallel_groups_match_single_process(self):
+        pairs = []
+        for chrom in ['1', '2', '3']:
+            for start, size in [(1000, 0), (1050, 5), (1100, 100), (1200, 300), (5000, 0)]:
+                for orient1, orient2 in [('L', 'R'), ('R', 'L')]:
+                    pairs.append(
+                        BreakpointPair(
+                            Breakpoint(chrom, start, start + size, orient=orient1),
+                            Breakpoint(chrom, start + 2000, start + 2000 + size, orient=orient2),
+                            opposing_strands=False,
+                        )
+                    )
+        expected = merge_breakpoint_pairs(pairs, 200, 25)
+        mapping = merge_breakpoint_pairs(pairs, 200, 25, processes=2)
+        self.assertEqual(list(expected), list(mapping))
+        for node, inputs in expected.items():
+            self.assertEqual(
+                [p.data['tag'] for p in inputs], [p.data['tag'] for p in mapping[node]]
+            )
+
+
+class TestMergeByUnion(unittest.TestCase):
+    def test_union_edges_matches_all_comparisons(self):
+        starts1 = [100, 400, 150, 1000, 120, 390, 5000]
+        ends1 = [110, 400, 160, 1000, 300, 395, 5000]
+        starts2 = [900, 1200, 950, 1500, 900, 1100, 900]
+        ends2 = [900, 1210, 950, 1500, 920, 1100, 900]
+        expected = set()
+        for i in range(len(starts1)):
+            for j in range(i + 1, len(starts1)):
+                distance = abs(
+                    Interval.dist(Interval(starts1[i], ends1[i]), Interval(starts1[j], ends1[j]))
+                ) + abs(
+                    Interval.dist(Interval(starts2[i], ends2[i]), Interval(starts2[j], ends2[j]))
+                )
+                if distance <= 200:
+                    expected.add((i, j))
+        firsts, seconds = _union_edges(starts1, ends1, starts2, ends2, 200)
+        edges = {tuple(sorted(edge)) for edge in zip(firsts.tolist(), seconds.tolist())}
+        self.assertEqual(expected, edges)
+
+    def test_chained_pairs_are_merged(self):
+        pairs = [
+            BreakpointPair(
+                Breakpoint('1', start, orient='L'),
+                Breakpoint('1', start + 5000, orient='R'),
+                opposing_strands=False,
+            )
+            for start in [1000, 1080, 1160, 1240, 3000]
+        ]
+        mapping = merge_by_union(pairs, all_pair_group_keys(pairs[0])[0], cluster_radius=200)
+        self.assertEqual(2, len(mapping))
+        self.assertEqual([4, 1], [len(inputs) for inputs in mapping.values()])
+        self.assertEqual(pairs[:4], sorted(list(mapping.values())[0], key=lambda p: p.break1.start))
+
 
 class TestMergeIntervals(unittest.TestCase):
     def test_merge_even_length(self):
@@ -174,5 +267,73 @@ class TestMergeIntervals(unittest.TestCase):
         self.assertEqual(i1, result)
 
 
+class TestSplitClusters(unittest.TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def pair(self, chrom, start, end):
+        return BreakpointPair(
+            Breakpoint(chrom, start, orient='L'),
+            Breakpoint(chrom, end, orient='R'),
+            opposing_strands=False,
+            protocol=PROTOCOL.GENOME,
+        )
+
+    def test_estimate_validation_cost(self):
+        args = dict(read_length=100, median_fragment_size=300, stdev_fragment_size=50)
+        small = estimate_validation_cost(self.pair('1', 1000, 1100), **args)
+        large = estimate_validation_cost(self.pair('1', 1000, 50000), **args)
+        self.assertLess(small, large)
+        density = {'1': 0.1, '2': 100}
+        self.assertLess(
+            estimate_validation_cost(self.pair('1', 1000, 50000), read_density=density, **args),
+            estimate_validation_cost(self.pair('2', 1000, 50000), read_density=density, **args),
+        )
+        self.assertEqual(
+            3000 * 2 * 2,  # both windows reach the fetch limit, deletion or insertion
+            estimate_validation_cost(
+                self.pair('2', 1000, 50000), read_density=density, fetch_reads_limit=3000, **args
+            ),
+        )
+
+    def test_split_by_cost(self):
+        clusters = [self.pair('1', start, start + 1000) for start in range(1000, 10000, 1000)]
+        costs = {clusters[0]: 80, clusters[-1]: 40}
+        filenames = split_clusters(
+            clusters,
+            self.output,
+            'batch',
+            min_clusters_per_file=1,
+            max_files=3,
+            write_bed_summary=False,
+            cost=lambda c: costs.get(c, 10),
+        )
+        self.assertEqual(3, len(filenames))
+        files = []
+        for filename in filenames:
+            self.assertTrue(os.path.exists(filename))
+            files.append([p.break1.start for p in read_inputs([filename], expand_orient=True)])
+        self.assertEqual([[1000], [6000, 8000, 9000], [2000, 3000, 4000, 5000, 7000]], files)
+
+    def test_split_round_robin_without_cost(self):
+        clusters = [self.pair('1', start, start + 1000) for start in range(1000, 7000, 1000)]
+        filenames = split_clusters(
+            clusters,
+            self.output,
+            'batch',
+            min_clusters_per_file=1,
+            max_files=2,
+            write_bed_summary=False,
+        )
+        files = [
+            [p.break1.start for p in read_inputs([filename], expand_orient=True)]
+            for filename in filenames
+        ]
+        self.assertEqual([[1000, 3000, 5000], [2000, 4000, 6000]], files)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -133,3 +133,44 @@ class TestPipeline(unittest.TestCase):
         self.assertTrue(os.path.exists(drawings_dir))
         self.assertLessEqual(1, len(glob.glob(os.path.join(drawings_dir, '*.svg'))))
         self.assertLessEqual(1, len(glob.glob(os.path.join(drawings_dir, '*.legend.json'))))
+
+
+class TestClusterCost(unittest.TestCase):
+    def setUp(self):
+        self.output = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def test_bam_without_index(self):
+        bam_file = os.path.join(self.output, 'unindexed.bam')
+        shutil.copyfile(get_data('mock_reads_for_events.sorted.bam'), bam_file)
+        with mock.patch('mavis.cluster.main.LOG') as log:
+            cluster_files = cluster_main(
+                [get_data('mock_sv_events.tsv')],
+                self.output,
+                False,
+                'mock-A36971',
+                PROTOCOL.GENOME,
+                DISEASE_STATUS.DISEASED,
+                limit_to_chr=[None],
+                masking=masking,
+                annotations=None,
+                cluster_clique_size=15,
+                cluster_radius=20,
+                min_clusters_per_file=5,
+                max_files=2,
+                bam_file=bam_file,
+                read_length=150,
+                median_fragment_size=427,
+                stdev_fragment_size=106,
+            )
+        self.assertEqual(2, len(cluster_files))
+        self.assertTrue(
+            any(
+                [
+                    call[0][0].startswith('warning: could not read the index')
+                    for call in log.call_args_list
+                ]
+            )
+        )
@@ -30,6 +30,7 @@ def setUpModule():
     global READS
     READS = {}
     for read in BAM_CACHE.fetch('reference3', 1, 8000):
+        read = read.to_read()
         if read.qname not in READS:
             READS[read.qname] = [None, None]
         if read.is_supplementary:
@@ -36,6 +36,7 @@ def setUpModule():
     global READS
     READS = {}
     for read in BAM_CACHE.fetch('reference3', 1, 8000):
+        read = read.to_read()
         if read.qname not in READS:
             READS[read.qname] = [None, None]
         if read.is_supplementary:
@@ -181,6 +182,18 @@ class TestEventCall(unittest.TestCase):
     def test_split_read_support_empty(self):
         self.assertEqual(0, len(self.ev.break1_split_reads) + len(self.ev.break2_split_reads))
 
+    def test_flatten_columns(self):
+        event = call.EventCall(
+            Breakpoint('reference3', 1114, orient=ORIENT.RIGHT),
+            Breakpoint('reference3', 2187, orient=ORIENT.RIGHT),
+            source_evidence=self.ev1,
+            event_type=SVTYPE.INV,
+            call_method=CALL_METHOD.INPUT,
+        )
+        event.compatible_type = SVTYPE.DUP
+        columns = set(event.flatten().keys()) - set(self.ev1.flatten().keys())
+        self.assertEqual(set(), columns - set(call.EventCall.FLATTEN_COLUMNS))
+
     def test_call_by_split_delins_del_only(self):
         raise unittest.SkipTest('TODO')
 
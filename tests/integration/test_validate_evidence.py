@@ -3,13 +3,13 @@ import unittest
 
 from mavis.annotate.genomic import Gene, Transcript, PreTranscript
 from mavis.bam.cache import BamCache
-from mavis.bam.read import SamRead
+from mavis.bam.read import CompactRead, read_pair_type, SamRead
 from mavis.bam import cigar as _cigar
 from mavis.breakpoint import Breakpoint, BreakpointPair
-from mavis.constants import CIGAR, ORIENT, STRAND
+from mavis.constants import CIGAR, ORIENT, PYSAM_READ_FLAGS, STRAND
 from mavis.interval import Interval
 from mavis.validate.constants import DEFAULTS
-from mavis.validate.base import Evidence
+from mavis.validate.base import Evidence, EvidenceReadClassifier
 from mavis.validate.evidence import GenomeEvidence, TranscriptomeEvidence
 
 from . import mock_read_pair, MockBamFileHandle, MockRead, MockObject
@@ -554,6 +554,78 @@ class TestGenomeEvidenceWindow(unittest.TestCase):
         self.assertEqual(5852, ge.inner_window2.start)
 
 
+class TestEvidenceReadClassifier(unittest.TestCase):
+    def setUp(self):
+        self.evidence = GenomeEvidence(
+            Breakpoint('1', 1500, orient=ORIENT.LEFT),
+            Breakpoint('1', 6001, orient=ORIENT.RIGHT),
+            BamCache(MockBamFileHandle({'1': 0})),
+            None,  # reference_genome
+            opposing_strands=False,
+            read_length=150,
+            stdev_fragment_size=100,
+            median_fragment_size=400,
+            stdev_count_abnormal=3,
+        )
+        self.classifier = EvidenceReadClassifier(self.evidence)
+
+    def read(self, flag, cigar=None, reference_start=1000, next_reference_start=1300, **kwargs):
+        return CompactRead(
+            'name',
+            flag=flag,
+            reference_id=0,
+            reference_start=reference_start,
+            next_reference_id=0,
+            next_reference_start=next_reference_start,
+            mapping_quality=60,
+            cigar=cigar or [(CIGAR.M, 150)],
+            **kwargs
+        )
+
+    def test_pair_type(self):
+        for flag in [0, PYSAM_READ_FLAGS.REVERSE, PYSAM_READ_FLAGS.MATE_REVERSE, 48]:
+            for next_start in [500, 1300]:
+                for next_reference_id in [0, 1]:
+                    read = self.read(flag, next_reference_start=next_start)
+                    read.next_reference_id = next_reference_id
+                    self.assertEqual(read_pair_type(read), self.classifier.pair_type(read))
+
+    def test_unmapped(self):
+        read = self.read(PYSAM_READ_FLAGS.MATE_UNMAPPED)
+        read.mapping_quality = 0
+        self.assertEqual((True, True), self.classifier.classify(read))
+
+    def test_secondary(self):
+        read = self.read(PYSAM_READ_FLAGS.SECONDARY, cigar=[(CIGAR.S, 10), (CIGAR.M, 140)])
+        self.assertEqual((False, False), self.classifier.classify(read))
+
+    def test_softclipped(self):
+        read = self.read(PYSAM_READ_FLAGS.PROPER_PAIR, cigar=[(CIGAR.S, 10), (CIGAR.M, 140)])
+        self.assertEqual((True, True), self.classifier.classify(read))
+        self.assertTrue(self.classifier.cache_if(read))
+        self.assertFalse(self.classifier.filter_if(read))
+
+    def test_improper_pair_supporting_orientation(self):
+        read = self.read(PYSAM_READ_FLAGS.MATE_REVERSE, next_reference_start=5900)
+        self.assertEqual((True, True), self.classifier.classify(read))
+
+    def test_improper_pair_other_orientation(self):
+        read = self.read(0, next_reference_start=5900)
+        self.assertEqual((False, False), self.classifier.classify(read))
+
+    def test_proper_pair_abnormal_fragment_size(self):
+        flag = PYSAM_READ_FLAGS.PROPER_PAIR | PYSAM_READ_FLAGS.MATE_REVERSE
+        self.assertEqual(
+            (True, True), self.classifier.classify(self.read(flag, next_reference_start=2000))
+        )
+        self.assertEqual((False, False), self.classifier.classify(self.read(flag)))
+
+    def test_proper_pair_with_indel(self):
+        flag = PYSAM_READ_FLAGS.PROPER_PAIR | PYSAM_READ_FLAGS.MATE_REVERSE
+        read = self.read(flag, cigar=[(CIGAR.EQ, 50), (CIGAR.D, 10), (CIGAR.EQ, 100)])
+        self.assertEqual((False, True), self.classifier.classify(read))
+
+
 class TestGenomeEvidenceAddReads(unittest.TestCase):
     def setUp(self):
         self.ge = GenomeEvidence(
@@ -3,8 +3,18 @@ import random
 import os
 import unittest
 
-from mavis.assemble import assemble, Contig, DeBruijnGraph, filter_contigs, kmers
-from mavis.constants import DNA_ALPHABET
+from mavis.assemble import (
+    assemble,
+    Contig,
+    DeBruijnGraph,
+    filter_contigs,
+    IntegerKmerEncoding,
+    KmerGraph,
+    kmers,
+    pull_contigs_from_component,
+    remap_sequences,
+)
+from mavis.constants import DNA_ALPHABET, reverse_complement
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
 
@@ -32,6 +42,19 @@ class TestModule(unittest.TestCase):
         self.assertEqual('ABCDEFG', c[0].seq)
         self.assertEqual(5, c[0].remap_score())
 
+    def test_assemble_kmer_engine(self):
+        sequences = ['ABCD', 'BCDE', 'CDEF', 'ABCDE', 'DEFG']
+        c = assemble(
+            sequences, 3, min_edge_trim_weight=1, remap_min_exact_match=1, assembly_engine='kmer'
+        )
+        self.assertEqual(1, len(c))
+        self.assertEqual('ABCDEFG', c[0].seq)
+        self.assertEqual(5, c[0].remap_score())
+
+    def test_assemble_bad_engine(self):
+        with self.assertRaises(KeyError):
+            assemble(['ABCD', 'BCDE'], 3, assembly_engine='other')
+
     def test_assemble_empty_list(self):
         self.assertEqual([], assemble([], 1))
 
@@ -89,6 +112,58 @@ class TestFilterContigs(unittest.TestCase):
         self.assertEqual(1, len(result))
         self.assertEqual(c1.seq, result[0].seq)
 
+    def test_drop_similar_substring(self):
+        c1 = Contig('ttgacgatcgatcgatcgatcgatcgatatagggcatcagcttacg', 2)
+        c2 = Contig('atcgatcgatcgatcgatctatcgatatagggcatca', 1)
+        self.assertEqual([c1], filter_contigs([c2, c1], 0.10))
+
+    def test_drop_similar_substring_reverse_complement(self):
+        c1 = Contig('ttgacgatcgatcgatcgatcgatcgatatagggcatcagcttacg', 2)
+        c2 = Contig(reverse_complement('atcgatcgatcgatcgatctatcgatatagggcatca'), 1)
+        self.assertEqual([c1], filter_contigs([c2, c1], 0.10))
+
+    def test_mismatches_at_threshold(self):
+        # 4 mismatches over 40 bases is a normalized distance of exactly 0.1
+        c1 = Contig('atcgatcgatcgatcgatcgatcgatatagggcatcagca', 2)
+        c2 = Contig('ttcgttcgatcgttcgatcgatcgatatagggcattagca', 1)
+        self.assertEqual(2, len(filter_contigs([c2, c1], 0.10)))
+        self.assertEqual(1, len(filter_contigs([c2, c1], 0.11)))
+
+    def test_min_uniq_too_large_to_seed(self):
+        c1 = Contig('atcgatcgatcgatcg', 2)
+        c2 = Contig('gggggggggggggggg', 1)
+        self.assertEqual([c1], filter_contigs([c2, c1], 1.5))
+        self.assertEqual(2, len(filter_contigs([c2, c1], 0)))
+
+
+class TestRemapSequences(unittest.TestCase):
+    def setUp(self):
+        self.contig1 = Contig('AAGGTTCCAAGTCGATCGTAGCTAGCATGCCGATTACGGATCCTAGG', 1)
+        self.contig2 = Contig('TTTTTTTTTTGTCGATCGTAGCTAGCATGCCGATTACCCCCCCCCC', 1)
+
+    def test_unique_best_alignment(self):
+        seq = 'CCAAGTCGATCGTAGCTAGC'
+        result = remap_sequences([seq], [self.contig1, self.contig2], 10)
+        self.assertEqual([seq], list(result.keys()))
+        ((contig, read, multimap),) = result[seq]
+        self.assertIs(self.contig1, contig)
+        self.assertEqual(1, multimap)
+        self.assertEqual(6, read.reference_start)
+
+    def test_multimap(self):
+        seq = 'GTCGATCGTAGCTAGCATGC'
+        result = remap_sequences([seq], [self.contig1, self.contig2], 10)
+        self.assertEqual(
+            [(self.contig1, 10, 2), (self.contig2, 10, 2)],
+            [(c, r.reference_start, m) for c, r, m in result[seq]],
+        )
+
+    def test_duplicates_aligned_once(self):
+        seq = 'CCAAGTCGATCGTAGCTAGC'
+        result = remap_sequences([seq, 'GGGGGGGGGGGGGGGGGGGG', seq], [self.contig1], 10)
+        self.assertEqual([seq], list(result.keys()))
+        self.assertEqual(1, len(result[seq]))
+
 
 class TestDeBruijnGraph(unittest.TestCase):
     def test_trim_tails_by_freq_forks(self):
@@ -174,6 +249,154 @@ class TestDeBruijnGraph(unittest.TestCase):
         g.trim_noncutting_paths_by_freq(3)
         self.assertEqual(list(range(1, 9)) + path2[1:-1], g.nodes())
 
+    def test_unitig(self):
+        g = DeBruijnGraph()
+        for s, t in [(1, 2), (2, 3), (3, 4), (3, 5), (5, 6), (7, 6)]:
+            g.add_edge(s, t, freq=s)
+        self.assertEqual(([1, 2, 3], 3), g.unitig(1))
+        self.assertEqual(([4], 0), g.unitig(4))
+        self.assertEqual(([5], 0), g.unitig(5))
+
+
+class TestPullContigsFromComponent(unittest.TestCase):
+    def test_bubble(self):
+        g = DeBruijnGraph()
+        for seq in ['ABCDEFG', 'ABCXEFG', 'ABCXEFG']:
+            for kmer in kmers(seq, 3):
+                g.add_edge(kmer[:-1], kmer[1:])
+        scores = pull_contigs_from_component(g, set(g.nodes()), 1, 10)
+        self.assertEqual({'ABCDEFG': 9, 'ABCXEFG': 12}, scores)
+
+    def test_bubble_kmer_graph(self):
+        seqs = ['ABCDEFG', 'ABCXEFG', 'ABCXEFG']
+        encoding = IntegerKmerEncoding(seqs, 2)
+        g = KmerGraph()
+        for seq in seqs:
+            nodes = encoding.windows(seq)
+            for src, tgt in zip(nodes, nodes[1:]):
+                g.add_edge(src, tgt)
+        scores = pull_contigs_from_component(g, set(g.nodes()), 1, 10, encoding=encoding)
+        self.assertEqual({'ABCDEFG': 9, 'ABCXEFG': 12}, scores)
+
+    def test_reduce_paths_does_not_trim_other_components(self):
+        g = DeBruijnGraph()
+        for i, src in enumerate(['s1', 's2', 's3']):
+            g.add_edge(src, 'xx', freq=i + 1)
+        for i, tgt in enumerate(['t1', 't2', 't3']):
+            g.add_edge('xx', tgt, freq=i + 1)
+        g.add_edge('ab', 'bc', freq=1)
+        component = {'s1', 's2', 's3', 'xx', 't1', 't2', 't3'}
+        scores = pull_contigs_from_component(g, component, 1, 4)
+        self.assertEqual({'s2x2': 4, 's2x3': 5, 's3x2': 5, 's3x3': 6}, scores)
+        self.assertEqual(1, g.get_edge_freq('ab', 'bc'))
+        self.assertEqual(9, len(g.nodes()))
+
+
+class TestIntegerKmerEncoding(unittest.TestCase):
+    def test_dna_uses_two_bits(self):
+        encoding = IntegerKmerEncoding(['ACGT', 'TTGA'], 3)
+        self.assertEqual(2, encoding.bits)
+        self.assertEqual([0b000110, 0b011011], encoding.windows('ACGT'))
+
+    def test_decode(self):
+        encoding = IntegerKmerEncoding(['ACGTN'], 3)
+        self.assertEqual(3, encoding.bits)
+        windows = encoding.windows('ACNGTNA')
+        self.assertEqual(kmers('ACNGTNA', 3), [encoding.decode(w) for w in windows])
+        self.assertEqual(['N', 'G', 'T', 'N', 'A'], [encoding.last_char(w) for w in windows])
+
+    def test_order_matches_sequence_order(self):
+        seqs = ['GATTACA', 'CATTAGA', 'NNAC', 'AANNTT']
+        encoding = IntegerKmerEncoding(seqs, 3)
+        kmer_list = [k for s in seqs for k in kmers(s, 3)]
+        windows = [w for s in seqs for w in encoding.windows(s)]
+        self.assertEqual(sorted(kmer_list), [encoding.decode(w) for w in sorted(windows)])
+
+
+class TestKmerGraph(unittest.TestCase):
+    def test_trim_tails_by_freq_forks(self):
+        g = KmerGraph()
+        for s, t in itertools.combinations([1, 2, 3, 4, 5, 6], 2):
+            g.add_edge(s, t)
+        g.add_edge(6, 1)
+        g.add_node(10)  # singlet
+        g.add_edge(7, 6)
+        g.add_edge(8, 7)
+        g.add_edge(9, 8)
+        g.trim_tails_by_freq(2)
+        self.assertEqual([1, 2, 3, 4, 5, 6], sorted(g.nodes()))
+
+        g = KmerGraph()
+        for s, t in itertools.combinations([1, 2, 3, 4, 5, 6], 2):
+            g.add_edge(s, t)
+        g.add_node(10)  # singlet
+        g.add_edge(6, 1)
+        g.add_edge(7, 6)
+        g.add_edge(7, 8)
+        g.add_edge(8, 7)
+        g.add_edge(9, 8)
+        g.trim_tails_by_freq(2)
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7, 8], sorted(g.nodes()))
+
+    def test_add_edge(self):
+        g = KmerGraph()
+        g.add_edge(1, 2)
+        self.assertEqual(1, g.get_edge_freq(1, 2))
+        g.add_edge(1, 2)
+        self.assertEqual(2, g.get_edge_freq(1, 2))
+        g.add_edge(1, 2, 5)
+        self.assertEqual(7, g.get_edge_freq(1, 2))
+        with self.assertRaises(KeyError):
+            g.get_edge_freq(2, 1)
+
+    def test_trim_noncutting_paths_by_freq_degree_stop(self):
+        g = KmerGraph()
+        for s, t in itertools.combinations([1, 2, 3, 4], 2):
+            g.add_edge(s, t, freq=4)
+        for s, t in itertools.combinations([5, 6, 7, 8], 2):
+            g.add_edge(s, t, freq=4)
+        path1 = [5, 9, 10, 11, 12, 1]
+        for s, t in zip(path1, path1[1:]):
+            g.add_edge(s, t)
+        g.trim_noncutting_paths_by_freq(3)
+        self.assertEqual(list(range(1, 9)) + path1[1:-1], g.nodes())
+
+        # add an equal weight path to force namesorting
+        path2 = [5, 13, 14, 15, 16, 1]
+        for s, t in zip(path2, path2[1:]):
+            g.add_edge(s, t)
+
+        g.trim_noncutting_paths_by_freq(3)
+        self.assertEqual(list(range(1, 9)) + path2[1:-1], g.nodes())
+
+    def test_is_acyclic(self):
+        g = KmerGraph()
+        g.add_edge(1, 2)
+        g.add_edge(2, 3)
+        g.add_edge(4, 5)
+        self.assertTrue(g.is_acyclic())
+        g.add_edge(5, 4)
+        self.assertFalse(g.is_acyclic())
+        self.assertTrue(g.is_acyclic({1, 2, 3}))
+
+    def test_connected_components(self):
+        g = KmerGraph()
+        g.add_edge(5, 4)
+        g.add_edge(1, 2)
+        g.add_edge(3, 2)
+        g.add_node(6)
+        self.assertEqual([{4, 5}, {1, 2, 3}, {6}], g.connected_components())
+        self.assertEqual([{1, 2}, {5}], g.connected_components({1, 2, 5}))
+
+    def test_unitig(self):
+        g = KmerGraph()
+        for s, t in [(1, 2), (2, 3), (3, 4), (3, 5), (5, 6), (7, 6)]:
+            g.add_edge(s, t, freq=s)
+        self.assertEqual(([1, 2, 3], 3), g.unitig(1))
+        self.assertEqual(([4], 0), g.unitig(4))
+        self.assertEqual(([5], 0), g.unitig(5))
+        self.assertEqual(([6], 0), g.unitig(6))
+
 
 class TestFullAssemly(unittest.TestCase):
     def setUp(self):
@@ -196,3 +419,20 @@ class TestFullAssemly(unittest.TestCase):
             self.assertEqual(1, len(contigs))
             contig_sequences.add(contigs[0].seq)
         self.assertEqual(1, len(contig_sequences))
+
+    def test_kmer_engine_matches_networkx(self):
+        contigs = {}
+        for engine in ['networkx', 'kmer']:
+            contigs[engine] = assemble(
+                self.seq,
+                111,
+                min_edge_trim_weight=3,
+                assembly_max_paths=8,
+                assembly_min_uniq=0.1,
+                min_complexity=0.1,
+                assembly_engine=engine,
+            )
+        self.assertEqual(
+            [(c.seq, c.score, c.remap_score()) for c in contigs['networkx']],
+            [(c.seq, c.score, c.remap_score()) for c in contigs['kmer']],
+        )
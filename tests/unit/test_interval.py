@@ -1,5 +1,6 @@
+import random
 import unittest
-from mavis.interval import Interval, IntervalMapping
+from mavis.interval import Interval, IntervalIndex, IntervalMapping
 
 
 class TestInterval(unittest.TestCase):
@@ -352,3 +353,45 @@ class TestIntervalMapping(unittest.TestCase):
         mapping = IntervalMapping(mapping)
         for pos in range(1, 101):
             self.assertEqual(pos, mapping.convert_pos(pos))
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_overlapping_keeps_input_order(self):
+        intervals = [Interval(10, 20), Interval(1, 5), Interval(4, 30), Interval(40, 50)]
+        index = IntervalIndex(intervals)
+        self.assertEqual([intervals[1], intervals[2]], index.overlapping(Interval(5, 9)))
+        self.assertEqual(intervals[:3], index.overlapping(Interval(5, 10)))
+        self.assertEqual([], index.overlapping(Interval(31, 39)))
+        self.assertEqual([intervals[3]], index.overlapping((50, 60)))
+        self.assertEqual([], index.overlapping(Interval(51, 60)))
+
+    def test_generator_input(self):
+        intervals = [Interval(10, 20), Interval(1, 5)]
+        index = IntervalIndex(i for i in intervals)
+        self.assertEqual(2, len(index))
+        self.assertEqual(intervals, index.overlapping(Interval(5, 10)))
+
+    def test_long_interval(self):
+        intervals = [Interval(1, 100000)] + [Interval(i, i + 10) for i in range(10, 50000, 20)]
+        index = IntervalIndex(intervals)
+        self.assertEqual([intervals[0], intervals[1]], index.overlapping(Interval(15, 15)))
+        self.assertEqual([intervals[0]], index.overlapping(Interval(60000, 60010)))
+
+    def test_empty(self):
+        index = IntervalIndex([])
+        self.assertEqual(0, len(index))
+        self.assertEqual([], index.overlapping(Interval(1, 10)))
+
+    def test_equivalent_to_linear_scan(self):
+        random.seed(0)
+        intervals = []
+        for _ in range(500):
+            start = random.randint(1, 10000)
+            intervals.append(Interval(start, start + random.randint(0, 500)))
+        index = IntervalIndex(intervals)
+        for _ in range(500):
+            start = random.randint(1, 10000)
+            query = Interval(start, start + random.randint(0, 100))
+            expected = [i for i in intervals if Interval.overlaps(i, query)]
+            result = index.overlapping(query)
+            self.assertEqual([id(i) for i in expected], [id(i) for i in result])
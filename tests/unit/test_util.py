@@ -1,16 +1,24 @@
 import os
+import shutil
+import tempfile
 import unittest
 
+from mavis.annotate.base import BioInterval
+from mavis.breakpoint import Breakpoint, BreakpointPair
 from mavis.constants import COLUMNS, ORIENT, STRAND
 from mavis.error import NotSpecifiedError
+from mavis.interval import Interval
 from mavis.util import (
     cast,
     ENV_VAR_PREFIX,
+    filter_on_overlap,
+    filter_uninformative,
     get_env_variable,
     MavisNamespace,
     WeakMavisNamespace,
     read_bpp_from_input_file,
     get_connected_components,
+    TabbedFileWriter,
 )
 
 from .mock import Mock
@@ -47,6 +55,37 @@ class TestGetConnectedComponents(unittest.TestCase):
         self.assertEqual({6, 7, 8}, components[1])
 
 
+class TestTabbedFileWriter(unittest.TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.filename = os.path.join(self.output, 'output.tab')
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def test_header_given_up_front(self):
+        with TabbedFileWriter(self.filename, {'a', 'b'}) as writer:
+            writer.write({'b': 1})
+            writer.write({'a': 'x', 'b': None})
+        with open(self.filename) as fh:
+            lines = fh.readlines()
+        self.assertEqual(['#a\tb\n', 'None\t1\n', 'x\tNone\n'], lines)
+        self.assertEqual(['output.tab'], os.listdir(self.output))
+
+    def test_error_on_column_not_in_header(self):
+        with self.assertRaises(KeyError):
+            with TabbedFileWriter(self.filename, {'a', 'b'}) as writer:
+                writer.write({'a': 'x', 'c': 2})
+        self.assertEqual([], os.listdir(self.output))
+
+    def test_no_output_on_error(self):
+        with self.assertRaises(KeyError):
+            with TabbedFileWriter(self.filename, ['a']) as writer:
+                writer.write({'a': 1})
+                raise KeyError('a')
+        self.assertEqual([], os.listdir(self.output))
+
+
 class TestCast(unittest.TestCase):
     def test_float(self):
         self.assertEqual(type(1.0), type(cast('1', float)))
@@ -415,3 +454,49 @@ class TestReadBreakpointPairsFromFile(unittest.TestCase):
         self.assertEqual(1, len(bpps))
         self.assertEqual(STRAND.POS, bpps[0].break1.strand)
         self.assertEqual(STRAND.NEG, bpps[0].break2.strand)
+
+
+class TestFilters(unittest.TestCase):
+    def pair(self, chrom, start, end):
+        return BreakpointPair(
+            Breakpoint(chrom, start, start + 10, orient=ORIENT.LEFT),
+            Breakpoint(chrom, end, end + 10, orient=ORIENT.RIGHT),
+            opposing_strands=False,
+        )
+
+    def test_filter_on_overlap(self):
+        masks = {
+            '1': [
+                BioInterval('1', 5000, 6000, name='second'),
+                BioInterval('1', 100, 200, name='first'),
+                BioInterval('1', 150, 5500, name='wide'),
+            ]
+        }
+        pairs = [self.pair('1', 10, 7000), self.pair('1', 195, 20000), self.pair('2', 150, 5000)]
+        passed, failed = filter_on_overlap(pairs, masks)
+        self.assertEqual([pairs[0], pairs[2]], passed)
+        self.assertEqual([pairs[1]], failed)
+        # the first of the overlapping regions in the input order is reported
+        self.assertEqual(
+            'overlapped masked region: ' + str(masks['1'][1]),
+            failed[0].data[COLUMNS.filter_comment],
+        )
+
+    def test_filter_on_overlap_second_breakpoint(self):
+        masks = {'1': [BioInterval('1', 5000, 6000, name='mask')]}
+        pairs = [self.pair('1', 100, 5995), self.pair('1', 100, 6001)]
+        passed, failed = filter_on_overlap(pairs, masks)
+        self.assertEqual([pairs[1]], passed)
+        self.assertEqual([pairs[0]], failed)
+
+    def test_filter_uninformative(self):
+        annotations = {'1': [Interval(10000, 20000), Interval(500000, 600000)]}
+        pairs = [
+            self.pair('1', 6000, 300000),
+            self.pair('1', 100000, 200000),
+            self.pair('1', 100000, 496000),
+            self.pair('2', 10000, 20000),
+        ]
+        passed, failed = filter_uninformative(annotations, pairs, max_proximity=5000)
+        self.assertEqual([pairs[0], pairs[2]], passed)
+        self.assertEqual([pairs[1], pairs[3]], failed)
@@ -1,9 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
 
-from mavis.constants import ORIENT
+from mavis.breakpoint import Breakpoint, BreakpointPair
+from mavis.constants import COLUMNS, ORIENT
 from mavis.validate.call import _call_interval_by_flanking_coverage
 from mavis.validate.evidence import GenomeEvidence
 from mavis.validate.base import Evidence
+from mavis.validate.main import _append_batch_file, _tagged_filename, partition_evidence
 from mavis.interval import Interval
 
 from .mock import Mock
@@ -69,3 +74,69 @@ class TestDistanceAndTraverse(unittest.TestCase):
 
     def test_traverse_left(self):
         self.assertEqual(Interval(10), Evidence.traverse(20, 10, ORIENT.LEFT))
+
+
+class TestPartitionEvidence(unittest.TestCase):
+    def build(self, chrom, pos, cluster_id):
+        return BreakpointPair(
+            Breakpoint(chrom, pos, orient=ORIENT.LEFT),
+            Breakpoint(chrom, pos + 1000, orient=ORIENT.RIGHT),
+            data={COLUMNS.cluster_id: cluster_id},
+        )
+
+    def test_single_partition(self):
+        evidence = [self.build('2', 100, 'a'), self.build('1', 100, 'b')]
+        self.assertEqual([[1, 0]], partition_evidence(evidence, 1))
+
+    def test_empty(self):
+        self.assertEqual([], partition_evidence([], 4))
+
+    def test_split_by_position(self):
+        evidence = [
+            self.build('1', 5000, 'a'),
+            self.build('2', 100, 'b'),
+            self.build('1', 100, 'c'),
+            self.build('2', 5000, 'd'),
+        ]
+        self.assertEqual([[2, 0], [1, 3]], partition_evidence(evidence, 2))
+
+    def test_more_partitions_than_clusters(self):
+        evidence = [self.build('1', 100, 'a'), self.build('1', 200, 'b')]
+        self.assertEqual([[0], [1]], partition_evidence(evidence, 4))
+
+    def test_keeps_clusters_together(self):
+        evidence = [
+            self.build('1', 100, 'a'),
+            self.build('1', 200, 'b'),
+            self.build('1', 300, 'a'),
+            self.build('1', 400, 'c'),
+        ]
+        partitions = partition_evidence(evidence, 2)
+        self.assertEqual([[0, 2], [1, 3]], partitions)
+
+
+class TestAppendBatchFile(unittest.TestCase):
+    def setUp(self):
+        self.output = tempfile.mkdtemp()
+        self.filename = os.path.join(self.output, 'contigs.sam')
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def test_concatenates_and_removes_parts(self):
+        parts = []
+        for partition in range(2):
+            part = _tagged_filename(self.filename, 'part-{}'.format(partition + 1))
+            with open(part, 'w') as fh:
+                fh.write('@SQ\tSN:1\nseq-{}\t0\n'.format(partition))
+            parts.append(part)
+        self.assertEqual(os.path.join(self.output, 'contigs.part-1.sam'), parts[0])
+        for partition, part in enumerate(parts):
+            _append_batch_file(part, self.filename, skip_header=partition > 0)
+        with open(self.filename) as fh:
+            self.assertEqual('@SQ\tSN:1\nseq-0\t0\nseq-1\t0\n', fh.read())
+        self.assertEqual(['contigs.sam'], os.listdir(self.output))
+
+    def test_missing_part(self):
+        _append_batch_file(self.filename + '.missing', self.filename)
+        self.assertEqual([], os.listdir(self.output))